@@ -0,0 +1,66 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from store import cache as catalog_cache
+from store.conditional import add_validators, catalog_validators, not_modified
+from store.sharded_stock import load_totals
+from grocery_store.db_router import use_replica
+from users.authentication import aauthenticate
+from .pagination import KeysetPagination
+from .serializers import ProductSerializer
+from .views import BrowseProductsView
+
+
+async def _serialize(products):
+    # Sharded products' stock may need a query, which can't run in the event loop.
+    if any(product.stock_shards for product in products):
+        await sync_to_async(load_totals)(products)
+    return list(ProductSerializer(products, many=True).data)
+
+
+async def _build_page(request):
+    products, ordering = BrowseProductsView.get_products(request)
+    if ordering is None:
+        rows = [row.product async for row in products]
+        return {'next': None, 'results': await _serialize(rows)}
+
+    paginator = KeysetPagination(ordering=ordering)
+    page = await paginator.apaginate_queryset(products, request)
+    return {'next': paginator.get_next_link(), 'results': await _serialize(list(page))}
+
+
+def _catalog_entry(parts):
+    """The validators and cache key of a catalog page: reads the shared catalog version."""
+    etag, last_modified = catalog_validators(*parts)
+    return etag, last_modified, catalog_cache.catalog_key(*parts)
+
+
+@require_GET
+async def browse_products(request):
+    """
+    GET /api/customer/async/browseProducts/ - async BrowseProductsView,
+    with the same parameters, pagination, catalog cache and
+    conditional GET support.
+    """
+    if await aauthenticate(request) is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    use_replica()
+
+    request = Request(request)
+    try:
+        # The catalog version is in a shared cache that may do blocking I/O
+        # (a file, or a network cache), so it is read off the event loop.
+        # The pages themselves are in local memory and are read inline.
+        etag, last_modified, key = await sync_to_async(_catalog_entry)(('browse', request.build_absolute_uri()))
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        data = catalog_cache.get_cached(key)
+        if data is None:
+            data = await _build_page(request)
+            catalog_cache.set_cached(key, data)
+        return add_validators(JsonResponse(data), etag, last_modified)
+    except ValidationError as e:
+        return JsonResponse({'error': e.detail}, status=400)
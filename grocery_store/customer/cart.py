@@ -0,0 +1,99 @@
+from django.db import transaction
+from django.db.models import Prefetch
+from .models import Cart, CartItem
+from store.models import Product
+from store.reservations import reserve
+from store.sharded_stock import load_totals
+
+MAX_OPERATIONS = 100
+
+
+class MissingProductsError(ValueError):
+    pass
+
+
+def load_cart(user):
+    """
+    Returns the user's cart with its items and their products prefetched,
+    ready for CartSerializer: two queries (three if the cart is new).
+    """
+    cart, _ = Cart.objects.prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('product').order_by('id'))
+    ).get_or_create(user=user)
+    return cart
+
+
+def _quantity(operation, minimum):
+    quantity = operation.get('quantity', 1)
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < minimum:
+        raise ValueError(f"Quantity must be an integer of at least {minimum}.")
+    return quantity
+
+
+def apply_cart_operations(user, operations):
+    """
+    Applies a list of {"op": "add" | "set" | "remove", "product_id", "quantity"}
+    operations to the user's cart in one transaction, in order. Uses a
+    fixed number of queries whatever the number of operations: products and
+    existing items are read once, then changed items are upserted and
+    removed items deleted in bulk. The new quantities are held for the user
+    (see store/reservations.py). Raises ValueError on invalid input or
+    insufficient available stock, leaving the cart untouched, and
+    MissingProductsError for unknown products.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("'operations' must be a non-empty list.")
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f"At most {MAX_OPERATIONS} operations per request.")
+
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError("Each operation must be an object.")
+        op = operation.get('op')
+        product_id = operation.get('product_id')
+        if op not in ('add', 'set', 'remove'):
+            raise ValueError("'op' must be 'add', 'set' or 'remove'.")
+        if isinstance(product_id, bool) or not isinstance(product_id, int):
+            raise ValueError("'product_id' must be an integer.")
+        if op == 'add':
+            parsed.append((op, product_id, _quantity(operation, 1)))
+        elif op == 'set':
+            parsed.append((op, product_id, _quantity(operation, 0)))
+        else:
+            parsed.append((op, product_id, 0))
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        product_ids = {product_id for _, product_id, _ in parsed}
+        # Locked so concurrent reservations of a product queue up.
+        products = Product.objects.select_for_update().in_bulk(product_ids)
+        missing = product_ids - set(products)
+        if missing:
+            raise MissingProductsError(f"Products not found: {', '.join(str(pid) for pid in sorted(missing))}.")
+        load_totals(products.values(), fresh=True)
+
+        quantities = dict(
+            CartItem.objects.filter(cart=cart, product_id__in=product_ids).values_list('product_id', 'quantity')
+        )
+        for op, product_id, quantity in parsed:
+            if op == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            elif op == 'set':
+                quantities[product_id] = quantity
+            else:
+                quantities[product_id] = 0
+
+        reserve(user, quantities, products)
+
+        keep = [CartItem(cart=cart, product_id=pid, quantity=qty) for pid, qty in quantities.items() if qty > 0]
+        removed = [pid for pid, qty in quantities.items() if qty == 0]
+        if keep:
+            CartItem.objects.bulk_create(
+                keep,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity']
+            )
+        if removed:
+            CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models import Case, F, Prefetch, Q, When
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from .models import CartItem, Order, OrderItem
+from store.models import Product, Sale
+from store.rollups import record_daily_sales
+from store.popularity import record_popularity
+from store.low_stock import track_low_stock
+from store.cache import bump_catalog_version_on_commit
+from store.reservations import check_available, release as release_reservations
+from store.sharded_stock import lock_stock, take as take_sharded_stock
+
+
+class EmptyCartError(ValueError):
+    pass
+
+
+def checkout_cart(user):
+    """
+    Turns the user's cart into an Order using a fixed number of queries,
+    whatever the cart size:
+
+    1. fetch the cart items together with their products, then lock the
+       products (only on databases with row locks) and read the shards of
+       hot products (only when there are any, see store/sharded_stock.py)
+    2. sum other customers' stock holds on those products
+    3. decrement stock for every ordinary product with one conditional
+       UPDATE, and for hot products take it from their shards
+    4. insert the Order
+    5. bulk insert the OrderItems
+    6. bulk insert the Sales
+    7. add the sales to the daily rollup (two queries)
+    8. update product popularity (at most three queries)
+    9. empty the cart and drop the user's holds (two queries)
+    10. record low-stock crossings (only when a threshold is crossed)
+    11. prefetch the order items for the response
+
+    The user's own holds (see store/reservations.py) are what's left after
+    other customers' holds, so a checkout within the hold time succeeds;
+    after it, it succeeds if the stock hasn't been taken meanwhile.
+
+    Raises EmptyCartError when there is nothing to buy and ValueError when a
+    product does not have enough stock; the whole transaction is rolled back.
+    """
+    with transaction.atomic():
+        cart_items = list(CartItem.objects.filter(cart__user=user).select_related('product'))
+        if not cart_items:
+            raise EmptyCartError("Your cart is empty.")
+
+        # The same product can only appear once per cart through the API,
+        # but merge duplicates anyway so the stock maths stays correct.
+        quantities = {}
+        products = {}
+        for item in cart_items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            products[item.product_id] = item.product
+
+        shards = lock_stock(products)
+        check_available(user, quantities, products)
+
+        ordinary = {pid: qty for pid, qty in quantities.items() if not products[pid].stock_shards}
+        if ordinary:
+            enough_stock = Q()
+            new_stock = []
+            for product_id, quantity in ordinary.items():
+                enough_stock |= Q(id=product_id, stock__gte=quantity)
+                new_stock.append(When(id=product_id, then=F('stock') - quantity))
+
+            updated = Product.objects.filter(enough_stock).update(
+                stock=Case(*new_stock, default=F('stock')), updated_at=timezone.now()
+            )
+            if updated != len(ordinary):
+                # Another checkout got there first (databases without row locks).
+                raise ValueError("Some products in your cart are no longer available in the requested quantity.")
+        take_sharded_stock({pid: qty for pid, qty in quantities.items() if pid not in ordinary}, shards)
+
+        total_price = sum(products[pid].price * qty for pid, qty in quantities.items())
+        order = Order.objects.create(user=user, total_price=total_price)
+
+        now = timezone.now()
+        order_items = [
+            OrderItem(
+                order=order,
+                product=products[product_id],
+                quantity=quantity,
+                price=products[product_id].price * quantity
+            )
+            for product_id, quantity in quantities.items()
+        ]
+        OrderItem.objects.bulk_create(order_items)
+        Sale.objects.bulk_create([
+            Sale(product=products[product_id], quantity=quantity, date=now)
+            for product_id, quantity in quantities.items()
+        ])
+        record_daily_sales(
+            {item.product_id: (item.quantity, item.price) for item in order_items},
+            day=timezone.localdate(now)
+        )
+        record_popularity(quantities, when=now)
+
+        CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
+        release_reservations(user, list(quantities))
+
+        previously_low = {pid for pid, product in products.items() if product.is_low_stock()}
+        for product_id, quantity in quantities.items():
+            products[product_id].stock -= quantity
+        track_low_stock(products.values(), previously_low=previously_low)
+        bump_catalog_version_on_commit()
+
+    prefetch_related_objects(
+        [order],
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
+    return order
@@ -0,0 +1,210 @@
+"""
+Queued checkout.
+
+POST /api/customer/checkout/queue/ records a CheckoutJob and returns 202
+straight away; `manage.py run_checkout_workers` then checks out queued
+carts in batches. Each batch is one transaction with a fixed number of
+queries however many orders it commits, so under a rush the single
+SQLite writer spends its time on batches rather than on one short
+transaction per request.
+
+Jobs are taken oldest first and the queue head is locked for the whole
+batch, so batches commit one after another in queue order, and within a
+batch each job is checked against the stock the earlier jobs left. Every
+product's stock is therefore handed out in the order the checkouts were
+queued, whichever worker runs them. A job checks out the cart as it is
+when its batch runs, with the same stock and hold rules as checkout_cart;
+a job that can't be filled fails on its own and leaves the cart alone.
+
+A batch that raises is rolled back whole. The worker then runs its jobs
+one at a time, and a job that still raises on its own is marked failed
+after CHECKOUT_MAX_ATTEMPTS tries instead of blocking the queue head.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from store.cache import bump_catalog_version_on_commit
+from store.low_stock import track_low_stock
+from store.models import Product, Sale, StockReservation
+from store.popularity import record_popularity
+from store.rollups import record_daily_sales
+from store.sharded_stock import lock_stock, take as take_sharded_stock
+from .checkout import EmptyCartError
+from .models import CartItem, CheckoutJob, Order, OrderItem
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def batch_size():
+    return getattr(settings, 'CHECKOUT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def max_attempts():
+    return getattr(settings, 'CHECKOUT_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def enqueue_checkout(user):
+    """
+    Queues a checkout of the user's cart. Returns (job, created): a user
+    with a checkout already waiting gets that job back rather than a
+    second one. Raises EmptyCartError when the cart is empty.
+    """
+    job = CheckoutJob.objects.filter(user=user, status=CheckoutJob.PENDING).first()
+    if job is not None:
+        return job, False
+    if not CartItem.objects.filter(cart__user=user).exists():
+        raise EmptyCartError("Your cart is empty.")
+    return CheckoutJob.objects.create(user=user), True
+
+
+def process_batch(size=None):
+    """
+    Runs up to `size` pending jobs, oldest first, in one transaction.
+    Returns (done, failed) counts; (0, 0) when the queue is empty.
+    """
+    size = size or batch_size()
+    with transaction.atomic():
+        jobs = list(
+            CheckoutJob.objects.filter(status=CheckoutJob.PENDING)
+            .order_by('id').select_for_update()[:size]
+        )
+        if not jobs:
+            return 0, 0
+        now = timezone.now()
+
+        carts = {}
+        products = {}
+        for item in (
+            CartItem.objects.filter(cart__user_id__in={job.user_id for job in jobs})
+            .select_related('product', 'cart')
+        ):
+            carts.setdefault(item.cart.user_id, []).append(item)
+            products[item.product_id] = item.product
+        shards = lock_stock(products)
+
+        # Unexpired holds on those products: each job may use its own user's
+        # holds, and a job that goes through frees them for the jobs after it.
+        held = {}
+        held_total = {}
+        for user_id, product_id, quantity in StockReservation.objects.filter(
+            product_id__in=list(products), expires_at__gt=now
+        ).values_list('user_id', 'product_id', 'quantity'):
+            held[(user_id, product_id)] = quantity
+            held_total[product_id] = held_total.get(product_id, 0) + quantity
+
+        stock = {product_id: product.stock for product_id, product in products.items()}
+        accepted = []
+        for job in jobs:
+            job.processed_at = now
+            # pop: a second job of the same user in this batch finds the cart empty.
+            items = carts.pop(job.user_id, [])
+            if not items:
+                job.status, job.error = CheckoutJob.FAILED, "Your cart is empty."
+                continue
+            quantities = {}
+            for item in items:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            short = [
+                product_id for product_id, quantity in quantities.items()
+                if quantity > stock[product_id] - held_total.get(product_id, 0) + held.get((job.user_id, product_id), 0)
+            ]
+            if short:
+                job.status = CheckoutJob.FAILED
+                job.error = f"Product {products[short[0]].name} not available in requested quantity."
+                continue
+
+            for product_id, quantity in quantities.items():
+                stock[product_id] -= quantity
+                held_total[product_id] = held_total.get(product_id, 0) - held.pop((job.user_id, product_id), 0)
+            job.status, job.error = CheckoutJob.DONE, ''
+            job.order = Order(
+                user_id=job.user_id,
+                total_price=sum(products[pid].price * qty for pid, qty in quantities.items())
+            )
+            accepted.append((job, quantities, items))
+
+        if accepted:
+            _commit_orders(accepted, products, stock, shards, now)
+        CheckoutJob.objects.bulk_update(jobs, ['status', 'order', 'error', 'processed_at'])
+    return len(accepted), len(jobs) - len(accepted)
+
+
+def record_failure(error):
+    """
+    Counts a failed run of the job at the queue head, after process_batch(1)
+    raised `error`, and marks it failed once it has used up its attempts.
+    Returns the job, or None when the queue is empty.
+    """
+    with transaction.atomic():
+        job = (
+            CheckoutJob.objects.filter(status=CheckoutJob.PENDING)
+            .order_by('id').select_for_update().first()
+        )
+        if job is None:
+            return None
+        job.attempts += 1
+        fields = ['attempts']
+        if job.attempts >= max_attempts():
+            job.status = CheckoutJob.FAILED
+            job.error = f"Checkout failed: {error}"[:255]
+            job.processed_at = timezone.now()
+            fields += ['status', 'error', 'processed_at']
+        job.save(update_fields=fields)
+    return job
+
+
+def _commit_orders(accepted, products, stock, shards, now):
+    sold = {}
+    for _, quantities, _ in accepted:
+        for product_id, quantity in quantities.items():
+            sold[product_id] = sold.get(product_id, 0) + quantity
+
+    ordinary = {pid: qty for pid, qty in sold.items() if not products[pid].stock_shards}
+    if ordinary:
+        enough_stock = Q()
+        new_stock = []
+        for product_id, quantity in ordinary.items():
+            enough_stock |= Q(id=product_id, stock__gte=quantity)
+            new_stock.append(When(id=product_id, then=F('stock') - quantity))
+        updated = Product.objects.filter(enough_stock).update(
+            stock=Case(*new_stock, default=F('stock')), updated_at=now
+        )
+        if updated != len(ordinary):
+            # Only possible on databases without row locks, if another writer
+            # took the stock between the read and here; the batch is retried.
+            raise ValueError("Stock changed while the batch was running.")
+    take_sharded_stock({pid: qty for pid, qty in sold.items() if pid not in ordinary}, shards)
+
+    orders = Order.objects.bulk_create([job.order for job, _, _ in accepted])
+    order_items = []
+    sales = []
+    revenue = {}
+    for order, (job, quantities, _) in zip(orders, accepted):
+        job.order = order
+        for product_id, quantity in quantities.items():
+            price = products[product_id].price * quantity
+            order_items.append(OrderItem(order=order, product_id=product_id, quantity=quantity, price=price))
+            sales.append(Sale(product_id=product_id, quantity=quantity, date=now))
+            revenue[product_id] = revenue.get(product_id, 0) + price
+    OrderItem.objects.bulk_create(order_items)
+    Sale.objects.bulk_create(sales)
+    record_daily_sales(
+        {product_id: (quantity, revenue[product_id]) for product_id, quantity in sold.items()},
+        day=timezone.localdate(now)
+    )
+    record_popularity(sold, when=now)
+
+    CartItem.objects.filter(id__in=[item.id for _, _, items in accepted for item in items]).delete()
+    holds = Q()
+    for job, quantities, _ in accepted:
+        holds |= Q(user_id=job.user_id, product_id__in=list(quantities))
+    StockReservation.objects.filter(holds).delete()
+
+    previously_low = {product_id for product_id in sold if products[product_id].is_low_stock()}
+    for product_id in sold:
+        products[product_id].stock = stock[product_id]
+    track_low_stock([products[product_id] for product_id in sold], previously_low=previously_low)
+    bump_catalog_version_on_commit()
@@ -0,0 +1,60 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from customer.models import Cart, CartItem
+from store.models import Product
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Benchmarks checkout latency and query count for several cart sizes on a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run_benchmark(options['sizes'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_benchmark(self, sizes, repeat):
+        user = User.objects.create(username='bench', email='bench@example.com')
+        cart = Cart.objects.create(user=user)
+        products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category='bench', price=1, stock=10 ** 9, created_by=user)
+            for i in range(max(sizes))
+        ])
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        self.stdout.write(f"{'items':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}")
+        for size in sizes:
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=1) for product in products[:size]
+                ])
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = client.post('/api/customer/checkout/')
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 201:
+                    self.stderr.write(f"Checkout failed: {response.status_code} {response.data}")
+                    return
+                queries = len(ctx.captured_queries)
+
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(f"{size:>6} {statistics.median(timings):>9.2f} {p95:>9.2f} {queries:>8}")
@@ -0,0 +1,86 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from customer.checkout_queue import batch_size, process_batch, record_failure
+from customer.models import CheckoutJob
+
+
+def _work(size, idle, drain, stdout=None):
+    # Jobs left to run one at a time, after a batch holding them failed.
+    alone = 0
+    while True:
+        try:
+            done, failed = process_batch(1 if alone else size)
+        except Exception as e:
+            # The batch was rolled back and its jobs are still pending.
+            if not alone:
+                if stdout:
+                    stdout.write(f"Checkout batch failed, retrying its jobs one at a time: {e}")
+                alone = size
+                continue
+            job = record_failure(e)
+            if job is not None and job.status == CheckoutJob.FAILED:
+                if stdout:
+                    stdout.write(f"Checkout job {job.id} failed after {job.attempts} attempts: {e}")
+                alone -= 1
+            else:
+                if stdout:
+                    stdout.write(f"Checkout job failed, retrying: {e}")
+                time.sleep(idle)
+            continue
+        if done or failed:
+            alone = max(alone - 1, 0)
+            if stdout:
+                stdout.write(f"Checked out {done} orders, {failed} failed.")
+            continue
+        alone = 0
+        if drain:
+            return
+        close_old_connections()
+        time.sleep(idle)
+
+
+def _child(*args):
+    # Ctrl-C goes to the whole process group; the parent stops the children.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _work(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued checkouts (POST /api/customer/checkout/queue/) in batches, "
+        "one transaction per batch. With --drain it exits once the queue is empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Worker processes. Batches still commit one at a time, in queue order.")
+        parser.add_argument('--batch-size', type=int, help="Jobs per transaction (default CHECKOUT_BATCH_SIZE).")
+        parser.add_argument('--idle', type=float, default=0.2, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--drain', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        size = options['batch_size'] or batch_size()
+        stdout = None if options['verbosity'] < 1 else self.stdout
+        if options['workers'] <= 1:
+            _work(size, options['idle'], options['drain'], stdout)
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=_child, args=(size, options['idle'], options['drain'], stdout))
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:30
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    CartItem = apps.get_model('customer', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(rows=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        CartItem.objects.filter(id=row['keep']).update(quantity=row['total'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        ('store', '0009_lowstockevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'product')},
+        ),
+    ]
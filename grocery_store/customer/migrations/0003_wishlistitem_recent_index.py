@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0002_cartitem_unique_product'),
+        ('store', '0009_lowstockevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wishlistitem',
+            index=models.Index(fields=['wishlist', '-added_at', '-id'], name='wishlist_item_recent_idx'),
+        ),
+    ]
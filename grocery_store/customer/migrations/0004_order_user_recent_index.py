@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0003_wishlistitem_recent_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-purchase_date', '-id'], name='order_user_recent_idx'),
+        ),
+    ]
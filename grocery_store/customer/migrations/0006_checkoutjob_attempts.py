@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0005_checkoutjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -14,6 +14,9 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        unique_together = ('cart', 'product')
+
     def __str__(self):
         return f"{self.product.name} ({self.quantity})"
 
@@ -30,6 +33,7 @@ class WishlistItem(models.Model):
 
     class Meta:
         unique_together = ('wishlist', 'product')  
+        indexes = [models.Index(fields=['wishlist', '-added_at', '-id'], name='wishlist_item_recent_idx')]
 
     def __str__(self):
         return f"{self.product.name} in {self.wishlist.user.username}'s wishlist"
@@ -40,6 +44,9 @@ class Order(models.Model):
     total_price = models.FloatField()
     purchase_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-purchase_date', '-id'], name='order_user_recent_idx')]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -51,3 +58,34 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"OrderItem {self.id} - {self.product.name} (x{self.quantity})"
+
+
+class CheckoutJob(models.Model):
+    """A queued checkout of the user's cart, run by `manage.py run_checkout_workers`."""
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='checkout_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='checkout_job')
+    error = models.CharField(max_length=255, blank=True)
+    # Runs of the job on its own that raised; see checkout_queue.record_failure.
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The queue head: pending jobs, oldest first.
+            models.Index(fields=['status', 'id'], name='checkout_job_queue_idx'),
+            models.Index(fields=['user', 'status'], name='checkout_job_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Checkout job {self.id} ({self.status}) for {self.user.username}"
@@ -0,0 +1,119 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over an ordering that ends with the primary key, e.g.
+    ('price', 'id') or ('-added_at', '-id'). Each page is a single indexed range scan starting right
+    after the last row of the previous page, so deep pages cost the same as
+    the first one.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 20
+    max_limit = 100
+
+    def __init__(self, ordering=('id',)):
+        self.ordering = tuple(ordering)
+        self.next_position = None
+        self.request = None
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.default_limit))
+        except (TypeError, ValueError):
+            raise ValidationError({'limit': 'Must be an integer.'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Must be a positive integer.'})
+        return min(limit, self.max_limit)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (ValueError, TypeError):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        return position
+
+    def encode_cursor(self, position):
+        raw = json.dumps([
+            str(v) if isinstance(v, Decimal) else v.isoformat() if isinstance(v, datetime) else v
+            for v in position
+        ])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def after(self, position):
+        """
+        Builds `(f1, f2, ...) > (v1, v2, ...)` as
+        `f1 >= v1 AND (f1 > v1 OR (f1 = v1 AND (f2 > v2 ...)))`, which keeps
+        the leading column as an index range seek. Fields prefixed with '-'
+        are descending and compare the other way.
+        """
+        def compare(field, value, inclusive=False):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            return Q(**{f'{name}__{lookup}{"e" if inclusive else ""}': value})
+
+        condition = compare(self.ordering[-1], position[-1])
+        for field, value in zip(reversed(self.ordering[:-1]), reversed(position[:-1])):
+            condition = compare(field, value) | (Q(**{field.lstrip('-'): value}) & condition)
+        return compare(self.ordering[0], position[0], inclusive=True) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_limit(request)
+        return self.trim_page(list(self.page_queryset(queryset, self.decode_cursor(request), limit + 1)), limit)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset for async views, evaluated with the async ORM."""
+        self.request = request
+        limit = self.get_limit(request)
+        rows = [row async for row in self.page_queryset(queryset, self.decode_cursor(request), limit + 1)]
+        return self.trim_page(rows, limit)
+
+    def page_queryset(self, queryset, position, count):
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset[:count]
+
+    def paginate_rows(self, request, fetch):
+        """
+        Paginates any source that can return rows in `ordering` order:
+        `fetch(position, count)` must return up to `count` rows that sort
+        after `position` (None for the first page).
+        """
+        self.request = request
+        limit = self.get_limit(request)
+        return self.trim_page(fetch(self.decode_cursor(request), limit + 1), limit)
+
+    def trim_page(self, rows, limit):
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            self.next_position = [getattr(last, field.lstrip('-')) for field in self.ordering]
+        else:
+            self.next_position = None
+        return rows
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -2,13 +2,15 @@ from rest_framework import serializers
 from .models import Cart, CartItem, Wishlist, Order, WishlistItem
 from store.models import Product
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import CheckoutJob, Order, OrderItem
 from store.models import Product
+from store.serializers import ProductListSerializer, ShardedStockMixin
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ShardedStockMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'category', 'price', 'stock']
+        list_serializer_class = ProductListSerializer
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer()
@@ -60,3 +62,17 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'total_price', 'purchase_date', 'items']
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'purchase_date', 'total_price', 'item_count']
+
+
+class CheckoutJobSerializer(serializers.ModelSerializer):
+    order = OrderSerializer(read_only=True)
+
+    class Meta:
+        model = CheckoutJob
+        fields = ['id', 'status', 'error', 'created_at', 'processed_at', 'order']
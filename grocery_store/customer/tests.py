@@ -1,3 +1,666 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+
+from grocery_store.testing import QueryBudgetMixin
+from store import cache as catalog_cache
+from store.cache import bump_catalog_version
+from store import idempotency
+from store.models import IdempotencyKey, Product, ProductPopularity, Sale, StockReservation
+from store.popularity import rebuild_popularity, record_popularity
+from store.reservations import release_expired
+from store.rollups import rebuild_daily_sales
+from users.models import User
+from users.views import MyTokenObtainPairSerializer
+from .checkout import EmptyCartError, checkout_cart
+from . import checkout_queue
+from .checkout_queue import process_batch
+from .models import Cart, CartItem, CheckoutJob, Order, Wishlist, WishlistItem
+from .pagination import KeysetPagination
+
+
+class BrowseProductsPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper', email='shopper@example.com')
+        Product.objects.bulk_create([
+            Product(name=f"Product {i}", category=f"cat-{i % 3}", price=i % 7, stock=i % 4, created_by=cls.user)
+            for i in range(60)
+        ])
+
+    def setUp(self):
+        bump_catalog_version()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_cover_in_stock_products_once_in_order(self):
+        for ordering, key in (('price', lambda p: (float(p['price']), p['id'])),
+                              ('category', lambda p: (p['category'], p['id']))):
+            products = self.walk(f'/api/customer/browseProducts/?ordering={ordering}&limit=7')
+            expected = Product.objects.filter(stock__gt=0).count()
+            self.assertEqual(len(products), expected)
+            self.assertEqual(len({p['id'] for p in products}), expected)
+            self.assertEqual(products, sorted(products, key=key))
+
+    def test_async_view_returns_the_same_pages(self):
+        products = list(Product.objects.order_by('id')[:5])
+        record_popularity({product.id: i + 1 for i, product in enumerate(products)})
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        sync_url, async_url = reverse('browse_products'), reverse('browse_products_async')
+        for query in ('limit=7', 'ordering=price&limit=9', 'filter=category&category=cat-1&limit=4',
+                      'filter=price_range&min_price=2&max_price=4&limit=6', 'filter=most popular&window=7d',
+                      'ordering=name', 'cursor=not-a-cursor'):
+            sync, response = self.client.get(f'{sync_url}?{query}'), self.client.get(f'{async_url}?{query}')
+            while True:
+                self.assertEqual(response.status_code, sync.status_code, query)
+                sync_data, data = sync.json(), response.json()
+                if response.status_code != 200 or not data.get('next'):
+                    self.assertEqual(data, sync_data, query)
+                    break
+                self.assertEqual(data['results'], sync_data['results'], query)
+                self.assertEqual(data['next'].replace(async_url, sync_url), sync_data['next'], query)
+                sync, response = self.client.get(sync_data['next']), self.client.get(data['next'])
+
+    def test_async_view_reads_the_catalog_version_off_the_event_loop(self):
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        on_loop = []
+        get_shared_version = catalog_cache.get_shared_version
+
+        def get_version(key):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(key)
+            except RuntimeError:
+                pass
+            return get_shared_version(key)
+
+        with mock.patch.object(catalog_cache, 'get_shared_version', side_effect=get_version) as read:
+            self.assertEqual(self.client.get(reverse('browse_products_async')).status_code, 200)
+        self.assertTrue(read.called)
+        self.assertEqual(on_loop, [])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/customer/browseProducts/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_plan_uses_partial_indexes(self):
+        for ordering, index in ((('price', 'id'), 'product_instock_price_idx'),
+                                (('category', 'id'), 'product_instock_category_idx')):
+            paginator = KeysetPagination(ordering=ordering)
+            position = ['cat-1' if ordering[0] == 'category' else '3', 10]
+            queryset = (
+                Product.objects.filter(stock__gt=0)
+                .order_by(*ordering)
+                .filter(paginator.after(position))[:20]
+            )
+            plan = queryset.explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_unchanged_page_is_not_modified(self):
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for url in (reverse('browse_products'), reverse('browse_products_async')):
+            url += '?limit=5'
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+            bump_catalog_version()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+
+class CustomerQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Statements per request for the customer endpoints, authenticated with a
+    real access token. The budgets are today's counts and don't depend on
+    the number of items involved; raise one only for a good reason. Inside
+    TestCase a transaction shows up as SAVEPOINT + RELEASE (2 statements).
+    """
+    client_class = APIClient
+    query_budgets = {
+        ('GET', 'cart'): 2,
+        ('POST', 'cart'): 10,
+        ('DELETE', 'cart'): 4,
+        ('POST', 'cart_batch'): 10,
+        ('POST', 'checkout'): 16,
+        ('POST', 'checkout_queue'): 4,
+        ('GET', 'checkout_job'): 2,
+        ('GET', 'order_history'): 2,
+        ('GET', 'wishlist'): 2,
+        ('POST', 'wishlist'): 5,
+        ('DELETE', 'wishlist'): 3,
+        ('POST', 'wishlist_bulk'): 4,
+        ('DELETE', 'wishlist_bulk'): 1,
+        ('GET', 'browse_products'): 1,
+        ('GET', 'browse_products_async'): 1,
+        ('GET', 'search_products'): 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='budget', email='budget@example.com')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Budget product {i}", category=f"cat-{i % 3}", price=i + 1, stock=1000, created_by=cls.user)
+            for i in range(30)
+        ])
+        cls.cart = Cart.objects.create(user=cls.user)
+        cls.wishlist = Wishlist.objects.create(user=cls.user)
+
+    def setUp(self):
+        bump_catalog_version()
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def fill_cart(self, size):
+        CartItem.objects.filter(cart=self.cart).delete()
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=2) for product in self.products[:size]
+        ])
+
+    def fill_wishlist(self, size):
+        WishlistItem.objects.bulk_create([
+            WishlistItem(wishlist=self.wishlist, product=product) for product in self.products[:size]
+        ])
+
+    def test_cart_endpoints(self):
+        for size in (1, 20):
+            self.fill_cart(size)
+            response = self.assertWithinBudget('GET', 'cart')
+            self.assertEqual(len(response.data['items']), size)
+        self.assertWithinBudget('POST', 'cart', {'product_id': self.products[25].id, 'quantity': 1})
+        self.assertWithinBudget('DELETE', 'cart', {'product_id': self.products[25].id})
+        operations = [{'op': 'add', 'product_id': product.id, 'quantity': 1} for product in self.products[:20]]
+        self.assertWithinBudget('POST', 'cart_batch', {'operations': operations})
+
+    def test_checkout_cost_does_not_grow_with_the_cart(self):
+        for size in (1, 20):
+            self.fill_cart(size)
+            response = self.assertWithinBudget('POST', 'checkout', expected_status=201)
+            self.assertEqual(len(response.data['items']), size)
+
+    def test_queued_checkout(self):
+        self.fill_cart(20)
+        response = self.assertWithinBudget('POST', 'checkout_queue', expected_status=202)
+        job_id = response.data['id']
+        self.assertWithinBudget('GET', 'checkout_job', url_kwargs={'job_id': job_id})
+        process_batch()
+        response = self.assertWithinBudget('GET', 'checkout_job', url_kwargs={'job_id': job_id})
+        self.assertEqual(response.data['status'], CheckoutJob.DONE)
+        self.assertEqual(len(response.data['order']['items']), 20)
+
+    def test_order_history(self):
+        orders = []
+        for size in (1, 3, 2, 4):
+            self.fill_cart(size)
+            orders.append(self.client.post(reverse('checkout')).data)
+
+        pages = []
+        url = reverse('order_history') + '?limit=3'
+        while url:
+            response = self.assertWithinBudget('GET', 'order_history', query=url.partition('?')[2])
+            pages.append(response.data['results'])
+            url = response.data['next']
+        self.assertEqual([len(page) for page in pages], [3, 1])
+        history = [order for page in pages for order in page]
+        self.assertEqual([order['id'] for order in history], [order['id'] for order in reversed(orders)])
+        self.assertEqual(history[0]['items'], orders[-1]['items'])
+
+        response = self.assertWithinBudget('GET', 'order_history', query='view=summary', budget=1)
+        self.assertEqual(
+            [(order['id'], order['item_count']) for order in response.data['results']],
+            [(orders[i]['id'], 2 * size) for i, size in reversed(list(enumerate((1, 3, 2, 4))))]
+        )
+
+    def test_wishlist_endpoints(self):
+        self.fill_wishlist(20)
+        self.assertWithinBudget('GET', 'wishlist')
+        self.assertWithinBudget('POST', 'wishlist', {'product_id': self.products[25].id}, expected_status=201)
+        self.assertWithinBudget('DELETE', 'wishlist', {'product_id': self.products[25].id})
+        product_ids = [product.id for product in self.products[20:]]
+        self.assertWithinBudget('POST', 'wishlist_bulk', {'product_ids': product_ids}, expected_status=201)
+        self.assertWithinBudget('DELETE', 'wishlist_bulk', {'product_ids': product_ids})
+
+    def test_browse_and_search(self):
+        for query in ('limit=20', 'ordering=price&limit=5', 'filter=category&category=cat-1', 'filter=most popular'):
+            self.assertWithinBudget('GET', 'browse_products', query=query)
+            self.assertWithinBudget('GET', 'browse_products_async', query=query)
+        self.assertWithinBudget('GET', 'search_products', query='q=budget')
+
+
+class CartBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper', email='shopper@example.com')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category='pantry', price=i + 1, stock=100, created_by=cls.user)
+            for i in range(4)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+
+    def batch(self, body):
+        return self.client.post(reverse('cart_batch'), body, format='json')
+
+    def test_operations_apply_in_order_and_merge_per_product(self):
+        p0, p1, p2, p3 = (product.id for product in self.products)
+        self.batch({'operations': [{'op': 'add', 'product_id': p0, 'quantity': 2},
+                                   {'op': 'add', 'product_id': p3}]})
+        response = self.batch({'operations': [
+            {'op': 'add', 'product_id': p0, 'quantity': 1},
+            {'op': 'add', 'product_id': p0, 'quantity': 2},
+            {'op': 'set', 'product_id': p1, 'quantity': 3},
+            {'op': 'add', 'product_id': p1},
+            {'op': 'add', 'product_id': p2},
+            {'op': 'remove', 'product_id': p2},
+            {'op': 'remove', 'product_id': p3},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {p0: 5, p1: 4})
+        self.assertEqual(sorted((item['product']['id'], item['quantity']) for item in response.data['items']),
+                         [(p0, 5), (p1, 4)])
+
+    def test_invalid_requests_leave_the_cart_alone(self):
+        p0 = self.products[0].id
+        self.batch({'operations': [{'op': 'add', 'product_id': p0}]})
+        for body in ([1, 2], {'operations': []}, {'operations': [{'op': 'add', 'product_id': p0},
+                                                                 {'op': 'double', 'product_id': p0}]}):
+            self.assertEqual(self.batch(body).status_code, 400)
+        response = self.batch({'operations': [{'op': 'add', 'product_id': 999999}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "Products not found: 999999.")
+        self.assertEqual(self.quantities(), {p0: 1})
+
+    def test_single_item_endpoint_accepts_numeric_strings(self):
+        p0 = self.products[0].id
+        response = self.client.post(reverse('cart'), {'product_id': str(p0), 'quantity': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {p0: 2})
+        self.assertEqual(self.client.post(reverse('cart'), [p0], format='json').status_code, 400)
+
+    def test_single_item_delete_validates_the_product_id(self):
+        p0 = self.products[0].id
+        self.client.post(reverse('cart'), {'product_id': p0, 'quantity': 2}, format='json')
+        for body in ({'product_id': 'abc'}, {'product_id': None}, {'product_id': True}, [p0]):
+            self.assertEqual(self.client.delete(reverse('cart'), body, format='json').status_code, 400)
+        self.assertEqual(self.quantities(), {p0: 2})
+        response = self.client.delete(reverse('cart'), {'product_id': str(p0)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {})
+
+
+class WishlistBulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper', email='shopper@example.com')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category='pantry', price=i + 1, stock=10, created_by=cls.user)
+            for i in range(5)
+        ])
+        cls.ids = [product.id for product in cls.products]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def wishlisted(self):
+        return sorted(WishlistItem.objects.filter(wishlist__user=self.user).values_list('product_id', flat=True))
+
+    def test_bulk_add_skips_duplicates_and_existing_items(self):
+        url = reverse('wishlist_bulk')
+        response = self.client.post(url, {'product_ids': [self.ids[0], self.ids[1], self.ids[0]]}, format='json')
+        self.assertEqual((response.status_code, response.data), (201, {'added': 2}))
+        response = self.client.post(url, {'product_ids': self.ids[:3]}, format='json')
+        self.assertEqual(response.data, {'added': 1})
+        self.assertEqual(self.wishlisted(), self.ids[:3])
+
+        response = self.client.post(url, {'product_ids': [self.ids[3], 999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(url, [self.ids[3]], format='json').status_code, 400)
+        self.assertEqual(self.client.delete(url, [self.ids[3]], format='json').status_code, 400)
+        self.assertEqual(self.wishlisted(), self.ids[:3])
+
+    def test_bulk_remove(self):
+        self.client.post(reverse('wishlist_bulk'), {'product_ids': self.ids}, format='json')
+        response = self.client.delete(reverse('wishlist_bulk'), {'product_ids': [self.ids[0], self.ids[2], 999999]},
+                                      format='json')
+        self.assertEqual(response.data, {'removed': 2})
+        self.assertEqual(self.wishlisted(), [self.ids[1], self.ids[3], self.ids[4]])
+
+    def test_wishlist_pages_newest_first(self):
+        self.client.post(reverse('wishlist_bulk'), {'product_ids': self.ids}, format='json')
+        # Two items share a timestamp, as items of one bulk add do.
+        now = timezone.now()
+        for product_id, age in zip(self.ids, (3, 1, 2, 1, 0)):
+            WishlistItem.objects.filter(product_id=product_id).update(added_at=now - timedelta(minutes=age))
+
+        seen = []
+        url = reverse('wishlist') + '?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['product'] for item in response.data['items'])
+            url = response.data['next']
+        items = WishlistItem.objects.filter(wishlist__user=self.user)
+        self.assertEqual(seen, [item.product_id for item in items.order_by('-added_at', '-id')])
+        self.assertEqual(seen[0], self.ids[4])
+        self.assertEqual(seen[-1], self.ids[0])
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper', email='shopper@example.com')
+        cls.apples, cls.pears = Product.objects.bulk_create([
+            Product(name="Apples", category='fruit', price=2, stock=10, created_by=cls.user),
+            Product(name="Pears", category='fruit', price=3, stock=4, created_by=cls.user),
+        ])
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def fill_cart(self, apples, pears):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=self.apples, quantity=apples),
+            CartItem(cart=self.cart, product=self.pears, quantity=pears),
+        ])
+
+    def stock(self):
+        return list(Product.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_checkout_takes_stock_and_records_the_order(self):
+        self.fill_cart(3, 4)
+        order = checkout_cart(self.user)
+        self.assertEqual(order.total_price, 18)
+        self.assertEqual(sorted(order.items.values_list('product__name', 'quantity', 'price')),
+                         [("Apples", 3, 6.0), ("Pears", 4, 12.0)])
+        self.assertEqual(sorted(Sale.objects.values_list('product__name', 'quantity')), [("Apples", 3), ("Pears", 4)])
+        self.assertEqual(self.stock(), [7, 0])
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_short_stock_rolls_everything_back(self):
+        self.fill_cart(3, 5)
+        with self.assertRaisesMessage(ValueError, "Pears"):
+            checkout_cart(self.user)
+        # Stock taken between the availability check and the UPDATE: the conditional UPDATE refuses it.
+        with mock.patch('customer.checkout.check_available'):
+            with self.assertRaises(ValueError):
+                checkout_cart(self.user)
+        self.assertEqual(self.stock(), [10, 4])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+
+    def test_empty_cart(self):
+        with self.assertRaises(EmptyCartError):
+            checkout_cart(self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.post(reverse('checkout'))
+        self.assertEqual((response.status_code, response.data), (400, {'error': "Your cart is empty."}))
+
+
+class SalesRollupTests(TestCase):
+    """The sales report reads the rollup that checkout keeps; a rebuild from Sale rows must agree."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.shopper = User.objects.create(username='shopper', email='shopper@example.com')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category='pantry', price=i + 1, stock=100, created_by=cls.manager)
+            for i in range(3)
+        ])
+
+    def report(self, **params):
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        response = client.get(reverse('salesreport'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted((row['id'], row['total_quantity_sold'], row['total_revenue']) for row in response.data)
+
+    def test_rebuild_matches_checkout_rollup(self):
+        cart = Cart.objects.create(user=self.shopper)
+        start = timezone.now().replace(hour=12) - timedelta(days=5)
+        for days, quantities in ((0, (1, 2, 0)), (2, (3, 0, 1)), (4, (0, 5, 2))):
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=product, quantity=quantity)
+                for product, quantity in zip(self.products, quantities) if quantity
+            ])
+            with mock.patch('django.utils.timezone.now', return_value=start + timedelta(days=days)):
+                checkout_cart(self.shopper)
+
+        ranges = ({}, {'from': (start + timedelta(days=1)).date().isoformat()},
+                  {'from': (start + timedelta(days=1)).date().isoformat(),
+                   'to': (start + timedelta(days=3)).date().isoformat()})
+        from_checkout = [self.report(**params) for params in ranges]
+        self.assertEqual(from_checkout[2], [(self.products[0].id, 3, '3.00'), (self.products[1].id, 0, '0.00'),
+                                            (self.products[2].id, 1, '3.00')])
+        rebuild_daily_sales()
+        self.assertEqual([self.report(**params) for params in ranges], from_checkout)
+
+
+class PopularityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper', email='shopper@example.com')
+        cls.a, cls.b, cls.c = Product.objects.bulk_create([
+            Product(name=name, category='pantry', price=1, stock=10, created_by=cls.user) for name in 'ABC'
+        ])
+        now = timezone.now()
+        # A: one big sale long ago; B: many single units just now; C: in between.
+        sales = [(cls.a, 10, now - timedelta(days=25)), (cls.c, 3, now - timedelta(days=5))]
+        sales += [(cls.b, 1, now - timedelta(hours=2))] * 5
+        for product, quantity, when in sales:
+            Sale.objects.create(product=product, quantity=quantity, date=when)
+            record_popularity({product.id: quantity}, when=when)
+
+    def setUp(self):
+        bump_catalog_version()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def ranking(self, window):
+        response = self.client.get(reverse('browse_products'), {'filter': 'most popular', 'window': window})
+        self.assertEqual(response.status_code, 200)
+        return ''.join(product['name'] for product in response.data['results'])
+
+    def test_windows_rank_by_decayed_units(self):
+        expected = {'all': 'ABC', '30d': 'BAC', '7d': 'BCA', '24h': 'BCA'}
+        self.assertEqual({window: self.ranking(window) for window in expected}, expected)
+        # A rebuild from the Sale rows ranks the same, by units rather than rows.
+        self.assertEqual(rebuild_popularity(), 3)
+        bump_catalog_version()
+        self.assertEqual({window: self.ranking(window) for window in expected}, expected)
+        self.assertEqual(ProductPopularity.objects.get(product=self.b).total_sold, 5)
+
+
+class StockReservationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(username='alice', email='alice@example.com')
+        cls.bob = User.objects.create(username='bob', email='bob@example.com')
+        cls.product = Product.objects.create(name="Flash sale", category='deals', price=5, stock=3, created_by=cls.alice)
+
+    def add(self, user, quantity):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.post(reverse('cart'), {'product_id': self.product.id, 'quantity': quantity}, format='json')
+
+    def test_holds_limit_what_others_can_add(self):
+        self.assertEqual(self.add(self.alice, 2).status_code, 200)
+        self.assertEqual(self.add(self.bob, 2).status_code, 400)
+        self.assertEqual(self.add(self.bob, 1).status_code, 200)
+        self.assertEqual(self.add(self.alice, 1).status_code, 400)
+
+        StockReservation.objects.filter(user=self.alice).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.bob, 2).status_code, 200)
+        self.assertEqual(release_expired(), 1)
+
+    def test_checkout_confirms_the_hold(self):
+        self.add(self.alice, 3)
+        self.assertEqual(self.add(self.bob, 1).status_code, 400)
+        client = APIClient()
+        client.force_authenticate(user=self.alice)
+        self.assertEqual(client.post(reverse('checkout')).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class IdempotencyKeyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='retry', email='retry@example.com')
+        cls.product = Product.objects.create(name="Milk", category='dairy', price=2, stock=50, created_by=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_to_cart(self, key, quantity=2):
+        return self.client.post(reverse('cart'), {'product_id': self.product.id, 'quantity': quantity},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_checkout_replays_the_first_order(self):
+        self.add_to_cart('cart-1')
+        first = self.client.post(reverse('checkout'), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(1):
+            retry = self.client.post(reverse('checkout'), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cart_add_applies_once_per_key(self):
+        self.add_to_cart('cart-1')
+        self.add_to_cart('cart-1')
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, 2)
+        self.add_to_cart('cart-2')
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, 4)
+
+        self.assertEqual(self.add_to_cart('cart-1', quantity=5).status_code, 422)
+
+    def test_duplicate_of_a_running_request_waits_then_gives_up(self):
+        now = timezone.now()
+        IdempotencyKey.objects.create(user=self.user, key='slow', fingerprint=idempotency._fingerprint(
+            Request(APIRequestFactory().post(reverse('checkout')))
+        ), created_at=now, expires_at=now + timedelta(hours=1))
+        with mock.patch.object(idempotency, 'WAIT_TIMEOUT', 0.1):
+            response = self.client.post(reverse('checkout'), HTTP_IDEMPOTENCY_KEY='slow')
+        self.assertEqual(response.status_code, 409)
+
+        IdempotencyKey.objects.filter(key='slow').update(expires_at=now)
+        self.assertEqual(idempotency.purge_expired(), 1)
+
+
+class CheckoutQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f'queued-{i}', email=f'queued-{i}@example.com') for i in range(6)]
+        cls.product = Product.objects.create(name="Flash sale", category='deals', price=5, stock=10, created_by=cls.users[0])
+        cls.other = Product.objects.create(name="Bread", category='bakery', price=2, stock=100, created_by=cls.users[0])
+
+    def queue(self, user, quantity):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.post(reverse('cart'), {'product_id': self.other.id, 'quantity': 1}, format='json')
+        CartItem.objects.create(cart=user.cart, product=self.product, quantity=quantity)
+        return client.post(reverse('checkout_queue'))
+
+    def test_jobs_get_stock_in_queue_order(self):
+        response = self.queue(self.users[0], 4)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], reverse('checkout_job', kwargs={'job_id': response.data['id']}))
+        self.assertEqual(self.queue(self.users[1], 5).status_code, 202)
+        self.assertEqual(self.queue(self.users[2], 4).status_code, 202)
+        self.assertEqual(self.queue(self.users[3], 1).status_code, 202)
+
+        self.assertEqual(process_batch(size=2), (2, 0))
+        self.assertEqual(process_batch(), (1, 1))
+        self.assertEqual(process_batch(), (0, 0))
+
+        jobs = list(CheckoutJob.objects.order_by('id'))
+        self.assertEqual([job.status for job in jobs], ['done', 'done', 'failed', 'done'])
+        self.assertIn("Flash sale", jobs[2].error)
+        self.assertEqual(jobs[0].order.items.get(product=self.product).quantity, 4)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Order.objects.count(), 3)
+        # The failed checkout keeps its cart and its holds.
+        self.assertEqual(CartItem.objects.filter(cart__user=self.users[2]).count(), 2)
+        self.assertEqual(StockReservation.objects.get().user, self.users[2])
+
+    def test_batch_cost_does_not_grow_with_the_batch(self):
+        self.queue(self.users[0], 1)
+        with self.assertNumQueries(16):
+            process_batch()
+        for user in self.users[1:]:
+            self.queue(user, 1)
+        with self.assertNumQueries(16):
+            self.assertEqual(process_batch(), (5, 0))
+
+    def test_a_job_that_keeps_raising_is_failed_alone(self):
+        for user in self.users[:3]:
+            self.queue(user, 1)
+        poison = self.users[1]
+        commit_orders = checkout_queue._commit_orders
+
+        def commit_unless_poison(accepted, *args):
+            if any(job.user_id == poison.id for job, _, _ in accepted):
+                raise ValueError("Broken order.")
+            return commit_orders(accepted, *args)
+
+        with mock.patch.object(checkout_queue, '_commit_orders', side_effect=commit_unless_poison):
+            call_command('run_checkout_workers', drain=True, idle=0, verbosity=0)
+
+        jobs = list(CheckoutJob.objects.order_by('id'))
+        self.assertEqual([job.status for job in jobs], ['done', 'failed', 'done'])
+        self.assertEqual([job.attempts for job in jobs], [0, checkout_queue.max_attempts(), 0])
+        self.assertEqual(jobs[1].error, "Checkout failed: Broken order.")
+        self.assertEqual(CartItem.objects.filter(cart__user=poison).count(), 2)
+
+    def test_one_job_per_waiting_checkout(self):
+        first = self.queue(self.users[0], 1)
+        client = APIClient()
+        client.force_authenticate(user=self.users[0])
+        self.assertEqual(client.post(reverse('checkout_queue')).data['id'], first.data['id'])
 
-# Create your tests here.
+        client.force_authenticate(user=self.users[1])
+        self.assertEqual(client.post(reverse('checkout_queue')).status_code, 400)
+        self.assertEqual(client.get(reverse('checkout_job', kwargs={'job_id': first.data['id']})).status_code, 404)
@@ -1,10 +1,18 @@
 # customer/urls.py
 from django.urls import path
-from .views import AddOrRemoveFromCart, CheckoutView, WishListView, BrowseProductsView
+from . import async_views
+from .views import AddOrRemoveFromCart, CartBatchView, CheckoutView, CheckoutQueueView, CheckoutJobView, OrderHistoryView, WishListView, WishlistBulkView, BrowseProductsView, SearchProductsView
 
 urlpatterns = [
     path('cart/', AddOrRemoveFromCart.as_view(), name='cart'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart_batch'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('checkout/queue/', CheckoutQueueView.as_view(), name='checkout_queue'),
+    path('checkout/jobs/<int:job_id>/', CheckoutJobView.as_view(), name='checkout_job'),
+    path('orders/', OrderHistoryView.as_view(), name='order_history'),
     path('wishlist/', WishListView.as_view(), name='wishlist'),
-    path('browseProducts/', BrowseProductsView.as_view(), name='browse_products')
+    path('wishlist/bulk/', WishlistBulkView.as_view(), name='wishlist_bulk'),
+    path('browseProducts/', BrowseProductsView.as_view(), name='browse_products'),
+    path('search/', SearchProductsView.as_view(), name='search_products'),
+    path('async/browseProducts/', async_views.browse_products, name='browse_products_async'),
 ]
@@ -1,26 +1,81 @@
 from urllib import request
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.db.models import Count
+from rest_framework.exceptions import ValidationError
 from django.db import transaction
-from .models import Cart, CartItem, Wishlist, Order, OrderItem, WishlistItem
-from store.models import Product, Sale
-from .serializers import CartSerializer, WishlistSerializer, OrderSerializer, ProductSerializer
-from django.utils import timezone
-
-
-class BrowseProductsView(APIView):
+from django.db.models import OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from .models import CartItem, CheckoutJob, Wishlist, Order, OrderItem, WishlistItem
+from store.models import Product, ProductPopularity
+from store.popularity import WINDOWS as POPULARITY_WINDOWS
+from store.search import search_products
+from store.reservations import release as release_reservations
+from store.idempotency import idempotent
+from store.conditional import catalog_response
+from grocery_store.db_router import ReplicaReadsMixin
+from .serializers import CartSerializer, CheckoutJobSerializer, WishlistItemSerializer, OrderSerializer, OrderSummarySerializer, ProductSerializer
+from .cart import MissingProductsError, apply_cart_operations, load_cart
+from .checkout import EmptyCartError, checkout_cart
+from .checkout_queue import enqueue_checkout
+from .wishlist import bulk_add_to_wishlist, bulk_remove_from_wishlist
+from .pagination import KeysetPagination
+
+
+class BrowseProductsView(ReplicaReadsMixin, APIView):
     """
-    Allows customers to browse available products."""
+    Allows customers to browse available products.
+    Results are cursor-paginated: pass `limit` and follow the `next` link.
+    `ordering` is `price` or `category` (each backed by a partial index on
+    in-stock products). `filter=most popular` returns the top `limit`
+    products by units sold, optionally over a decayed `window` (24h, 7d,
+    30d). Pages are served from the catalog cache, with an ETag and
+    Last-Modified for conditional GETs (see store/conditional.py)."""
 
     permission_classes = [IsAuthenticated]
+    orderings = {
+        'price': ('price', 'id'),
+        'category': ('category', 'id'),
+    }
 
     def get(self, request):
-       try:   
+       try:
+        return catalog_response(
+            request, ('browse', request.build_absolute_uri()),
+            lambda: self.build_page(request)
+        )
+       except ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+       except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def build_page(self, request):
+        products, ordering = self.get_products(request)
+        if ordering is None:
+            serializer = ProductSerializer([row.product for row in products], many=True)
+            return {'next': None, 'results': list(serializer.data)}
+
+        paginator = KeysetPagination(ordering=ordering)
+        page = paginator.paginate_queryset(products, request, view=self)
+        serializer  = ProductSerializer(page, many=True)
+        return {'next': paginator.get_next_link(), 'results': list(serializer.data)}
+
+    @classmethod
+    def get_products(cls, request):
+        """
+        Returns the (lazy) queryset for the request and its keyset ordering.
+        For `filter=most popular` the queryset is an already limited
+        ProductPopularity ranking and the ordering is None.
+        """
         filter_type = request.query_params.get('filter', None)
+        default_ordering = 'price' if filter_type == 'price_range' else 'category'
+        ordering = request.query_params.get('ordering', default_ordering)
+        if ordering not in cls.orderings:
+            raise ValidationError({'ordering': "Invalid ordering. Use 'price' or 'category'."})
+
         if filter_type == 'category':
             category = request.query_params.get('category', None)
             products = Product.objects.filter(category=category, stock__gt=0)
@@ -31,139 +86,248 @@ class BrowseProductsView(APIView):
             products = Product.objects.filter(price__gte=min_price, price__lte=max_price, stock__gt=0)
 
         elif filter_type == 'most popular':
-            products = Product.objects.annotate(total_sold=Count('sales')).order_by('-total_sold')
+            window = request.query_params.get('window', 'all')
+            if window != 'all' and window not in POPULARITY_WINDOWS:
+                raise ValidationError({'window': "Invalid window. Use 'all', '24h', '7d' or '30d'."})
+            rank_field = 'total_sold' if window == 'all' else POPULARITY_WINDOWS[window][0]
+            limit = KeysetPagination().get_limit(request)
+            ranking = ProductPopularity.objects.select_related('product').order_by(f'-{rank_field}')[:limit]
+            return ranking, None
 
         else:
 
             products = Product.objects.filter(stock__gt=0)
 
-        serializer  = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-       except Exception as e:
+        return products, cls.orderings[ordering]
+
+
+class SearchProductsView(APIView):
+    """
+    Full-text product search over name and category.
+    GET /api/customer/search/?q=<terms>
+    Every term matches as a prefix, results are ranked by BM25 and
+    cursor-paginated like BrowseProductsView."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            paginator = KeysetPagination(ordering=('score', 'id'))
+            hits = paginator.paginate_rows(
+                request,
+                lambda position, count: search_products(query, count, after=position)
+            )
+            products = Product.objects.in_bulk([hit.id for hit in hits])
+            serializer = ProductSerializer([products[hit.id] for hit in hits if hit.id in products], many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _form_int(value):
+    """Numeric strings (form posts, older clients) as ints; anything else unchanged."""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
 class AddOrRemoveFromCart(APIView):
     """
-    Allows customers to add or remove products from their cart."""
+    Allows customers to add or remove products from their cart.
+    Cart quantities hold the stock for a while (see store/reservations.py)."""
 
     permission_classes = [IsAuthenticated]
 
-    def get_cart(self, user):
-        cart, _ = Cart.objects.get_or_create(user=user)
-        return cart
-    
-    def post(self, request):
-        product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
-
-       
-        product = get_object_or_404(Product, id=product_id)
+    def get(self, request):
+        serializer = CartSerializer(load_cart(request.user))
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        if product.stock < quantity:
-            return Response({'error': 'Product not available in requested quantity.'},
+    @idempotent
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Send an object with product_id and quantity.'},
                             status=status.HTTP_400_BAD_REQUEST)
-                            
-                            
-        cart = self.get_cart(request.user)
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if created:
-            cart_item.quantity = quantity
-        else:
-            cart_item.quantity += quantity
+        product_id = _form_int(request.data.get('product_id'))
+        quantity = _form_int(request.data.get('quantity', 1))
 
-        cart_item.save() 
+        try:
+            apply_cart_operations(request.user, [{'op': 'add', 'product_id': product_id, 'quantity': quantity}])
+        except MissingProductsError:
+            return Response({'error': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = CartSerializer(cart)
+        serializer = CartSerializer(load_cart(request.user))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotent
     def delete(self, request):
-        product_id = request.data.get('product_id')
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Send an object with product_id.'}, status=status.HTTP_400_BAD_REQUEST)
+        product_id = _form_int(request.data.get('product_id'))
+        if isinstance(product_id, bool) or not isinstance(product_id, int):
+            return Response({'error': "'product_id' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            deleted, _ = CartItem.objects.filter(cart__user=request.user, product_id=product_id).delete()
+            release_reservations(request.user, [product_id])
+        if not deleted:
+            return Response({'error': 'Item not in cart'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message": "Removed from cart"}, status=status.HTTP_200_OK)
 
-        cart = self.get_cart(request.user)
 
-        try:
-            cart_item = CartItem.objects.get(cart=cart, product_id= product_id)
-            cart_item.delete()
 
-        except CartItem.DoesNotExist:
-            return Response({'error': 'Item not in cart'}, status=status.HTTP_400_BAD_REQUEST)
 
+class CartBatchView(APIView):
+    """
+    Applies several cart changes in one request and one transaction.
+    POST /api/customer/cart/batch/
+    {"operations": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2}, ...]}
+    Returns the updated cart."""
 
-        return Response({"message": "Removed from cart"}, status=status.HTTP_200_OK)
+    permission_classes = [IsAuthenticated]
 
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({'error': "Send an object with an 'operations' list."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            apply_cart_operations(request.user, request.data.get('operations'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        serializer = CartSerializer(load_cart(request.user))
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class CheckoutView(APIView):
+    """
+    POST /api/customer/checkout/
+    Turns the cart into an order. Clients that retry should send an
+    Idempotency-Key header, so a retry returns the first order.
+    """
     permission_classes = [IsAuthenticated]
 
-    def get_cart(self, user):
-        cart, _ = Cart.objects.get_or_create(user=user)
-        return cart
-
+    @idempotent
     def post(self, request):
         try:
-            with transaction.atomic():  
-                cart = self.get_cart(request.user)
-                cart_items = CartItem.objects.filter(cart=cart)
+            order = checkout_cart(request.user)
+            serializer = OrderSerializer(order)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-                if not cart_items.exists():
-                    return Response({"error": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
-                total_price = 0
-                order = Order.objects.create(user=request.user, total_price=0)
+        except Product.DoesNotExist:
+            return Response({"error": "One of the products in your cart no longer exists."},
+                            status=status.HTTP_404_NOT_FOUND)
 
-                for item in cart_items:
-                    product = item.product
+        except Exception as e:
+            return Response({"error": "An unexpected error occurred during checkout.",
+                             "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-                    if product.stock < item.quantity:
-                        raise ValueError(f"Product {product.name} not available in requested quantity.")
 
-                    product.stock -= item.quantity
-                    product.save()
+class CheckoutQueueView(APIView):
+    """
+    POST /api/customer/checkout/queue/
+    Queues a checkout of the cart for `manage.py run_checkout_workers` and
+    returns 202 with the job; poll its `status_url` for the result. A
+    customer with a checkout already waiting gets that job back.
+    """
+    permission_classes = [IsAuthenticated]
 
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=item.quantity,
-                        price=product.price * item.quantity
-                    )
+    @idempotent
+    def post(self, request):
+        try:
+            job, _ = enqueue_checkout(request.user)
+        except EmptyCartError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                    Sale.objects.create(
-                        product=item.product,
-                        quantity=item.quantity,
-                        date=timezone.now()
-                    )
+        status_url = reverse('checkout_job', kwargs={'job_id': job.id})
+        data = {**CheckoutJobSerializer(job).data, 'status_url': request.build_absolute_uri(status_url)}
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
 
-                    total_price += item.quantity * product.price
 
-                order.total_price = total_price
-                order.save()
-                cart_items.delete()
+class CheckoutJobView(APIView):
+    """
+    GET /api/customer/checkout/jobs/<job_id>/
+    A queued checkout's status (`pending`, `done` or `failed`), with the
+    order once it is done or the reason it failed.
+    """
+    permission_classes = [IsAuthenticated]
 
-                serializer = OrderSerializer(order)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def get(self, request, job_id):
+        job = get_object_or_404(
+            CheckoutJob.objects.filter(user=request.user).select_related('order').prefetch_related(
+                Prefetch('order__items', queryset=OrderItem.objects.select_related('product').order_by('id'))
+            ),
+            id=job_id
+        )
+        if job.order is not None:
+            job.order.user = request.user
+        return Response(CheckoutJobSerializer(job).data)
 
-        except ValueError as ve:
-            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
-        except Product.DoesNotExist:
-            return Response({"error": "One of the products in your cart no longer exists."},
-                            status=status.HTTP_404_NOT_FOUND)
 
-        except Exception as e:
-            return Response({"error": "An unexpected error occurred during checkout.",
-                             "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class OrderHistoryView(APIView):
+    """
+    GET /api/customer/orders/
+    The customer's orders, newest first, cursor-paginated (`limit`, `next`).
+    Each page costs two queries: the orders, then their items with product
+    names. `?view=summary` returns only id, date, total and item count, in a
+    single aggregate query.
+    """
+    permission_classes = [IsAuthenticated]
+    ordering = ('-purchase_date', '-id')
 
+    def get(self, request):
+        mode = request.query_params.get('view', 'full')
+        if mode not in ('full', 'summary'):
+            return Response({'error': "Invalid view. Use 'full' or 'summary'."}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            paginator = KeysetPagination(ordering=self.ordering)
+            orders = Order.objects.filter(user=request.user)
+            if mode == 'summary':
+                # A correlated subquery, so the page is still read in index
+                # order and only its own items are summed.
+                item_count = (
+                    OrderItem.objects.filter(order=OuterRef('pk')).values('order')
+                    .annotate(count=Sum('quantity')).values('count')
+                )
+                orders = orders.annotate(item_count=Coalesce(Subquery(item_count), 0)).only(
+                    'id', 'purchase_date', 'total_price'
+                )
+                page = paginator.paginate_queryset(orders, request, view=self)
+                return paginator.get_paginated_response(OrderSummarySerializer(page, many=True).data)
+
+            orders = orders.prefetch_related(Prefetch(
+                'items',
+                queryset=OrderItem.objects.select_related('product').only(
+                    'id', 'order', 'product__name', 'quantity', 'price'
+                ).order_by('id')
+            ))
+            page = paginator.paginate_queryset(orders, request, view=self)
+            for order in page:
+                # Every order is the requester's; don't load the user again per row.
+                order.user = request.user
+            return paginator.get_paginated_response(OrderSerializer(page, many=True).data)
+
+        except ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class WishListView(APIView):
     """
     Allows customers to add items to their wishlist and view it.
+    Items are listed newest first and cursor-paginated (`limit`, `next`).
     """
     permission_classes =[IsAuthenticated]
 
@@ -171,11 +335,25 @@ class WishListView(APIView):
 
         wishlist, _ = Wishlist.objects.get_or_create(user=user)
         return wishlist
+
+    def wishlist_page(self, request, wishlist):
+        paginator = KeysetPagination(ordering=('-added_at', '-id'))
+        items = paginator.paginate_queryset(
+            WishlistItem.objects.filter(wishlist=wishlist).select_related('product'), request, view=self
+        )
+        return {
+            'id': wishlist.id,
+            'user': request.user.username,
+            'items': WishlistItemSerializer(items, many=True).data,
+            'next': paginator.get_next_link(),
+        }
     
     def get(self,request):
-        wishlist = self.get_wishlist(request.user)
-        serializer =WishlistSerializer(wishlist)
-        return Response(serializer.data, status= status.HTTP_200_OK)
+        try:
+            wishlist = self.get_wishlist(request.user)
+            return Response(self.wishlist_page(request, wishlist), status= status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
     
     def post(self, request):
         product_id= request.data.get('product_id')
@@ -186,15 +364,14 @@ class WishListView(APIView):
             product = Product.objects.get(id= product_id)
             wishlist = self.get_wishlist(request.user)
            
-            if WishlistItem.objects.filter(id=product_id).exists():
+            if WishlistItem.objects.filter(wishlist=wishlist, product=product).exists():
                 return Response({}, status=status.HTTP_409_CONFLICT)
             
             WishlistItem.objects.create(wishlist=wishlist, product=product)
-            serializer = WishlistSerializer(wishlist)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(self.wishlist_page(request, wishlist), status=status.HTTP_201_CREATED)
 
-        except Product.DoesNotxist:
-            return Response({'error': 'Product not founc'}, status = status.HTTP_404_NOT_FOUND)
+        except Product.DoesNotExist:
+            return Response({'error': 'Product not found'}, status = status.HTTP_404_NOT_FOUND)
 
 
         except Exception as e:
@@ -221,5 +398,29 @@ class WishListView(APIView):
             return Response({'error':'An error occurred while removing from wishlist', 'details': str(e)}, status= status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-    
+class WishlistBulkView(APIView):
+    """
+    Adds or removes many products at once.
+    POST   /api/customer/wishlist/bulk/ {"product_ids": [1, 2, 3]}
+    DELETE /api/customer/wishlist/bulk/ {"product_ids": [1, 2, 3]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def product_ids(self, request):
+        if not isinstance(request.data, dict):
+            raise ValueError("Send an object with a 'product_ids' list.")
+        return request.data.get('product_ids')
 
+    def post(self, request):
+        try:
+            added = bulk_add_to_wishlist(request.user, self.product_ids(request))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'added': added}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        try:
+            removed = bulk_remove_from_wishlist(request.user, self.product_ids(request))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'removed': removed}, status=status.HTTP_200_OK)
@@ -0,0 +1,44 @@
+from .models import Wishlist, WishlistItem
+from store.models import Product
+
+MAX_BULK_PRODUCTS = 500
+
+
+def _product_ids(product_ids):
+    if not isinstance(product_ids, list) or not product_ids:
+        raise ValueError("'product_ids' must be a non-empty list.")
+    if len(product_ids) > MAX_BULK_PRODUCTS:
+        raise ValueError(f"At most {MAX_BULK_PRODUCTS} products per request.")
+    if any(isinstance(pid, bool) or not isinstance(pid, int) for pid in product_ids):
+        raise ValueError("'product_ids' must contain integers.")
+    return set(product_ids)
+
+
+def bulk_add_to_wishlist(user, product_ids):
+    """
+    Adds products to the user's wishlist in a fixed number of queries.
+    Products already on the wishlist are skipped by the (wishlist, product)
+    unique constraint. Returns the number of products that were new.
+    """
+    product_ids = _product_ids(product_ids)
+    existing_products = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+    missing = product_ids - existing_products
+    if missing:
+        raise ValueError(f"Products not found: {', '.join(str(pid) for pid in sorted(missing))}.")
+
+    wishlist, _ = Wishlist.objects.get_or_create(user=user)
+    present = set(
+        WishlistItem.objects.filter(wishlist=wishlist, product_id__in=product_ids).values_list('product_id', flat=True)
+    )
+    WishlistItem.objects.bulk_create(
+        [WishlistItem(wishlist=wishlist, product_id=pid) for pid in product_ids - present],
+        ignore_conflicts=True
+    )
+    return len(product_ids - present)
+
+
+def bulk_remove_from_wishlist(user, product_ids):
+    """Removes products from the user's wishlist; returns how many were removed."""
+    product_ids = _product_ids(product_ids)
+    deleted, _ = WishlistItem.objects.filter(wishlist__user=user, product_id__in=product_ids).delete()
+    return deleted
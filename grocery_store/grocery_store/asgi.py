@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Streaming endpoints (the low-stock Server-Sent Events feed) need an ASGI
+server, e.g. ``uvicorn grocery_store.asgi:application``.
 """
 
 import os
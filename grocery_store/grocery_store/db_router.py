@@ -0,0 +1,175 @@
+"""
+Primary/replica database routing.
+
+Writes always go to `default`. Reads go to the `replica` alias only where
+a view opts in, after the user is authenticated: ReplicaReadsMixin on
+the DRF views (GET and HEAD only) and use_replica() in the async views.
+Everything else, including management commands, reads from the primary.
+
+Read-your-writes: a request that writes, or is not GET/HEAD, reads from
+the primary for the rest of the request. Its response also sets a cookie
+that keeps the client on the primary for REPLICA_PIN_SECONDS, long
+enough for the replica to catch up.
+
+Locally the replica is a copy of the SQLite file kept current with
+`manage.py refresh_replica`. Until that copy exists, reads stay on the
+primary.
+"""
+import os
+import sqlite3
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'primary_pin'
+DEFAULT_PIN_SECONDS = 10
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class _RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica_reads = False
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+
+
+def replica_available():
+    """
+    Whether the replica alias is configured and, for SQLite, is a database
+    file that exists yet. An in-memory SQLite replica (the tests' mirror of
+    the in-memory test database) can't see the primary's uncommitted test
+    data, so it counts as unavailable.
+    """
+    if REPLICA not in connections.settings:
+        return False
+    connection = connections[REPLICA]
+    if connection.vendor != 'sqlite':
+        return True
+    return not connection.is_in_memory_db() and os.path.exists(connection.settings_dict['NAME'])
+
+
+def use_replica():
+    """Lets the rest of the current request read from the replica, unless it is pinned."""
+    state = _state.get()
+    if state is not None:
+        state.replica_reads = True
+
+
+def reads_from_replica():
+    """Whether reads in the current request go to the replica."""
+    state = _state.get()
+    return (
+        state is not None and state.replica_reads and not state.pinned and not state.wrote
+        and replica_available()
+    )
+
+
+def refresh_replica():
+    """
+    Copies the primary SQLite database over the replica with SQLite's
+    online backup API. The copy reads one snapshot of the primary, which in
+    WAL mode doesn't hold up writers, and readers of the replica keep their
+    old snapshot until it is done. Raises ValueError when the replica isn't
+    a separate SQLite file.
+    """
+    if REPLICA not in connections.settings:
+        raise ValueError("No replica database is configured.")
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[REPLICA]
+    if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+        raise ValueError("Only SQLite replicas are refreshed here; use the database's own replication.")
+    if replica.is_in_memory_db() or os.path.abspath(replica.settings_dict['NAME']) == os.path.abspath(
+        primary.settings_dict['NAME']
+    ):
+        raise ValueError("The replica is not a separate database file.")
+
+    primary.ensure_connection()
+    target = sqlite3.connect(replica.settings_dict['NAME'], timeout=replica.settings_dict['OPTIONS'].get('timeout', 5))
+    try:
+        target.execute('PRAGMA journal_mode=WAL')
+        primary.connection.backup(target)
+    finally:
+        target.close()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if reads_from_replica() else None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, schema included.
+        return db != REPLICA
+
+
+class ReplicaReadsMixin:
+    """
+    For DRF views whose GET and HEAD reads may lag the primary a little:
+    they read from the replica once the user is authenticated (so a user
+    who just signed up can still log in).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            use_replica()
+
+
+class PrimaryPinningMiddleware:
+    """
+    Tracks each request's routing state and pins clients that wrote to the
+    primary for REPLICA_PIN_SECONDS with a cookie.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, state, response)
+
+    def start(self, request):
+        return _RequestState(pinned=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+
+    def finish(self, request, state, response):
+        if state.wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,204 @@
+"""
+Helpers for HTTP load tests: start the app under a real WSGI or ASGI
+server and drive it with concurrent keep-alive clients.
+"""
+import http.client
+import importlib.util
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    # WSGI: one sync worker thread per in-flight request.
+    'wsgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'gunicorn', 'grocery_store.wsgi:application',
+        '--workers', str(workers), '--threads', str(threads),
+        '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+    ],
+    # ASGI: one event loop per worker process.
+    'asgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'uvicorn', 'grocery_store.asgi:application',
+        '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port),
+        '--log-level', 'warning', '--no-access-log',
+    ],
+    # Django's threaded development server, always available.
+    'runserver': lambda port, workers, threads: [
+        sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload', '--verbosity', '0',
+    ],
+}
+SERVER_MODULES = {'wsgi': 'gunicorn', 'asgi': 'uvicorn', 'runserver': None}
+
+
+def server_available(kind):
+    module = SERVER_MODULES[kind]
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """Runs the project under one of SERVERS in a subprocess."""
+
+    def __init__(self, kind, db_path, workers=1, threads=8, env=None):
+        self.kind = kind
+        self.port = free_port()
+        self.command = SERVERS[kind](self.port, workers, threads)
+        self.env = {**os.environ, 'GROCERY_DB_PATH': str(db_path), **(env or {})}
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=BASE_DIR, env=self.env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.kind} server exited with code {self.process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.2).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError(f"{self.kind} server did not start within 30s")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class Call(NamedTuple):
+    """One request of a load-test session. `expect` lists the statuses that
+    count as success (default: anything below 400)."""
+    route: str
+    method: str
+    path: str
+    body: object = None
+    token: str = None
+    expect: tuple = ()
+
+    def headers(self):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return headers
+
+    def encoded_body(self):
+        return None if self.body is None else json.dumps(self.body)
+
+    def failed(self, status):
+        if not isinstance(status, int):
+            return True
+        return status not in self.expect if self.expect else status >= 400
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(latencies, errors, elapsed=None):
+    latencies = sorted(latencies)
+    stats = {'requests': len(latencies), 'errors': errors}
+    if elapsed is not None:
+        stats['throughput'] = round(len(latencies) / elapsed, 1) if elapsed else 0.0
+    stats.update({
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    })
+    return stats
+
+
+def run_sessions(port, session, concurrency, total):
+    """
+    Sends `total` requests from `concurrency` threads, each holding one
+    keep-alive connection and playing one virtual user. `session(worker)`
+    returns a generator that yields Calls and is sent back each response as
+    (status, body bytes); when it finishes a new session is started.
+    Returns overall throughput and latency stats plus the same per route.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    samples = defaultdict(list)
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def worker(number):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local = defaultdict(list)
+        calls = session(number)
+        response = None
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            try:
+                call = calls.send(response)
+            except StopIteration:
+                calls = session(number)
+                call = calls.send(None)
+            start = time.perf_counter()
+            try:
+                connection.request(call.method, call.path, body=call.encoded_body(), headers=call.headers())
+                raw = connection.getresponse()
+                response = (raw.status, raw.read())
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                response = (repr(e), b'')
+            local[call.route].append(time.perf_counter() - start)
+            if call.failed(response[0]):
+                with lock:
+                    errors[call.route] += 1
+                    if len(samples[call.route]) < 3:
+                        samples[call.route].append((response[0], response[1][:200].decode(errors='replace')))
+        connection.close()
+        with lock:
+            for route, values in local.items():
+                latencies[route].extend(values)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        **summarize(everything, sum(errors.values()), elapsed),
+        'routes': {
+            route: summarize(values, errors[route]) for route, values in sorted(latencies.items())
+        },
+        'error_samples': {route: found for route, found in samples.items()},
+    }
+
+
+def run_load(port, calls, concurrency, total):
+    """Sends `total` requests from `concurrency` threads, cycling through `calls`."""
+    def session(worker):
+        for call in itertools.cycle(calls):
+            yield call
+
+    stats = run_sessions(port, session, concurrency, total)
+    return {key: stats[key] for key in ('requests', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms')}
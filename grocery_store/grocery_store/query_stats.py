@@ -0,0 +1,166 @@
+"""
+Per-request SQL instrumentation.
+
+QueryStatsMiddleware counts the queries each request runs, their total
+time and the slowest one, keeps running totals per view (see
+`view_query_stats()`) and, with DEBUG on, returns them as X-DB-* response
+headers. The test helper in grocery_store/testing.py counts with the same
+QueryRecorder, so budgets and headers agree.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_view_stats = {}
+
+# The recorders of the current request (or test), innermost last. A context
+# variable rather than per-connection state: sync_to_async copies it into
+# the thread the ORM runs in, and concurrent async requests sharing that
+# thread's connection each see only their own.
+_recorders = ContextVar('query_recorders', default=())
+
+
+def _record(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for recorder in recorders:
+            recorder.queries.append((sql, duration))
+
+
+def _install(connection):
+    # Installed once per connection object and never removed.
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    _install(connection)
+
+
+class QueryRecorder:
+    """
+    Records every statement run in the current context between start()
+    and stop(), including in threads it is copied to by sync_to_async.
+    Unlike connection.queries it works with DEBUG off.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.token = None
+
+    def start(self):
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        self.token = _recorders.set(_recorders.get() + (self,))
+        return self
+
+    def stop(self):
+        if self.token is not None:
+            _recorders.reset(self.token)
+            self.token = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    @property
+    def slowest(self):
+        """(sql, seconds) of the slowest statement, or None."""
+        return max(self.queries, key=lambda query: query[1], default=None)
+
+
+def view_query_stats():
+    """Totals per view for this worker process, most queries per request first."""
+    with _stats_lock:
+        stats = {view: dict(row) for view, row in _view_stats.items()}
+    for row in stats.values():
+        row['avg_queries'] = round(row['queries'] / row['requests'], 2)
+        row['avg_db_ms'] = round(row['db_ms'] / row['requests'], 2)
+        row['db_ms'] = round(row['db_ms'], 2)
+    return dict(sorted(stats.items(), key=lambda item: -item[1]['avg_queries']))
+
+
+def _header_value(sql, limit=300):
+    return ' '.join(sql.split())[:limit].encode('latin-1', 'replace').decode('latin-1')
+
+
+class QueryStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        self.record(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        # The ORM runs async queries in a thread; the recorder follows the
+        # request there through the context.
+        recorder = QueryRecorder().start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            recorder.stop()
+        self.record(request, response, recorder)
+        return response
+
+    def record(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = f"{request.method} {match.view_name if match else request.path}"
+        db_ms = recorder.total_time * 1000
+        slowest = recorder.slowest
+
+        with _stats_lock:
+            row = _view_stats.setdefault(view, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0, 'slowest_ms': 0.0, 'slowest_sql': None,
+            })
+            row['requests'] += 1
+            row['queries'] += recorder.count
+            row['db_ms'] += db_ms
+            row['max_queries'] = max(row['max_queries'], recorder.count)
+            if slowest and slowest[1] * 1000 > row['slowest_ms']:
+                row['slowest_ms'] = round(slowest[1] * 1000, 2)
+                row['slowest_sql'] = _header_value(slowest[0], limit=1000)
+
+        logger.debug("%s: %d queries, %.2f ms in the database", view, recorder.count, db_ms)
+        if settings.DEBUG:
+            response['X-DB-Query-Count'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f"{db_ms:.2f}"
+            if slowest:
+                response['X-DB-Slowest-Ms'] = f"{slowest[1] * 1000:.2f}"
+                response['X-DB-Slowest-Query'] = _header_value(slowest[0])
@@ -0,0 +1,393 @@
+"""
+Seed data and traffic mixes for the HTTP benchmarks (`manage.py bench_api`
+and `manage.py bench_servers`).
+
+A mix is a session generator per virtual user: it logs in over HTTP, then
+yields loadtest.Calls and is sent back each response, so it can follow
+`next` links and act on ids it created. Every session draws from its own
+`random.Random` seeded from (seed, mix, worker, session number), so the
+same options replay the same traffic against the same seeded database.
+
+Between them the mixes exercise every route in users/urls.py,
+store/urls.py and customer/urls.py, plus the project-level /api/token/
+routes. The one exception is low-stock-alert/stream/, which is a
+long-lived SSE connection rather than a request/response pair.
+"""
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from statistics import mean
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from customer.models import Cart, Wishlist
+from store.low_stock import track_low_stock
+from store.models import Product, PromoCode, Sale
+from store.popularity import rebuild_popularity
+from store.rollups import rebuild_daily_sales
+from users.models import User
+from users.views import MyTokenObtainPairSerializer
+from .db_router import REPLICA
+from .loadtest import Call
+
+PASSWORD = 'bench-Passw0rd!'
+SESSION_LENGTH = 40
+
+ADJECTIVES = ['fresh', 'organic', 'crunchy', 'ripe', 'smoked', 'spicy', 'sweet', 'frozen', 'salted', 'roasted']
+NOUNS = ['apple', 'banana', 'carrot', 'cheddar', 'almond', 'salmon', 'yogurt', 'bagel', 'tomato', 'coffee',
+         'spinach', 'mango', 'oatmeal', 'walnut', 'butter', 'lentil', 'pepper', 'honey', 'cocoa', 'basil']
+CATEGORIES = ['fruit', 'vegetables', 'dairy', 'bakery', 'seafood', 'pantry', 'snacks', 'beverages',
+              'frozen', 'spices', 'breakfast', 'deli']
+
+
+@dataclass
+class BenchData:
+    """What the sessions need to know about the seeded database."""
+    manager: str
+    customers: list
+    product_ids: list
+    promo_codes: list
+    expired_codes: list
+    first_day: str
+    last_day: str
+    categories: list = field(default_factory=lambda: list(CATEGORIES))
+    search_terms: list = field(default_factory=lambda: [word[:4] for word in NOUNS] + ADJECTIVES)
+
+
+def seed_database(db_path, products=2000, customers=64, seed=42):
+    """
+    Points this process at a fresh database file, migrates it and fills it
+    with products, customers, a manager, 90 days of sales and promo codes.
+    About one product in ten is at or under its low-stock threshold; the
+    rest have enough stock for any checkout load.
+
+    The replica alias moves to the file next to it that servers started
+    with GROCERY_DB_PATH=db_path use, and any old copy there is removed,
+    so reads stay on the new primary until the replica is refreshed.
+    """
+    default = connections['default']
+    default.close()
+    default.settings_dict['NAME'] = str(db_path)
+    if REPLICA in connections.settings:
+        replica = connections[REPLICA]
+        replica.close()
+        replica.settings_dict['NAME'] = f'{os.path.splitext(str(db_path))[0]}.replica.sqlite3'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(replica.settings_dict['NAME'] + suffix):
+                os.remove(replica.settings_dict['NAME'] + suffix)
+    call_command('migrate', verbosity=0)
+
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    manager = User.objects.create(
+        username='bench-manager', email='bench-manager@example.com', role='manager', password=password
+    )
+    users = User.objects.bulk_create([
+        User(username=f'bench-customer-{i}', email=f'bench-customer-{i}@example.com', password=password)
+        for i in range(customers)
+    ])
+    Cart.objects.bulk_create([Cart(user=user) for user in users])
+    Wishlist.objects.bulk_create([Wishlist(user=user) for user in users])
+
+    catalog = Product.objects.bulk_create([
+        Product(
+            name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+            category=rng.choice(CATEGORIES),
+            price=rng.randint(50, 5000) / 100,
+            stock=rng.randint(0, 10) if rng.random() < 0.1 else 10 ** 7,
+            created_by=manager,
+        )
+        for i in range(products)
+    ], batch_size=1000)
+
+    now = timezone.now()
+    Sale.objects.bulk_create([
+        Sale(
+            product=rng.choice(catalog), quantity=rng.randint(1, 5),
+            date=now - timedelta(days=rng.randint(0, 89), seconds=rng.randint(0, 86399))
+        )
+        for _ in range(products * 5)
+    ], batch_size=1000)
+    rebuild_daily_sales()
+    rebuild_popularity()
+
+    codes = [f'BENCH{i}' for i in range(50)]
+    expired = [f'OLD{i}' for i in range(10)]
+    PromoCode.objects.bulk_create(
+        [PromoCode(code=code, discount_percent=10, expiry_date=now + timedelta(days=30)) for code in codes]
+        + [PromoCode(code=code, discount_percent=10, expiry_date=now - timedelta(days=1)) for code in expired]
+    )
+    track_low_stock(catalog, previously_low=set())
+
+    return BenchData(
+        manager=manager.username,
+        customers=[user.username for user in users],
+        product_ids=[product.id for product in catalog if product.stock > 10],
+        promo_codes=codes,
+        expired_codes=expired,
+        first_day=(now - timedelta(days=89)).date().isoformat(),
+        last_day=now.date().isoformat(),
+    )
+
+
+def manager_token(data):
+    """An access token for the seeded manager, minted without a login request."""
+    manager = User.objects.get(username=data.manager)
+    token = MyTokenObtainPairSerializer.get_token(manager).access_token
+    token.set_exp(lifetime=timedelta(hours=2))
+    return str(token)
+
+
+def _json(response):
+    try:
+        return json.loads(response[1])
+    except (TypeError, ValueError):
+        return {}
+
+
+def _path(url):
+    parts = urlsplit(url)
+    return f'{parts.path}?{parts.query}' if parts.query else parts.path
+
+
+def _login(username):
+    response = yield Call('POST /api/users/login/', 'POST', '/api/users/login/',
+                          {'username': username, 'password': PASSWORD})
+    return _json(response)
+
+
+def _browse_params(data, rng):
+    kind = rng.choices(['all', 'category', 'price_range', 'popular'], weights=[4, 3, 2, 1])[0]
+    params = {'limit': rng.choice([10, 20, 50])}
+    if kind == 'category':
+        params.update({'filter': 'category', 'category': rng.choice(data.categories)})
+    elif kind == 'price_range':
+        low = rng.randint(0, 40)
+        params.update({'filter': 'price_range', 'min_price': low, 'max_price': low + rng.randint(1, 10)})
+    elif kind == 'popular':
+        params.update({'filter': 'most popular', 'window': rng.choice(['all', '24h', '7d', '30d'])})
+    if kind in ('all', 'category') and rng.random() < 0.5:
+        params['ordering'] = 'price'
+    return urlencode(params)
+
+
+def _browse(data, rng, token, path='/api/customer/browseProducts/'):
+    """A browse page, followed by the next page about half of the time."""
+    response = yield Call(f'GET {path}', 'GET', f'{path}?{_browse_params(data, rng)}', token=token)
+    next_url = _json(response).get('next')
+    if next_url and rng.random() < 0.5:
+        yield Call(f'GET {path} (next page)', 'GET', _path(next_url), token=token)
+
+
+def browse_session(data, rng, worker):
+    """Customers browsing and searching, with the occasional wishlist change or new signup."""
+    if rng.random() < 0.05:
+        username = f'bench-new-{worker}-{rng.getrandbits(40):x}'
+        yield Call('POST /api/users/register/', 'POST', '/api/users/register/', {
+            'username': username, 'email': f'{username}@example.com',
+            'password': PASSWORD, 'password2': PASSWORD, 'role': 'customer',
+        }, expect=(201,))
+    else:
+        username = rng.choice(data.customers)
+    tokens = yield from _login(username)
+    token, refresh = tokens.get('access'), tokens.get('refresh')
+    if not token:
+        return
+
+    actions = {
+        'browse': 30, 'async browse': 10, 'search': 15, 'product': 10, 'products': 2, 'cart': 8,
+        'wishlist': 8, 'wishlist add': 5, 'wishlist remove': 2, 'promo codes': 3, 'refresh': 2, 'token': 1,
+    }
+    for _ in range(SESSION_LENGTH):
+        action = rng.choices(list(actions), weights=list(actions.values()))[0]
+        product_id = rng.choice(data.product_ids)
+        if action == 'browse':
+            yield from _browse(data, rng, token)
+        elif action == 'async browse':
+            yield from _browse(data, rng, token, '/api/customer/async/browseProducts/')
+        elif action == 'search':
+            terms = ' '.join(rng.sample(data.search_terms, rng.choice([1, 1, 2])))
+            response = yield Call('GET /api/customer/search/', 'GET',
+                                  f'/api/customer/search/?{urlencode({"q": terms})}', token=token)
+            next_url = _json(response).get('next')
+            if next_url and rng.random() < 0.3:
+                yield Call('GET /api/customer/search/ (next page)', 'GET', _path(next_url), token=token)
+        elif action == 'product':
+            yield Call('GET /api/store/products/<id>/', 'GET', f'/api/store/products/{product_id}/', token=token)
+        elif action == 'products':
+            yield Call('GET /api/store/products/', 'GET', '/api/store/products/', token=token)
+        elif action == 'cart':
+            yield Call('GET /api/customer/cart/', 'GET', '/api/customer/cart/', token=token)
+        elif action == 'wishlist':
+            yield Call('GET /api/customer/wishlist/', 'GET', '/api/customer/wishlist/?limit=20', token=token)
+        elif action == 'wishlist add':
+            yield Call('POST /api/customer/wishlist/', 'POST', '/api/customer/wishlist/',
+                       {'product_id': product_id}, token=token, expect=(201, 409))
+        elif action == 'wishlist remove':
+            yield Call('DELETE /api/customer/wishlist/', 'DELETE', '/api/customer/wishlist/',
+                       {'product_id': product_id}, token=token, expect=(200, 404))
+        elif action == 'promo codes':
+            path = rng.choice(['/api/store/promocode/', '/api/store/async/promocode/'])
+            yield Call(f'GET {path}', 'GET', path, token=token)
+        elif action == 'refresh' and refresh:
+            path = rng.choice(['/api/users/token/refresh/', '/api/token/refresh/'])
+            response = yield Call(f'POST {path}', 'POST', path, {'refresh': refresh})
+            refreshed = _json(response)
+            token = refreshed.get('access', token)
+            refresh = refreshed.get('refresh', refresh)
+        elif action == 'token':
+            yield Call('POST /api/token/', 'POST', '/api/token/', {'username': username, 'password': PASSWORD})
+
+
+def checkout_session(data, rng, worker):
+    """
+    Customers filling a cart one item at a time and in batches, trying a
+    promo code and checking out. Each worker plays its own customer so
+    concurrent sessions never check out the same cart.
+    """
+    tokens = yield from _login(data.customers[worker % len(data.customers)])
+    token = tokens.get('access')
+    if not token:
+        return
+
+    for _ in range(SESSION_LENGTH // 8):
+        yield from _browse(data, rng, token)
+        product_id = rng.choice(data.product_ids)
+        yield Call('POST /api/customer/cart/', 'POST', '/api/customer/cart/',
+                   {'product_id': product_id, 'quantity': rng.randint(1, 3)}, token=token)
+        if rng.random() < 0.2:
+            yield Call('DELETE /api/customer/cart/', 'DELETE', '/api/customer/cart/',
+                       {'product_id': product_id}, token=token)
+        operations = [
+            {'op': 'add', 'product_id': pid, 'quantity': rng.randint(1, 3)}
+            for pid in rng.sample(data.product_ids, rng.randint(1, 5))
+        ]
+        yield Call('POST /api/customer/cart/batch/', 'POST', '/api/customer/cart/batch/',
+                   {'operations': operations}, token=token)
+        if rng.random() < 0.8:
+            yield Call('POST /api/store/promocode/apply/', 'POST', '/api/store/promocode/apply/',
+                       {'code': rng.choice(data.promo_codes)}, token=token)
+        else:
+            yield Call('POST /api/store/promocode/apply/', 'POST', '/api/store/promocode/apply/',
+                       {'code': rng.choice(data.expired_codes + ['NOPE', 'SAVE50'])}, token=token,
+                       expect=(400, 404))
+        yield Call('GET /api/customer/cart/', 'GET', '/api/customer/cart/', token=token)
+        yield Call('POST /api/customer/checkout/', 'POST', '/api/customer/checkout/', token=token, expect=(201,))
+        if rng.random() < 0.3:
+            product_ids = rng.sample(data.product_ids, rng.randint(2, 10))
+            yield Call('POST /api/customer/wishlist/bulk/', 'POST', '/api/customer/wishlist/bulk/',
+                       {'product_ids': product_ids}, token=token)
+            yield Call('DELETE /api/customer/wishlist/bulk/', 'DELETE', '/api/customer/wishlist/bulk/',
+                       {'product_ids': product_ids}, token=token)
+
+
+def reporting_session(data, rng, worker):
+    """A store manager reading reports and alerts and maintaining the catalog and promo codes."""
+    tokens = yield from _login(data.manager)
+    token = tokens.get('access')
+    if not token:
+        return
+
+    actions = {
+        'report': 20, 'async report': 8, 'low stock': 10, 'async low stock': 5, 'promo codes': 5,
+        'create promo': 3, 'cache stats': 5, 'product crud': 6, 'add product': 3, 'products': 3,
+    }
+    for _ in range(SESSION_LENGTH):
+        action = rng.choices(list(actions), weights=list(actions.values()))[0]
+        if action in ('report', 'async report'):
+            params = {'filter': rng.choice(['most_sold', 'least_sold', 'category'])}
+            if params['filter'] == 'category':
+                params['category'] = rng.choice(data.categories)
+            if rng.random() < 0.5:
+                params.update({'from': data.first_day, 'to': data.last_day})
+            path = '/api/store/reports/' if action == 'report' else '/api/store/async/reports/'
+            yield Call(f'GET {path}', 'GET', f'{path}?{urlencode(params)}', token=token)
+        elif action == 'low stock':
+            yield Call('GET /api/store/low-stock-alert/', 'GET', '/api/store/low-stock-alert/', token=token)
+        elif action == 'async low stock':
+            yield Call('GET /api/store/async/low-stock-alert/', 'GET', '/api/store/async/low-stock-alert/',
+                       token=token)
+        elif action == 'promo codes':
+            yield Call('GET /api/store/promocode/', 'GET', '/api/store/promocode/', token=token)
+        elif action == 'create promo':
+            expiry = (timezone.now() + timedelta(days=rng.randint(1, 60))).isoformat()
+            yield Call('POST /api/store/promocode/', 'POST', '/api/store/promocode/', {
+                'code': f'M{worker}{rng.getrandbits(48):x}'[:20],
+                'discount_percent': rng.randint(5, 30), 'expiry_date': expiry,
+            }, token=token, expect=(201,))
+        elif action == 'cache stats':
+            yield Call('GET /api/store/cache-stats/', 'GET', '/api/store/cache-stats/', token=token)
+        elif action in ('product crud', 'add product'):
+            product = {
+                'name': f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} m{worker}',
+                'category': rng.choice(data.categories),
+                'price': f'{rng.randint(50, 5000) / 100:.2f}',
+                'stock': rng.randint(0, 100),
+            }
+            path = '/api/store/products/' if action == 'product crud' else '/api/store/products/add/'
+            response = yield Call(f'POST {path}', 'POST', path, product, token=token, expect=(201,))
+            product_id = _json(response).get('id')
+            if product_id is None:
+                continue
+            if action == 'product crud':
+                yield Call('PUT /api/store/products/<id>/', 'PUT', f'/api/store/products/{product_id}/',
+                           {'stock': rng.randint(0, 100)}, token=token)
+            yield Call('DELETE /api/store/products/<id>/', 'DELETE', f'/api/store/products/{product_id}/',
+                       token=token, expect=(204,))
+        elif action == 'products':
+            yield Call('GET /api/store/products/', 'GET', '/api/store/products/', token=token)
+
+
+MIXES = {
+    'browse': browse_session,
+    'checkout': checkout_session,
+    'reporting': reporting_session,
+}
+
+
+def session_factory(mix, data, seed):
+    """Returns `session(worker)` for loadtest.run_sessions."""
+    started = {}
+
+    def session(worker):
+        number = started[worker] = started.get(worker, -1) + 1
+        rng = random.Random(f'{seed}:{mix}:{worker}:{number}')
+        return MIXES[mix](data, rng, worker)
+
+    return session
+
+
+def profile_queries(mix, data, seed, total, worker):
+    """
+    Replays the first `total` requests of `mix` for virtual user `worker`
+    in this process with the test client and returns the mean number of SQL
+    queries per request for each route. Use a worker number the load run
+    doesn't, so the two don't replay the same writes.
+    """
+    session = session_factory(mix, data, seed)
+    client = Client(HTTP_HOST='localhost')
+    calls = session(worker)
+    response = None
+    counts = {}
+    for _ in range(total):
+        try:
+            call = calls.send(response)
+        except StopIteration:
+            calls = session(worker)
+            call = calls.send(None)
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {call.token}'} if call.token else {}
+        with CaptureQueriesContext(connection) as queries:
+            result = client.generic(
+                call.method, call.path, data=call.encoded_body() or '', content_type='application/json', **extra
+            )
+        response = (result.status_code, result.content)
+        counts.setdefault(call.route, []).append(len(queries))
+    return {route: round(mean(values), 2) for route, values in counts.items()}
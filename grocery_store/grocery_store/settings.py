@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -49,6 +50,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'grocery_store.compression.CompressionMiddleware',
+    'grocery_store.query_stats.QueryStatsMiddleware',
+    'grocery_store.db_router.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,13 +86,100 @@ WSGI_APPLICATION = 'grocery_store.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+#
+# WAL lets readers run alongside the single writer; with it, synchronous=
+# NORMAL only risks the last transactions on power loss, not corruption.
+# Connections are kept open for CONN_MAX_AGE seconds instead of being
+# reopened, and re-running these pragmas, on every request.
+SQLITE_INIT_COMMAND = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA temp_store=MEMORY;'
+    'PRAGMA cache_size=-32000;'
+    'PRAGMA mmap_size=268435456'
+)
+
+DATABASE_PATH = os.environ.get('GROCERY_DB_PATH', BASE_DIR / 'db.sqlite3')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # GROCERY_DB_PATH lets benchmarks run servers against a scratch database.
+        'NAME': DATABASE_PATH,
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Transactions that read and then write (cart holds, checkout)
+            # take the write lock up front and wait for it, rather than
+            # failing with "database is locked" when upgrading a read lock.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': SQLITE_INIT_COMMAND,
+        },
+    },
+    # Read by reports, low-stock alerts, browsing and product reads (see
+    # grocery_store/db_router.py). Locally a copy of the primary refreshed
+    # by `manage.py refresh_replica`; reads use the primary until it exists.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('GROCERY_REPLICA_PATH', f'{os.path.splitext(DATABASE_PATH)[0]}.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': SQLITE_INIT_COMMAND,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['grocery_store.db_router.PrimaryReplicaRouter']
+
+# How long a client that wrote keeps reading from the primary; more than
+# the replica's refresh interval.
+REPLICA_PIN_SECONDS = 10
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# The catalog cache holds pre-serialized product pages keyed by a catalog
+# version (see store/cache.py). LocMemCache evicts least-recently-used
+# entries once MAX_ENTRIES is reached, culling 1/CULL_FREQUENCY of them.
+#
+# Each worker process has its own LocMemCache, so the version itself lives
+# in the `catalog_version` alias, shared by every process on the host: a
+# write handled by one worker invalidates the pages cached by all of them.
+# Deployments spread over several hosts should point both aliases at a
+# shared backend (Redis, Memcached).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'catalog_version': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': f'{os.path.splitext(DATABASE_PATH)[0]}.cache',
+        'TIMEOUT': None,
+    },
+}
+
+CATALOG_VERSION_CACHE_ALIAS = 'catalog_version'
+
+# Keeps `catalog_version` in memory during tests (see grocery_store/testing.py).
+TEST_RUNNER = 'grocery_store.testing.TestRunner'
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -112,7 +203,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     )
 }
 
@@ -126,6 +217,21 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# How long adding a product to the cart holds its stock (store/reservations.py).
+STOCK_RESERVATION_TTL = timedelta(minutes=15)
+
+# How long a response is replayed for a repeated Idempotency-Key (store/idempotency.py).
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Queued checkouts committed per transaction by run_checkout_workers (customer/checkout_queue.py).
+CHECKOUT_BATCH_SIZE = 100
+
+# Seconds a sharded product's stock total is cached for reads (store/sharded_stock.py).
+SHARDED_STOCK_CACHE_TIMEOUT = 2
+
+# Smallest response body compressed (grocery_store/compression.py).
+RESPONSE_COMPRESSION_MIN_LENGTH = 1024
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
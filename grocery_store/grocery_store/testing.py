@@ -0,0 +1,79 @@
+"""
+Test helpers.
+
+QueryBudgetMixin lets a TestCase declare how many SQL statements each
+endpoint may run and fails when a request goes over, listing what ran:
+
+    class CartQueryBudgetTests(QueryBudgetMixin, TestCase):
+        query_budgets = {
+            ('GET', 'cart'): 3,
+        }
+
+        def test_cart(self):
+            self.assertWithinBudget('GET', 'cart')
+
+Statements are counted like QueryStatsMiddleware counts them, so the
+X-DB-Query-Count header shows the number a budget is checked against.
+
+TestRunner (the project's TEST_RUNNER) keeps the shared catalog version in
+memory, so test runs neither write next to the development database nor
+share versions with a server running on it.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .query_stats import QueryRecorder
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES={
+            **settings.CACHES,
+            'catalog_version': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'catalog_version',
+            },
+        })
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    # (method, URL name) -> maximum number of statements per request.
+    query_budgets = {}
+
+    def assertWithinBudget(self, method, url_name, data=None, url_kwargs=None, query=None,
+                           expected_status=None, budget=None):
+        """
+        Sends `method` to the named URL with self.client and fails if it runs
+        more statements than its budget, or returns an error status (or one
+        other than `expected_status`). Returns the response.
+        """
+        if budget is None:
+            try:
+                budget = self.query_budgets[(method, url_name)]
+            except KeyError:
+                self.fail(f"No query budget declared for {method} {url_name}.")
+        url = reverse(url_name, kwargs=url_kwargs)
+        if query:
+            url = f"{url}?{query}"
+
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method.lower())(url, data, format='json')
+
+        if expected_status is not None:
+            self.assertEqual(response.status_code, expected_status, getattr(response, 'data', response))
+        else:
+            self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+        if recorder.count > budget:
+            statements = '\n'.join(f"  {i}. {sql}" for i, (sql, _) in enumerate(recorder.queries, 1))
+            self.fail(
+                f"{method} {url_name} ran {recorder.count} queries, over its budget of {budget}:\n{statements}"
+            )
+        return response
@@ -0,0 +1,62 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from grocery_store.db_router import use_replica
+from users.authentication import aauthenticate
+from .models import LowStockEvent, PromoCode
+from .serializers import PromoCodeSerializer, SalesReportSerializer
+from .sharded_stock import load_totals
+from .views import SalesReportView
+
+# Native async (ASGI) versions of the read-heavy store endpoints. They share
+# query building with the DRF views and evaluate it with the async ORM, so
+# under an ASGI server a slow report doesn't pin a worker thread.
+
+
+def _error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+@require_GET
+async def sales_report(request):
+    """GET /api/store/async/reports/ - async SalesReportView."""
+    if await aauthenticate(request) is None:
+        return _error("Authentication credentials were not provided or are invalid.", 401)
+    use_replica()
+    try:
+        report = SalesReportView.get_report(request.GET)
+    except ValueError as e:
+        return _error(str(e), 400)
+    rows = [row async for row in report.aiterator(chunk_size=2000)]
+    return JsonResponse(SalesReportSerializer(rows, many=True).data, safe=False)
+
+
+@require_GET
+async def low_stock_alerts(request):
+    """GET /api/store/async/low-stock-alert/ - async LowStockAlertView."""
+    user = await aauthenticate(request)
+    if user is None:
+        return _error("Authentication credentials were not provided or are invalid.", 401)
+    if getattr(user, 'role', None) != 'manager':
+        return _error("Only managers can view low-stock alerts.", 403)
+    use_replica()
+
+    alerts = LowStockEvent.objects.filter(active=True).select_related('product').order_by('id')
+    alerts = [alert async for alert in alerts.aiterator()]
+    if any(alert.product.stock_shards for alert in alerts):
+        await sync_to_async(load_totals)([alert.product for alert in alerts])
+    data = [{"product": alert.product.name, "quantity": alert.product.stock} for alert in alerts]
+    if not data:
+        return JsonResponse({"message": "All stocks are sufficient!"})
+    return JsonResponse({"low_stock_alerts": data})
+
+
+@require_GET
+async def promo_codes(request):
+    """GET /api/store/async/promocode/ - async PromoCodeView.get."""
+    if await aauthenticate(request) is None:
+        return _error("Authentication credentials were not provided or are invalid.", 401)
+    codes = PromoCode.objects.filter(active=True, expiry_date__gt=timezone.now())
+    rows = [code async for code in codes.aiterator()]
+    return JsonResponse(PromoCodeSerializer(rows, many=True).data, safe=False)
@@ -0,0 +1,135 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from grocery_store.db_router import pin_seconds, reads_from_replica
+
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CHANGED_KEY = 'catalog:changed'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def _version_cache():
+    """
+    Where the version and change time are kept: a cache every worker
+    process shares, so a bump in one invalidates the pages of all.
+    """
+    return caches[getattr(settings, 'CATALOG_VERSION_CACHE_ALIAS', CATALOG_CACHE_ALIAS)]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_shared_version(key):
+    """The version under `key` in the cache every worker process shares."""
+    version = _version_cache().get(key)
+    if version is None:
+        _version_cache().add(key, time.time_ns(), timeout=None)
+        version = _version_cache().get(key)
+    return version
+
+
+def _next_version(key):
+    # A fresh timestamp rather than an increment, which shared backends
+    # without an atomic incr could lose to a concurrent bump.
+    return max(time.time_ns(), (_version_cache().get(key) or 0) + 1)
+
+
+def bump_shared_version(key):
+    _version_cache().set(key, _next_version(key), timeout=None)
+
+
+def get_catalog_version():
+    return get_shared_version(CATALOG_VERSION_KEY)
+
+
+def get_catalog_changed():
+    """
+    Timestamp of the last catalog version bump. A cache that hasn't seen
+    one starts from the time it was first asked, since the catalog may
+    have changed just before.
+    """
+    changed = _version_cache().get(CATALOG_CHANGED_KEY)
+    if changed is None:
+        now = time.time()
+        _version_cache().add(CATALOG_CHANGED_KEY, now, timeout=None)
+        changed = _version_cache().get(CATALOG_CHANGED_KEY, now)
+    return changed
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached catalog entry at once: entries are keyed by the
+    version, so old ones simply stop being read and age out of the LRU.
+    """
+    now = _next_version(CATALOG_VERSION_KEY)
+    # Before the bump, so the new version is never reported as older.
+    _version_cache().set(CATALOG_CHANGED_KEY, now / 1e9, timeout=None)
+    _version_cache().set(CATALOG_VERSION_KEY, now, timeout=None)
+    _count('invalidations')
+
+
+def bump_catalog_version_on_commit():
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_key(*parts):
+    """
+    Entries built from the replica are kept apart, so a client pinned to
+    the primary after a write never gets a page that predates it.
+    """
+    raw = ':'.join(str(part) for part in parts)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    source = 'replica' if reads_from_replica() else 'primary'
+    return f"catalog:{get_catalog_version()}:{source}:{digest}"
+
+
+def get_cached(key):
+    """Returns the data cached under a `catalog_key()`, or None."""
+    data = _cache().get(key)
+    _count('hits' if data is not None else 'misses')
+    return data
+
+
+def set_cached(key, data, timeout=300):
+    if reads_from_replica():
+        # The replica may lag the version the page is filed under.
+        timeout = min(timeout, pin_seconds())
+    _cache().set(key, data, timeout=timeout)
+
+
+def get_or_build(parts, build, timeout=300):
+    """
+    Returns the pre-serialized data cached under `parts` for the current
+    catalog version, calling `build()` to produce and store it on a miss.
+    The key is fixed before building, so data built while the version is
+    bumped is stored under the old, already invalid, version.
+    """
+    key = catalog_key(*parts)
+    data = get_cached(key)
+    if data is None:
+        data = build()
+        set_cached(key, data, timeout=timeout)
+    return data
+
+
+def catalog_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    stats['version'] = get_catalog_version()
+    return stats
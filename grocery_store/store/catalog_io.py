@@ -0,0 +1,317 @@
+"""
+Bulk product import and export as CSV or NDJSON.
+
+Imports read the upload line by line, check each row with the small
+validators below rather than a ProductSerializer per row, and upsert in
+chunks with bulk_create(update_conflicts=True), so memory stays flat
+whatever the file size. Rows are matched on `id`:
+
+- files with name, category, price and stock create rows without an id
+  and upsert rows with one;
+- files with `id` and only some columns (e.g. `id,price` for a price
+  list refresh) update those columns of existing products.
+
+Invalid rows are skipped and reported by line; every chunk is its own
+transaction. Exports stream the catalog from a chunked iterator in the
+same columns, so an export can be edited and imported back.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version_on_commit
+from .low_stock import track_low_stock
+from .models import Product
+from .renderers import stream_rows
+from .sharded_stock import spread_stock
+
+FORMATS = ('csv', 'ndjson')
+COLUMNS = ('id', 'name', 'category', 'price', 'stock', 'image_url', 'low_stock_threshold')
+REQUIRED = ('name', 'category', 'price', 'stock')
+EXPORT_COLUMNS = COLUMNS + ('created_by',)
+# Exported but not importable; ignored on import.
+IGNORED = ('created_by',)
+MAX_PRICE = Decimal('100000000')   # max_digits=10, decimal_places=2
+MAX_REPORTED_ERRORS = 100
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _integer(value, field, minimum=0):
+    if isinstance(value, int) and not isinstance(value, bool):
+        number = value
+    elif isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        number = int(value)
+    else:
+        raise ValueError(f"'{field}' must be an integer.")
+    if number < minimum:
+        raise ValueError(f"'{field}' must be at least {minimum}.")
+    return number
+
+
+def _text(value, field, max_length):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{field}' must be a non-empty string.")
+    value = value.strip()
+    if len(value) > max_length:
+        raise ValueError(f"'{field}' must be at most {max_length} characters.")
+    return value
+
+
+def _price(value):
+    if isinstance(value, (bool, float)) or value is None:
+        raise ValueError("'price' must be a decimal number with at most 2 decimal places.")
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError("'price' must be a decimal number with at most 2 decimal places.")
+    if not price.is_finite() or price.as_tuple().exponent < -2:
+        raise ValueError("'price' must be a decimal number with at most 2 decimal places.")
+    if price < 0 or price >= MAX_PRICE:
+        raise ValueError(f"'price' must be between 0 and {MAX_PRICE}.")
+    return price
+
+
+def _image_url(value):
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str) or len(value) > 200 or not value.startswith(('http://', 'https://')):
+        raise ValueError("'image_url' must be an http(s) URL of at most 200 characters.")
+    return value
+
+
+CLEANERS = {
+    'id': lambda value: _integer(value, 'id', minimum=1),
+    'name': lambda value: _text(value, 'name', 100),
+    'category': lambda value: _text(value, 'category', 100),
+    'price': _price,
+    'stock': lambda value: _integer(value, 'stock'),
+    'image_url': _image_url,
+    'low_stock_threshold': lambda value: _integer(value, 'low_stock_threshold'),
+}
+
+
+def clean_row(values, columns):
+    """Returns the validated, typed values of `columns`. Raises ValueError."""
+    cleaned = {}
+    for column in columns:
+        value = values.get(column)
+        if column == 'id' and value in (None, ''):
+            cleaned['id'] = None
+        else:
+            cleaned[column] = CLEANERS[column](value)
+    return cleaned
+
+
+def _check_columns(columns):
+    unknown = [column for column in columns if column not in COLUMNS and column not in IGNORED]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}. Allowed: {', '.join(COLUMNS)}.")
+    if len(set(columns)) != len(columns):
+        raise ValueError("Duplicate columns.")
+    if not all(column in columns for column in REQUIRED) and 'id' not in columns:
+        raise ValueError(
+            "Include 'id' to update products, or name, category, price and stock to create them."
+        )
+    if not [column for column in columns if column in COLUMNS and column != 'id']:
+        raise ValueError("Nothing to import besides 'id'.")
+
+
+def _csv_rows(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("The file is empty.")
+    columns = [column.strip() for column in header]
+    _check_columns(columns)
+
+    def rows():
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            if len(row) != len(columns):
+                yield reader.line_num, None, f"Expected {len(columns)} values, got {len(row)}."
+            else:
+                yield reader.line_num, dict(zip(columns, row)), None
+    return columns, rows()
+
+
+def _ndjson_rows(lines):
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    first = next(numbered, None)
+    if first is None:
+        raise ValueError("The file is empty.")
+    try:
+        first_row = json.loads(first[1])
+    except ValueError:
+        raise ValueError("Line 1 is not valid JSON.")
+    if not isinstance(first_row, dict):
+        raise ValueError("Each line must be a JSON object.")
+    # The first object's keys are the columns, like a CSV header.
+    columns = list(first_row)
+    _check_columns(columns)
+
+    def rows():
+        yield first[0], first_row, None
+        for number, line in numbered:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None, "Not valid JSON."
+                continue
+            if not isinstance(row, dict) or set(row) != set(columns):
+                yield number, None, f"Expected an object with the keys {', '.join(columns)}."
+            else:
+                yield number, row, None
+    return columns, rows()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        errors = sorted(self.errors, key=lambda error: error['line'])
+        return {'created': self.created, 'updated': self.updated, 'rejected': self.rejected, 'errors': errors}
+
+
+def import_products(lines, fmt, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Imports products from an iterable of text lines in `fmt` ('csv' or
+    'ndjson'). New products are created by `user`. Returns counts of created,
+    updated and rejected rows plus the first errors. Raises ValueError when
+    the file can't be imported at all (unknown format, bad header).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format. Use {' or '.join(FORMATS)}.")
+    columns, rows = (_csv_rows if fmt == 'csv' else _ndjson_rows)(lines)
+    columns = [column for column in columns if column not in IGNORED]
+    full = all(column in columns for column in REQUIRED)
+    update_fields = [column for column in columns if column != 'id']
+
+    result = ImportResult()
+    chunk = []
+    for line, values, error in rows:
+        if error is None:
+            try:
+                chunk.append((line, clean_row(values, columns)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            result.reject(line, error)
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, update_fields, full, user, result)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, update_fields, full, user, result)
+
+    if result.created or result.updated:
+        bump_catalog_version_on_commit()
+    return result.as_dict()
+
+
+def _write_chunk(chunk, update_fields, full, user, result):
+    # Later rows for the same id win, as if applied one after the other.
+    # The lines they replace share their fate: counted as updated when the
+    # product exists, rejected with it when it is rejected, and not counted
+    # when the product is created.
+    by_id = {}
+    replaced = {}
+    new = []
+    for line, row in chunk:
+        if row.get('id') is None:
+            new.append((line, row))
+        else:
+            if row['id'] in by_id:
+                replaced.setdefault(row['id'], []).append(by_id[row['id']][0])
+            by_id[row['id']] = (line, row)
+
+    with transaction.atomic(using=router.db_for_write(Product)):
+        existing = set(Product.objects.filter(id__in=list(by_id)).values_list('id', flat=True)) if by_id else set()
+        updates, upserts, inserts = [], [], []
+        for product_id, (line, row) in by_id.items():
+            lines = replaced.get(product_id, []) + [line]
+            if product_id in existing:
+                updates.append(row)
+                result.updated += len(lines) - 1
+            elif not full:
+                for line in lines:
+                    result.reject(line, f"Product {product_id} does not exist.")
+            elif user is None:
+                for line in lines:
+                    result.reject(line, "New products need a creating user.")
+            else:
+                upserts.append(Product(**row, created_by=user))
+        for line, row in new:
+            if not full:
+                result.reject(line, "Rows without an 'id' need name, category, price and stock.")
+            elif user is None:
+                result.reject(line, "New products need a creating user.")
+            else:
+                inserts.append(Product(**row, created_by=user))
+
+        now = timezone.now()
+        for row in updates:
+            row['updated_at'] = now
+        _update_existing(updates, update_fields + ['updated_at'])
+        if updates and 'stock' in update_fields:
+            spread_stock([row['id'] for row in updates])
+        if upserts:
+            # Upsert rather than insert: the id may have been taken since the check above.
+            Product.objects.bulk_create(
+                upserts, update_conflicts=True, unique_fields=['id'], update_fields=update_fields + ['updated_at']
+            )
+        if inserts:
+            Product.objects.bulk_create(inserts)
+        result.updated += len(updates)
+        result.created += len(upserts) + len(inserts)
+
+        if 'stock' in update_fields or 'low_stock_threshold' in update_fields:
+            changed = [row['id'] for row in updates] + [product.id for product in upserts + inserts]
+            track_low_stock(Product.objects.filter(id__in=changed).only('id', 'stock', 'low_stock_threshold'))
+
+
+def _update_existing(rows, update_fields):
+    """
+    Writes `update_fields` of existing products as a single executemany
+    UPDATE. Unlike bulk_create or bulk_update this skips building a model
+    instance and compiling SQL per row, which is most of the cost of a
+    large refresh, and leaves the other columns alone.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(Product)]
+    fields = [Product._meta.get_field(name) for name in update_fields]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Product._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(Product._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(row[field.name], connection) for field in fields] + [row['id']]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def export_products(fmt, chunk_size=2000):
+    """
+    Returns the whole catalog in `fmt` as an iterator of text chunks of
+    `chunk_size` products, read with a chunked iterator.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format. Use {' or '.join(FORMATS)}.")
+    rows = Product.objects.order_by('id').values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+    return stream_rows(rows, EXPORT_COLUMNS, fmt, chunk_size=chunk_size)
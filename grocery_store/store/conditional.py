@@ -0,0 +1,66 @@
+"""
+Conditional GET for catalog pages.
+
+Catalog pages (product list and detail, browse) are cached per catalog
+version (see store/cache.py), so their validators come from the cache
+alone: the ETag from the page's cache key and the time the catalog last
+changed, Last-Modified from that time. A client polling with
+If-None-Match or If-Modified-Since gets a 304 without the page being
+built or the database being queried.
+
+- The version and change time are shared by every worker process (the
+  `catalog_version` cache), so a write handled by one worker changes the
+  ETags all of them hand out.
+- Pages read from the replica may lag the version they are filed under,
+  so their ETags also change every REPLICA_PIN_SECONDS, like their cache
+  entries expire.
+- Last-Modified has whole-second precision; clients should prefer ETags.
+"""
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from grocery_store.db_router import pin_seconds, reads_from_replica
+from . import cache as catalog_cache
+
+
+def catalog_validators(*parts):
+    """(etag, last_modified) of the catalog page cached under `parts`."""
+    changed = catalog_cache.get_catalog_changed()
+    raw = f'{catalog_cache.catalog_key(*parts)}:{changed!r}'
+    if reads_from_replica():
+        raw += f':{int(time.time() // pin_seconds())}'
+    return f'W/"{hashlib.md5(raw.encode()).hexdigest()}"', int(changed)
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response when the client's copy is current, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Authenticated pages; clients may keep them but must revalidate.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def catalog_response(request, parts, build, timeout=300):
+    """
+    DRF Response for the catalog page cached under `parts` (built with
+    `build()` on a miss), or a 304 when the client's copy is current.
+    """
+    etag, last_modified = catalog_validators(*parts)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = add_validators(
+            Response(catalog_cache.get_or_build(parts, build, timeout=timeout)), etag, last_modified
+        )
+    return response
@@ -0,0 +1,149 @@
+"""
+Idempotency-Key support for mutating endpoints.
+
+A client that may retry a request (e.g. a checkout that timed out) sends
+an `Idempotency-Key` header with a unique value. The first request with a
+key claims it and runs; its response is stored in the same transaction as
+the view's writes. Repeats of the key by the same user then get that
+response back, marked `Idempotent-Replayed: true`, without running the
+view again. A repeat that arrives while the first request is still running
+waits for it (up to WAIT_TIMEOUT) instead of racing it.
+
+- Reusing a key for a different request (method, path or body) is a 422.
+- Server errors (5xx) are not stored, so the key can be retried.
+- Keys are kept for IDEMPOTENCY_KEY_TTL and then deleted by
+  `manage.py purge_idempotency_keys`.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = timedelta(hours=24)
+# How long a repeat waits for the first request to finish, polling every
+# POLL_INTERVAL seconds.
+WAIT_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+# A claim this old without a response belongs to a request that died.
+STALE_AFTER = timedelta(minutes=1)
+
+
+def key_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Returns (record, created): the key's record, created now if it was free."""
+    while True:
+        now = timezone.now()
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is not None:
+            stale = record.response_status is None and record.created_at <= now - STALE_AFTER
+            if record.expires_at > now and not stale:
+                return record, False
+            IdempotencyKey.objects.filter(id=record.id).delete()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, created_at=now, expires_at=now + key_ttl()
+                ), True
+        except IntegrityError:
+            # Another request claimed the key just now; look again.
+            continue
+
+
+def _wait_for(record):
+    """
+    Polls until the request holding `record` stores its response. Returns
+    the finished record, None if the claim was dropped (the request
+    failed), or the unfinished record after WAIT_TIMEOUT.
+    """
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        current = IdempotencyKey.objects.filter(id=record.id).first()
+        if current is None or current.response_status is not None:
+            return current
+    return record
+
+
+def _run(handler, record, view, request, *args, **kwargs):
+    try:
+        with transaction.atomic():
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                IdempotencyKey.objects.filter(id=record.id).update(
+                    response_status=response.status_code, response_body=response.data
+                )
+    except BaseException:
+        IdempotencyKey.objects.filter(id=record.id).delete()
+        raise
+    if response.status_code >= 500:
+        IdempotencyKey.objects.filter(id=record.id).delete()
+    return response
+
+
+def idempotent(handler):
+    """
+    Decorator for APIView handlers (post, delete, ...) that honours the
+    Idempotency-Key header. Requests without the header run as usual.
+    """
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        while True:
+            record, created = _claim(request.user, key, fingerprint)
+            if created:
+                return _run(handler, record, view, request, *args, **kwargs)
+            if record.fingerprint != fingerprint:
+                return Response({"error": f"This {HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.response_status is None:
+                record = _wait_for(record)
+                if record is None:
+                    continue
+                if record.response_status is None:
+                    return Response({"error": f"A request with this {HEADER} is still in progress."},
+                                    status=status.HTTP_409_CONFLICT)
+            return Response(record.response_body, status=record.response_status,
+                            headers={'Idempotent-Replayed': 'true'})
+    return wrapper
+
+
+def purge_expired(batch_size=1000, now=None):
+    """Deletes expired keys `batch_size` rows at a time. Returns the number deleted."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
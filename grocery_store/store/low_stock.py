@@ -0,0 +1,47 @@
+from django.utils import timezone
+from .models import LowStockEvent
+
+
+def track_low_stock(products, previously_low=None):
+    """
+    Records low-stock threshold crossings for `products`, whose stock and
+    threshold must already hold their new values. `previously_low` is the
+    set of product ids that were low before the change; when omitted it is
+    read from the open alerts. Costs nothing unless a threshold is crossed.
+    """
+    products = list(products)
+    if not products:
+        return []
+    if previously_low is None:
+        previously_low = set(
+            LowStockEvent.objects.filter(active=True, product_id__in=[p.id for p in products])
+            .values_list('product_id', flat=True)
+        )
+
+    now = timezone.now()
+    events = []
+    restocked = []
+    for product in products:
+        is_low = product.is_low_stock()
+        was_low = product.id in previously_low
+        if is_low and not was_low:
+            kind = LowStockEvent.LOW
+        elif was_low and not is_low:
+            kind = LowStockEvent.RESTOCKED
+            restocked.append(product.id)
+        else:
+            continue
+        events.append(LowStockEvent(
+            product=product,
+            kind=kind,
+            stock=product.stock,
+            threshold=product.low_stock_threshold,
+            active=is_low,
+            created_at=now
+        ))
+
+    if restocked:
+        LowStockEvent.objects.filter(active=True, product_id__in=restocked).update(active=False)
+    if events:
+        LowStockEvent.objects.bulk_create(events)
+    return events
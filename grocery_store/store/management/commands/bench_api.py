@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grocery_store.loadtest import Server, run_sessions, server_available
+from grocery_store.scenarios import MIXES, profile_queries, seed_database, session_factory
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the API over HTTP with realistic traffic mixes against a freshly seeded "
+        "scratch database. Reports throughput, p50/p95/p99 latency and SQL queries per request "
+        "per mix and route, optionally writes them as JSON and fails if they regressed "
+        "against a baseline JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', action='append', choices=sorted(MIXES),
+                            help="Mix to run; repeat for several. Default: all.")
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'runserver'],
+                            help="Default: wsgi (gunicorn) if installed, else runserver.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Concurrent virtual users.")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per mix.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Server processes.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker.")
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--profile-requests', type=int, default=200,
+                            help="Requests per mix replayed in-process to count queries.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Results JSON of an earlier run to compare against.")
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help="Allowed relative drop in throughput or rise in p95 latency.")
+        parser.add_argument('--max-query-increase', type=float, default=0.5,
+                            help="Allowed rise in mean queries per request for any route.")
+        parser.add_argument('--latency-slack-ms', type=float, default=2.0,
+                            help="p95 changes smaller than this are never regressions.")
+
+    def handle(self, *args, **options):
+        server = options['server'] or ('wsgi' if server_available('wsgi') else 'runserver')
+        if not server_available(server):
+            raise CommandError(f"The {server} server is not installed; try --server runserver.")
+        baseline = None
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+
+        mixes = options['mix'] or list(MIXES)
+        results = {
+            'meta': {
+                'server': server,
+                **{key: options[key] for key in ('concurrency', 'requests', 'workers', 'threads', 'products', 'seed')},
+            },
+            'mixes': {},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / 'bench.sqlite3'
+            data = seed_database(db_path, options['products'], customers=options['concurrency'] + 1,
+                                 seed=options['seed'])
+            queries = {
+                mix: profile_queries(mix, data, options['seed'], options['profile_requests'], options['concurrency'])
+                for mix in mixes
+            }
+            with Server(server, db_path, workers=options['workers'], threads=options['threads']) as running:
+                for mix in mixes:
+                    self.stderr.write(f"Running the {mix} mix...")
+                    stats = run_sessions(
+                        running.port, session_factory(mix, data, options['seed']),
+                        options['concurrency'], options['requests']
+                    )
+                    for route, route_stats in stats['routes'].items():
+                        route_stats['queries'] = queries[mix].get(route)
+                    results['mixes'][mix] = stats
+
+        self.report(results)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+        if baseline is not None:
+            if baseline.get('meta') != results['meta']:
+                self.stderr.write(self.style.WARNING(
+                    f"The baseline ran with different settings ({baseline.get('meta')}); "
+                    "the comparison may not be meaningful."
+                ))
+            regressions = self.compare(results, baseline, options)
+            if regressions:
+                raise CommandError("Performance regressed:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def report(self, results):
+        columns = f"{'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'queries':>8}"
+        for mix, stats in results['mixes'].items():
+            self.stdout.write(f"\n{mix}: {stats['requests']} requests")
+            self.stdout.write(f"  {'route':<52} {columns}")
+            rows = [('all routes', stats)] + list(stats['routes'].items())
+            for route, row in rows:
+                throughput = row.get('throughput', '')
+                queries = '' if row.get('queries') is None else row['queries']
+                self.stdout.write(
+                    f"  {route:<52} {throughput:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                    f"{row['p99_ms']:>8} {row['errors']:>7} {queries:>8}"
+                )
+            for route, samples in stats['error_samples'].items():
+                for status, body in samples:
+                    self.stderr.write(f"  {route} failed with {status}: {' '.join(body.split())}")
+
+    def compare(self, results, baseline, options):
+        """Returns a description of every metric that regressed beyond the thresholds."""
+        allowed = options['max_regression']
+        slack = options['latency_slack_ms']
+        regressions = []
+        for mix, stats in results['mixes'].items():
+            before = baseline.get('mixes', {}).get(mix)
+            if before is None:
+                continue
+            if stats['throughput'] < before['throughput'] * (1 - allowed):
+                regressions.append(f"{mix}: throughput {before['throughput']} -> {stats['throughput']} req/s")
+            if stats['errors'] / max(stats['requests'], 1) > before['errors'] / max(before['requests'], 1) + 0.01:
+                regressions.append(f"{mix}: errors {before['errors']} -> {stats['errors']}")
+
+            rows = [('all routes', stats, before)] + [
+                (route, row, before['routes'][route])
+                for route, row in stats['routes'].items() if route in before.get('routes', {})
+            ]
+            for route, row, old in rows:
+                if row['p95_ms'] > old['p95_ms'] * (1 + allowed) and row['p95_ms'] - old['p95_ms'] > slack:
+                    regressions.append(f"{mix} {route}: p95 {old['p95_ms']} -> {row['p95_ms']} ms")
+                if row.get('queries') is not None and old.get('queries') is not None \
+                        and row['queries'] > old['queries'] + options['max_query_increase']:
+                    regressions.append(f"{mix} {route}: queries/request {old['queries']} -> {row['queries']}")
+        return regressions
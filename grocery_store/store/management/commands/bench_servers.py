@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from grocery_store.loadtest import Call, Server, run_load, server_available
+from grocery_store.scenarios import manager_token, seed_database
+
+# (name, sync DRF path, native async path)
+ROUTES = [
+    ('browse', '/api/customer/browseProducts/?limit=20', '/api/customer/async/browseProducts/?limit=20'),
+    ('sales report', '/api/store/reports/', '/api/store/async/reports/'),
+    ('low stock', '/api/store/low-stock-alert/', '/api/store/async/low-stock-alert/'),
+    ('promo codes', '/api/store/promocode/', '/api/store/async/promocode/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the read endpoints under gunicorn (WSGI) and uvicorn (ASGI) at the same "
+        "client concurrency, using a scratch database. ASGI runs both the DRF views and "
+        "their native async variants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per route and mode.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Server processes.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker.")
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--output', help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / 'bench.sqlite3'
+            token = manager_token(seed_database(db_path, options['products'], customers=1))
+
+            for kind in ('wsgi', 'asgi'):
+                if not server_available(kind):
+                    self.stderr.write(f"Skipping {kind}: its server package is not installed.")
+                    continue
+                modes = [('drf', 1)] if kind == 'wsgi' else [('drf', 1), ('async', 2)]
+                with Server(kind, db_path, workers=options['workers'], threads=options['threads']) as server:
+                    for name, *paths in ROUTES:
+                        for mode, index in modes:
+                            path = paths[index - 1]
+                            stats = run_load(
+                                server.port, [Call(name, 'GET', path, token=token)],
+                                options['concurrency'], options['requests']
+                            )
+                            results.append({'server': kind, 'route': name, 'mode': mode, 'path': path, **stats})
+
+        self.stdout.write(
+            f"{'server':<6} {'route':<13} {'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['server']:<6} {r['route']:<13} {r['mode']:<6} {r['throughput']:>9} "
+                f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['errors']:>7}"
+            )
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
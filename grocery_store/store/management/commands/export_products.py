@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.catalog_io import FORMATS, export_products
+
+
+class Command(BaseCommand):
+    help = "Streams every product as CSV or NDJSON, in the columns import_products reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write. Default: stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunks = export_products(options['format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            sys.stdout.writelines(chunks)
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}."))
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import DEFAULT_CHUNK_SIZE, FORMATS, import_products
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates products from a CSV or NDJSON file (or stdin with '-'), "
+        "streaming it in chunks. See store/catalog_io.py for the columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension.")
+        parser.add_argument('--created-by', help="Username of the manager new products belong to.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError("Can't tell the format from the file name; pass --format.")
+        user = None
+        if options['created_by']:
+            try:
+                user = User.objects.get(username=options['created_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['created_by']!r}.")
+
+        try:
+            if path == '-':
+                result = import_products(sys.stdin, fmt, user=user, chunk_size=options['chunk_size'])
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as lines:
+                    result = import_products(lines, fmt, user=user, chunk_size=options['chunk_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f"  line {error['line']}: {error['error']}")
+        if result['rejected'] > len(result['errors']):
+            self.stderr.write(f"  ... and {result['rejected'] - len(result['errors'])} more rejected rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, updated {result['updated']}, rejected {result['rejected']} products."
+        ))
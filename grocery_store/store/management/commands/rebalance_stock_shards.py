@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.sharded_stock import rebalance
+
+
+class Command(BaseCommand):
+    help = (
+        "Evens out the stock shards of hot products when one runs low and copies "
+        "their totals to Product.stock. With --interval it keeps running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--low-water', type=float, default=0.25,
+                            help="Rebalance when a shard holds less than this share of an even split.")
+        parser.add_argument('--interval', type=float, help="Run repeatedly, this many seconds apart.")
+
+    def handle(self, *args, **options):
+        while True:
+            moved = rebalance(low_water=options['low_water'])
+            if moved or not options['interval']:
+                self.stdout.write(f"Rebalanced {moved} products.")
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the ProductPopularity table from raw Sale rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_popularity(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt popularity for {written} products."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the ProductDailySales rollup from raw Sale rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_sales(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily sales rows."))
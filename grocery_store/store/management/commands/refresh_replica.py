@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from grocery_store.db_router import refresh_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database to the read replica with the backup API. "
+        "With --interval it keeps running and refreshes every INTERVAL seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Refresh repeatedly, this many seconds apart.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            try:
+                refresh_replica()
+            except ValueError as e:
+                raise CommandError(str(e))
+            if not options['interval']:
+                self.stdout.write(f"Replica refreshed in {(time.perf_counter() - started) * 1000:.0f} ms.")
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired stock reservations in batches. With --interval it keeps "
+        "running and sweeps every INTERVAL seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, help="Sweep repeatedly, this many seconds apart.")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = release_expired(batch_size=options['batch_size'])
+            if deleted or not options['interval']:
+                self.stdout.write(f"Released {deleted} expired reservations.")
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,327 @@
+import math
+import random
+import time
+from array import array
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from customer.models import Cart, CartItem, Order, OrderItem, Wishlist, WishlistItem
+from grocery_store.scenarios import ADJECTIVES, CATEGORIES, NOUNS
+from store.cache import bump_catalog_version
+from store.models import LowStockEvent, Product, PromoCode, Sale
+from store.popularity import rebuild_popularity
+from store.rollups import rebuild_daily_sales
+from store.search import deferred_fts_indexing
+from users.models import User
+
+# Relative order volume by hour of day (UTC) and by weekday (Monday first).
+HOURLY = [0.15, 0.1, 0.08, 0.08, 0.1, 0.2, 0.45, 0.7, 0.9, 1.0, 1.1, 1.3,
+          1.4, 1.2, 1.0, 1.0, 1.1, 1.4, 1.6, 1.5, 1.2, 0.9, 0.6, 0.3]
+WEEKDAY = [0.9, 0.85, 0.9, 0.95, 1.1, 1.35, 1.25]
+LOW_STOCK_THRESHOLD = 10
+DRAW_BATCH = 4096
+
+
+def _timestamp(seconds):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+
+def _geometric(rng, mean):
+    """A count of at least 1 with the given mean, most often 1."""
+    if mean <= 1:
+        return 1
+    return 1 + int(math.log(1.0 - rng.random()) / math.log(1.0 - 1.0 / mean))
+
+
+class TableWriter:
+    """
+    Streams rows of one model into its table with a chunked executemany.
+    Rows are tuples already in database form, in the order of `fields`, so
+    per row only the tuple is built, unlike bulk_create which instantiates
+    and prepares a model per row. Holds at most `batch_size` rows.
+    """
+
+    def __init__(self, model, fields, batch_size):
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+        self.sql = (
+            f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})"
+        )
+        self.label = model._meta.label
+        self.table = model._meta.db_table
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.sql, self.rows)
+            self.written += len(self.rows)
+            self.rows = []
+
+
+class ZipfSampler:
+    """
+    Draws indexes 0..n-1 where the k-th most popular has weight 1 / k**s.
+    Ranks are spread over the indexes by a fixed permutation, so the most
+    popular rows aren't simply the first ones.
+    """
+
+    def __init__(self, n, s, rng):
+        self.n = n
+        self.rng = rng
+        self.ranks = range(n)
+        self.cum_weights = list(accumulate(1.0 / k ** s for k in range(1, n + 1)))
+        self.stride = 1
+        if n > 2:
+            self.stride = rng.randrange(n // 3, n)
+            while math.gcd(self.stride, n) != 1:
+                self.stride += 1
+        self.offset = rng.randrange(n)
+        self.drawn = []
+
+    def draw(self):
+        if not self.drawn:
+            ranks = self.rng.choices(self.ranks, cum_weights=self.cum_weights, k=DRAW_BATCH)
+            self.drawn = [(rank * self.stride + self.offset) % self.n for rank in ranks]
+        return self.drawn.pop()
+
+
+class SeasonalClock:
+    """
+    Draws epoch seconds within the `days` before `end`, weighted by a yearly
+    cycle peaking at the winter holidays, a weekly cycle busiest at weekends
+    and a daily cycle with lunchtime and evening peaks.
+    """
+
+    def __init__(self, end, days, rng):
+        self.rng = rng
+        self.start = (end - days * 86400) // 3600 * 3600
+        self.hours = range(days * 24)
+        weights = []
+        for hour in self.hours:
+            moment = time.gmtime(self.start + hour * 3600)
+            yearly = 1 + 0.35 * math.cos(2 * math.pi * (moment.tm_yday - 355) / 365.25)
+            weights.append(yearly * WEEKDAY[moment.tm_wday] * HOURLY[moment.tm_hour])
+        self.cum_weights = list(accumulate(weights))
+        self.drawn = []
+
+    def draw(self):
+        if not self.drawn:
+            hours = self.rng.choices(self.hours, cum_weights=self.cum_weights, k=DRAW_BATCH)
+            self.drawn = [self.start + hour * 3600 + int(self.rng.random() * 3600) for hour in hours]
+        return self.drawn.pop()
+
+
+class Command(BaseCommand):
+    help = (
+        "Appends a large deterministic synthetic dataset: users, products, promo codes, carts, "
+        "wishlists and orders with their items and sales. Product popularity is Zipfian and "
+        "timestamps follow yearly, weekly and daily cycles. Rows are generated as a stream and "
+        "written in chunks, so memory stays flat whatever the row counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help="Same seed, same data.")
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--managers', type=int, default=10)
+        parser.add_argument('--orders', type=int, default=250000)
+        parser.add_argument('--items-per-order', type=float, default=4.0, help="Mean order size.")
+        parser.add_argument('--cart-rate', type=float, default=0.3, help="Share of customers with a filled cart.")
+        parser.add_argument('--cart-items', type=float, default=4.0, help="Mean cart size.")
+        parser.add_argument('--wishlist-rate', type=float, default=0.5, help="Share of customers with a wishlist.")
+        parser.add_argument('--wishlist-items', type=float, default=8.0, help="Mean wishlist size.")
+        parser.add_argument('--promo-codes', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=365, help="History covered by orders.")
+        parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of product popularity.")
+        parser.add_argument('--password', default='password', help="Password of every generated user.")
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't rebuild the sales rollup and popularity afterwards.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.prefix = f"seed{options['seed']}-"
+        if options['products'] < 1 or options['customers'] < 1 or options['managers'] < 1:
+            raise CommandError("--products, --customers and --managers must be at least 1.")
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f"Data for --seed {options['seed']} already exists; pick another seed.")
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous = OFF")
+                cursor.execute("PRAGMA temp_store = MEMORY")
+                # A fixed 128 MB page cache keeps the index pages of the big
+                # tables in memory; the 2 MB default thrashes.
+                cursor.execute("PRAGMA cache_size = -131072")
+
+        self.now = int(time.time())
+        started = time.perf_counter()
+        # Like loaddata: skip per-row foreign key checks (SQLite can only turn
+        # them off outside a transaction) and check the new rows once before
+        # committing.
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            writers = self.write_users() + self.write_products() + self.write_promo_codes()
+            writers += self.write_carts_and_wishlists() + self.write_orders()
+            connection.check_constraints(table_names=[writer.table for writer in writers])
+        elapsed = time.perf_counter() - started
+
+        total = sum(writer.written for writer in writers)
+        for writer in writers:
+            self.stdout.write(f"  {writer.label:<28} {writer.written:>12,}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)."
+        ))
+
+        if not options['skip_derived']:
+            started = time.perf_counter()
+            rollup_rows = rebuild_daily_sales(batch_size=options['batch_size'])
+            popular = rebuild_popularity(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"Rebuilt {rollup_rows:,} daily sales rows and popularity for {popular:,} products "
+                f"in {time.perf_counter() - started:.1f}s."
+            )
+        bump_catalog_version()
+
+    def rng(self, stream):
+        """An independent generator per stream, so changing one count doesn't reshuffle the rest."""
+        return random.Random(f"{self.options['seed']}:{stream}")
+
+    def writer(self, model, fields):
+        return TableWriter(model, fields, self.options['batch_size'])
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def write_users(self):
+        options = self.options
+        rng = self.rng('users')
+        clock = SeasonalClock(self.now, options['days'], rng)
+        password = make_password(options['password'])
+        users = self.writer(User, (
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email',
+            'is_staff', 'is_active', 'date_joined', 'role',
+        ))
+        self.first_user = self.next_id(User)
+        self.first_customer = self.first_user + options['managers']
+        for i in range(options['managers'] + options['customers']):
+            role = 'manager' if i < options['managers'] else 'customer'
+            username = f"{self.prefix}{role}-{i}"
+            users.add((
+                self.first_user + i, password, False, username, '', '', f"{username}@example.com",
+                False, True, _timestamp(clock.draw()), role,
+            ))
+        users.flush()
+        return [users]
+
+    def write_products(self):
+        options = self.options
+        rng = self.rng('products')
+        products = self.writer(Product, (
+            'id', 'name', 'category', 'price', 'stock', 'low_stock_threshold', 'created_by',
+        ))
+        alerts = self.writer(LowStockEvent, ('product', 'kind', 'stock', 'threshold', 'active', 'created_at'))
+        now = _timestamp(self.now)
+        self.first_product = self.next_id(Product)
+        # Prices are needed for order totals; 8 bytes per product.
+        self.prices = array('d')
+        with deferred_fts_indexing():
+            for i in range(options['products']):
+                product_id = self.first_product + i
+                price = round(min(max(math.exp(rng.gauss(1.3, 0.8)), 0.25), 500.0), 2)
+                stock = rng.randint(0, LOW_STOCK_THRESHOLD) if rng.random() < 0.05 else rng.randint(20, 1000)
+                self.prices.append(price)
+                products.add((
+                    product_id, f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}", rng.choice(CATEGORIES),
+                    f"{price:.2f}", stock, LOW_STOCK_THRESHOLD, self.first_user + rng.randrange(options['managers']),
+                ))
+                if stock <= LOW_STOCK_THRESHOLD:
+                    alerts.add((product_id, LowStockEvent.LOW, stock, LOW_STOCK_THRESHOLD, True, now))
+            products.flush()
+        alerts.flush()
+        return [products, alerts]
+
+    def write_promo_codes(self):
+        rng = self.rng('promo_codes')
+        codes = self.writer(PromoCode, ('code', 'discount_percent', 'active', 'expiry_date'))
+        for i in range(self.options['promo_codes']):
+            days = rng.randint(1, 90) if rng.random() < 0.7 else -rng.randint(1, 365)
+            codes.add((
+                f"S{self.options['seed']}-{i}", rng.choice([5, 10, 15, 20, 25, 50]), rng.random() < 0.9,
+                _timestamp(self.now + days * 86400),
+            ))
+        codes.flush()
+        return [codes]
+
+    def write_carts_and_wishlists(self):
+        options = self.options
+        rng = self.rng('carts')
+        clock = SeasonalClock(self.now, 30, rng)
+        popularity = ZipfSampler(options['products'], options['zipf'], rng)
+        carts = self.writer(Cart, ('id', 'user', 'created_at'))
+        cart_items = self.writer(CartItem, ('cart', 'product', 'quantity'))
+        wishlists = self.writer(Wishlist, ('id', 'user'))
+        wishlist_items = self.writer(WishlistItem, ('wishlist', 'product', 'added_at'))
+        cart_id = self.next_id(Cart)
+        wishlist_id = self.next_id(Wishlist)
+
+        for user_id in range(self.first_customer, self.first_customer + options['customers']):
+            if rng.random() < options['cart_rate']:
+                carts.add((cart_id, user_id, _timestamp(clock.draw())))
+                size = min(_geometric(rng, options['cart_items']), options['products'])
+                for product in {popularity.draw() for _ in range(size)}:
+                    cart_items.add((cart_id, self.first_product + product, rng.choice((1, 1, 1, 2, 2, 3, 4, 6))))
+                cart_id += 1
+            if rng.random() < options['wishlist_rate']:
+                wishlists.add((wishlist_id, user_id))
+                size = min(_geometric(rng, options['wishlist_items']), options['products'])
+                for product in {popularity.draw() for _ in range(size)}:
+                    wishlist_items.add((wishlist_id, self.first_product + product, _timestamp(clock.draw())))
+                wishlist_id += 1
+
+        for writer in (carts, cart_items, wishlists, wishlist_items):
+            writer.flush()
+        return [carts, cart_items, wishlists, wishlist_items]
+
+    def write_orders(self):
+        """Orders with their items, plus the Sale row checkout records for each item."""
+        options = self.options
+        rng = self.rng('orders')
+        clock = SeasonalClock(self.now, options['days'], rng)
+        popularity = ZipfSampler(options['products'], options['zipf'], rng)
+        # Some customers order far more often than others.
+        buyers = ZipfSampler(options['customers'], 0.6, rng)
+        orders = self.writer(Order, ('id', 'user', 'total_price', 'purchase_date'))
+        items = self.writer(OrderItem, ('order', 'product', 'quantity', 'price'))
+        sales = self.writer(Sale, ('product', 'quantity', 'date'))
+        order_id = self.next_id(Order)
+
+        for _ in range(options['orders']):
+            when = _timestamp(clock.draw())
+            size = min(_geometric(rng, options['items_per_order']), options['products'])
+            total = 0.0
+            for product in {popularity.draw() for _ in range(size)}:
+                quantity = rng.choice((1, 1, 1, 1, 2, 2, 3, 5))
+                price = self.prices[product]
+                total += quantity * price
+                items.add((order_id, self.first_product + product, quantity, price))
+                sales.add((self.first_product + product, quantity, when))
+            orders.add((order_id, self.first_customer + buyers.draw(), round(total, 2), when))
+            order_id += 1
+
+        for writer in (orders, items, sales):
+            writer.flush()
+        return [orders, items, sales]
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Product
+from store.sharded_stock import shard_product
+
+
+class Command(BaseCommand):
+    help = (
+        "Splits the stock of hot products across N counter rows so concurrent "
+        "checkouts don't all update one product row. --shards 0 merges it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', type=int, nargs='+')
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        for product_id in options['product_ids']:
+            try:
+                product = shard_product(product_id, options['shards'])
+            except Product.DoesNotExist:
+                raise CommandError(f"Product {product_id} does not exist.")
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"{product.name}: {product.stock} in stock over {product.stock_shards} shards.")
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    # The sales report reads only the rollup, so fill it from existing sales,
+    # like store.rollups.rebuild_daily_sales does (at the current price).
+    Sale = apps.get_model('store', 'Sale')
+    ProductDailySales = apps.get_model('store', 'ProductDailySales')
+    buckets = (
+        Sale.objects.annotate(day=TruncDate('date'))
+        .values('product_id', 'day')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(
+                F('quantity') * F('product__price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+        .order_by()
+    )
+    ProductDailySales.objects.bulk_create(
+        (
+            ProductDailySales(
+                product_id=row['product_id'], day=row['day'],
+                quantity=row['total_quantity'], revenue=row['total_revenue'] or 0
+            )
+            for row in buckets.iterator(chunk_size=1000)
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_promocode_product_low_stock_threshold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'product'], name='store_produ_day_fdc9bd_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:25
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The forward-decay landmark and windows of store/popularity.py, frozen here.
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+WINDOWS = {
+    'score_24h': timedelta(hours=24),
+    'score_7d': timedelta(days=7),
+    'score_30d': timedelta(days=30),
+}
+
+
+def backfill_popularity(apps, schema_editor):
+    # `filter=most popular` reads only this table, so fill it from existing
+    # sales, like store.popularity.rebuild_popularity does.
+    Sale = apps.get_model('store', 'Sale')
+    ProductPopularity = apps.get_model('store', 'ProductPopularity')
+    rows = {}
+    sales = Sale.objects.values_list('product_id', 'quantity', 'date').order_by()
+    for product_id, quantity, date in sales.iterator(chunk_size=1000):
+        if not quantity:
+            continue
+        row = rows.get(product_id)
+        is_new = row is None
+        if is_new:
+            rows[product_id] = row = ProductPopularity(product_id=product_id)
+        for field, window in WINDOWS.items():
+            weight = math.log(quantity) + (date - EPOCH).total_seconds() / window.total_seconds()
+            if not is_new:
+                high, low = max(getattr(row, field), weight), min(getattr(row, field), weight)
+                weight = high + math.log1p(math.exp(low - high))
+            setattr(row, field, weight)
+        row.total_sold += quantity
+    ProductPopularity.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='store.product')),
+                ('total_sold', models.PositiveIntegerField(default=0)),
+                ('score_24h', models.FloatField(default=0)),
+                ('score_7d', models.FloatField(default=0)),
+                ('score_30d', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-total_sold'], name='popularity_total_idx'), models.Index(fields=['-score_24h'], name='popularity_24h_idx'), models.Index(fields=['-score_7d'], name='popularity_7d_idx'), models.Index(fields=['-score_30d'], name='popularity_30d_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_existing_alerts(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    LowStockEvent = apps.get_model('store', 'LowStockEvent')
+    low = Product.objects.filter(stock__lte=models.F('low_stock_threshold')).values_list('id', 'stock', 'low_stock_threshold')
+    LowStockEvent.objects.bulk_create(
+        LowStockEvent(product_id=pid, kind='low', stock=stock, threshold=threshold, active=True)
+        for pid, stock, threshold in low.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low', 'Low stock'), ('restocked', 'Restocked')], max_length=10)),
+                ('stock', models.IntegerField()),
+                ('threshold', models.PositiveIntegerField()),
+                ('active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_events', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('active', True)), fields=['product'], name='lowstock_active_idx')],
+            },
+        ),
+        migrations.RunPython(open_existing_alerts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_lowstockevent'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productdailysales',
+            name='store_produ_day_fdc9bd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='productdailysales',
+            index=models.Index(fields=['day', 'product', 'quantity', 'revenue'], name='store_produ_day_ca1ed3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date', 'product'], name='store_sale_date_5902b0_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from store.search import install_fts
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # Adding the column rebuilds store_product on SQLite, dropping its triggers.
+    install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='store.product')),
+            ],
+            options={
+                'unique_together': {('product', 'shard')},
+            },
+        ),
+    ]
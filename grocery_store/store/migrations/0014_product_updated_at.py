@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+from store.search import install_fts
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # Adding the column rebuilds store_product on SQLite, dropping its triggers.
+    install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_stockshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from users.models import User 
 from django.utils import timezone
@@ -10,7 +11,20 @@ class Product(models.Model):
     image_url = models.URLField(blank=True, null=True)
     low_stock_threshold = models.PositiveIntegerField(default=10) 
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
- 
+    # Number of StockShard rows holding the stock of a hot product; 0 for
+    # ordinary products. See store/sharded_stock.py.
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+    # Last write to the row. Queryset and bulk writes (checkout, imports,
+    # shard rebalancing) set it themselves; shard-only stock changes don't.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination in BrowseProductsView only walks in-stock products.
+            models.Index(fields=['price', 'id'], condition=models.Q(stock__gt=0), name='product_instock_price_idx'),
+            models.Index(fields=['category', 'id'], condition=models.Q(stock__gt=0), name='product_instock_category_idx'),
+        ]
+
     def is_low_stock(self):
         return self.stock <= self.low_stock_threshold
     def __str__(self):
@@ -21,6 +35,9 @@ class Sale(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=['date', 'product'])]
+
     def __str__(self):
         return f"{self.product.name} - {self.quantity} sold on {self.date.date()}"
 
@@ -36,3 +53,134 @@ class PromoCode(models.Model):
     def __str__(self):
         return self.code
 
+
+class ProductDailySales(models.Model):
+    """
+    Per-product, per-day sales totals. Kept up to date by checkout and
+    rebuilt from raw Sale rows with `manage.py rebuild_sales_rollup`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('product', 'day')
+        # Covers store-wide sums over a day range (store/timeseries.py).
+        indexes = [models.Index(fields=['day', 'product', 'quantity', 'revenue'])]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.quantity} sold on {self.day}"
+
+
+class ProductPopularity(models.Model):
+    """
+    Materialized popularity of a product, maintained by checkout (see
+    store/popularity.py). `score_*` hold time-decayed sales in log form, so
+    ordering by them ranks products by recent sales without re-aggregating.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    total_sold = models.PositiveIntegerField(default=0)
+    score_24h = models.FloatField(default=0)
+    score_7d = models.FloatField(default=0)
+    score_30d = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_sold'], name='popularity_total_idx'),
+            models.Index(fields=['-score_24h'], name='popularity_24h_idx'),
+            models.Index(fields=['-score_7d'], name='popularity_7d_idx'),
+            models.Index(fields=['-score_30d'], name='popularity_30d_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.total_sold} sold"
+
+
+class LowStockEvent(models.Model):
+    """
+    A product crossing its low-stock threshold, in either direction.
+    `active` marks the current 'low' event of every product that is still
+    low, so the open alerts are a small partial-index scan.
+    """
+    LOW = 'low'
+    RESTOCKED = 'restocked'
+    KIND_CHOICES = (
+        (LOW, 'Low stock'),
+        (RESTOCKED, 'Restocked'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    stock = models.IntegerField()
+    threshold = models.PositiveIntegerField()
+    active = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product'], condition=models.Q(active=True), name='lowstock_active_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} {self.kind} ({self.stock}/{self.threshold})"
+
+
+class StockReservation(models.Model):
+    """
+    Units of a product held for a customer's cart until `expires_at` (see
+    store/reservations.py). Expired rows no longer count and are deleted
+    by `manage.py release_expired_reservations`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='reservation_active_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} for {self.user.username} until {self.expires_at}"
+
+
+class StockShard(models.Model):
+    """
+    One of the counters a hot product's stock is split across (see
+    store/sharded_stock.py). The product's stock is the sum of its shards.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'shard')
+
+    def __str__(self):
+        return f"{self.product.name} shard {self.shard}: {self.quantity}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key and the response its first request got (see
+    store/idempotency.py). `response_status` is null while that request is
+    still running.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'key')
+        indexes = [models.Index(fields=['expires_at'], name='idempotency_expiry_idx')]
+
+    def __str__(self):
+        return f"{self.key} for {self.user.username}"
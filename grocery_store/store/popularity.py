@@ -0,0 +1,102 @@
+"""
+Time-decayed product popularity.
+
+Each window keeps an exponentially decayed sum of units sold, with the
+window length as the decay time constant. Scores use forward decay: a sale
+of `q` units at time `t` contributes `q * e^((t - EPOCH) / window)`, so
+adding a sale never requires re-decaying older ones and every product is
+measured against the same landmark. To keep the numbers finite the sum is
+stored as its natural log; ordering by the log gives the same ranking.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+from .models import ProductPopularity, Sale
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+WINDOWS = {
+    '24h': ('score_24h', timedelta(hours=24)),
+    '7d': ('score_7d', timedelta(days=7)),
+    '30d': ('score_30d', timedelta(days=30)),
+}
+
+
+def _log_weight(quantity, when, window):
+    return math.log(quantity) + (when - EPOCH).total_seconds() / window.total_seconds()
+
+
+def _log_add(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed_units(log_score, window, now=None):
+    """Converts a stored score back into decayed units sold as of `now`."""
+    now = now or timezone.now()
+    return math.exp(log_score - (now - EPOCH).total_seconds() / window.total_seconds())
+
+
+def _apply(row, quantity, when, is_new):
+    for field, window in WINDOWS.values():
+        weight = _log_weight(quantity, when, window)
+        setattr(row, field, weight if is_new else _log_add(getattr(row, field), weight))
+    row.total_sold += quantity
+
+
+def record_popularity(sold, when=None):
+    """
+    Adds sales to the popularity table. `sold` maps product id -> units.
+    Costs one locking read plus at most one bulk update and one bulk insert.
+    Must be called inside the checkout transaction.
+    """
+    sold = {pid: qty for pid, qty in sold.items() if qty > 0}
+    if not sold:
+        return
+    when = when or timezone.now()
+
+    existing = {
+        row.product_id: row
+        for row in ProductPopularity.objects.select_for_update().filter(product_id__in=sold)
+    }
+    created = []
+    for product_id, quantity in sold.items():
+        row = existing.get(product_id)
+        if row is None:
+            row = ProductPopularity(product_id=product_id)
+            _apply(row, quantity, when, is_new=True)
+            created.append(row)
+        else:
+            _apply(row, quantity, when, is_new=False)
+
+    fields = ['total_sold'] + [field for field, _ in WINDOWS.values()]
+    if existing:
+        ProductPopularity.objects.bulk_update(existing.values(), fields)
+    if created:
+        ProductPopularity.objects.bulk_create(created)
+
+
+def rebuild_popularity(batch_size=1000):
+    """
+    Recomputes every product's popularity by streaming raw Sale rows.
+    Memory grows with the number of products sold, not with sales history.
+    Returns the number of products written.
+    """
+    rows = {}
+    sales = Sale.objects.values_list('product_id', 'quantity', 'date').order_by()
+    for product_id, quantity, date in sales.iterator(chunk_size=batch_size):
+        if not quantity:
+            continue
+        row = rows.get(product_id)
+        if row is None:
+            rows[product_id] = row = ProductPopularity(product_id=product_id)
+            _apply(row, quantity, date, is_new=True)
+        else:
+            _apply(row, quantity, date, is_new=False)
+
+    with transaction.atomic():
+        ProductPopularity.objects.all().delete()
+        ProductPopularity.objects.bulk_create(rows.values(), batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,134 @@
+import hashlib
+import heapq
+import math
+import threading
+import time
+
+from django.utils import timezone
+
+from .cache import bump_shared_version, get_shared_version
+from .models import PromoCode
+
+PROMO_VERSION_KEY = 'promo:version'
+
+
+def bump_promo_version():
+    """Tells the promo index of every worker process that codes changed."""
+    bump_shared_version(PROMO_VERSION_KEY)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. `might_contain` never returns a
+    false negative, so a miss proves the code was never created.
+    """
+
+    def __init__(self, expected_items, false_positive_rate=0.01):
+        expected_items = max(expected_items, 1)
+        self.size = max(8, int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / expected_items * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class PromoIndex:
+    """
+    In-memory index of promo codes for ApplyPromoView.
+
+    Valid codes live in a dict and are evicted exactly at their expiry_date
+    using a min-heap of expiry times. Every code that exists (valid or not)
+    goes into a Bloom filter, so codes it has never seen are answered
+    without loading any promo code. The index is rebuilt after any
+    PromoCode write in this process (see store/signals.py) and at least
+    every `max_age` seconds.
+
+    A code created by another worker isn't in this worker's filter yet, so
+    before a miss is trusted the index compares the promo version it was
+    loaded at with the one in the shared `catalog_version` cache, which
+    every PromoCode write bumps. If they differ the index is rebuilt and
+    asked again; either way a miss never queries the database.
+    """
+    max_age = 60
+
+    VALID = 'valid'
+    INVALID = 'invalid'
+    UNKNOWN = 'unknown'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.version = None
+        self.active = {}
+        self.expiry_heap = []
+        self.bloom = BloomFilter(1)
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def _load(self):
+        # Read before the codes, so a write during the load shows up as a newer version.
+        version = get_shared_version(PROMO_VERSION_KEY)
+        rows = list(PromoCode.objects.values_list('code', 'discount_percent', 'active', 'expiry_date'))
+        now = timezone.now()
+        bloom = BloomFilter(len(rows))
+        active = {}
+        heap = []
+        for code, discount_percent, is_active, expiry_date in rows:
+            bloom.add(code)
+            if is_active and expiry_date > now:
+                active[code] = discount_percent
+                heap.append((expiry_date, code))
+        heapq.heapify(heap)
+        self.bloom, self.active, self.expiry_heap = bloom, active, heap
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def _evict_expired(self, now):
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            _, code = heapq.heappop(self.expiry_heap)
+            self.active.pop(code, None)
+
+    def _answer(self, code, reload=False):
+        """The in-memory answer, or None when the database must be asked."""
+        with self.lock:
+            if reload or self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age:
+                self._load()
+            self._evict_expired(timezone.now())
+
+            if code in self.active:
+                return (self.VALID, self.active[code]), self.version
+            if not self.bloom.might_contain(code):
+                return (self.UNKNOWN, None), self.version
+            return None, self.version
+
+    def lookup(self, code):
+        """
+        Returns (VALID, discount_percent), (INVALID, None) for a code that
+        exists but is expired or inactive, or (UNKNOWN, None).
+        """
+        answer, version = self._answer(code)
+        if answer is not None and answer[0] == self.UNKNOWN and get_shared_version(PROMO_VERSION_KEY) != version:
+            answer, _ = self._answer(code, reload=True)
+        if answer is not None:
+            return answer
+
+        # Known code that is not currently valid, or a Bloom false positive.
+        if PromoCode.objects.filter(code=code).exists():
+            return self.INVALID, None
+        return self.UNKNOWN, None
+
+
+promo_index = PromoIndex()
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Lets content negotiation accept `?format=csv` / `Accept: text/csv`.
+    Views answer those requests with a StreamingHttpResponse themselves, so
+    this renderer only handles the odd non-streamed payload, like errors.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict) and 'error' in data:
+            return f"error\n{data['error']}\n".encode()
+        return str(data).encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON counterpart of CSVRenderer."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, default=str) + '\n').encode()
+
+
+def stream_rows(rows, columns, fmt, chunk_size=2000):
+    """
+    Yields `rows` (tuples in `columns` order) as CSV with a header line, or
+    as NDJSON objects, `chunk_size` rows per chunk of text. Meant to wrap a
+    queryset .iterator() in a StreamingHttpResponse.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+            buffer.write('\n')
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
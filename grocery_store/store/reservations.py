@@ -0,0 +1,101 @@
+"""
+Time-limited stock holds.
+
+Putting a product in the cart holds that many units for the customer for
+STOCK_RESERVATION_TTL. The stock available to anyone else is the product's
+stock minus the unexpired holds of other customers, so during a rush the
+contention is settled when products are added to carts, and a checkout
+with live holds confirms them instead of racing for Product.stock.
+
+Holds are never extended in the background: adding to or changing the
+cart renews them. Expired holds simply stop counting; the sweeper only
+deletes them to keep the table small.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import StockReservation
+
+DEFAULT_TTL = timedelta(minutes=15)
+
+
+def reservation_ttl():
+    return getattr(settings, 'STOCK_RESERVATION_TTL', DEFAULT_TTL)
+
+
+def held_by_others(product_ids, user, now=None):
+    """Units of each product under unexpired holds of customers other than `user`."""
+    now = now or timezone.now()
+    return dict(
+        StockReservation.objects.filter(product_id__in=product_ids, expires_at__gt=now)
+        .exclude(user=user)
+        .values('product_id')
+        .annotate(held=Sum('quantity'))
+        .values_list('product_id', 'held')
+        .order_by()
+    )
+
+
+def check_available(user, quantities, products, now=None):
+    """
+    Raises ValueError unless every product in `quantities` (product id ->
+    units) has that many units left for `user` once other customers' holds
+    are taken out. `products` maps product id -> Product.
+    """
+    held = held_by_others(list(quantities), user, now=now)
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        if quantity > product.stock - held.get(product_id, 0):
+            raise ValueError(f"Product {product.name} not available in requested quantity.")
+
+
+def reserve(user, quantities, products, now=None):
+    """
+    Sets the user's holds to `quantities` (product id -> units, 0 releases
+    the hold) with a fresh expiry, after checking availability. Must run
+    inside the transaction that changes the cart; raises ValueError when a
+    product doesn't have enough available stock.
+    """
+    now = now or timezone.now()
+    held = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    check_available(user, held, products, now=now)
+
+    if held:
+        expires_at = now + reservation_ttl()
+        StockReservation.objects.bulk_create(
+            [StockReservation(user=user, product_id=pid, quantity=qty, expires_at=expires_at)
+             for pid, qty in held.items()],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'expires_at']
+        )
+    released = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+    if released:
+        release(user, released)
+
+
+def release(user, product_ids):
+    """Drops the user's holds on `product_ids`, e.g. when they leave the cart or are bought."""
+    StockReservation.objects.filter(user=user, product_id__in=product_ids).delete()
+
+
+def release_expired(batch_size=1000, now=None):
+    """
+    Deletes expired holds `batch_size` rows at a time, so the sweep never
+    holds a long write lock. Returns the number deleted.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += StockReservation.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import ProductDailySales, Sale
+
+
+def record_daily_sales(sold, day=None):
+    """
+    Adds sales to the daily rollup in two queries, whatever the number of
+    products. `sold` maps product id -> (quantity, revenue). Must be called
+    inside the transaction that writes the matching Sale rows.
+    """
+    if not sold:
+        return
+    day = day or timezone.localdate()
+
+    ProductDailySales.objects.bulk_create(
+        [ProductDailySales(product_id=product_id, day=day) for product_id in sold],
+        ignore_conflicts=True
+    )
+    ProductDailySales.objects.filter(product_id__in=sold, day=day).update(
+        quantity=Case(
+            *[When(product_id=pid, then=F('quantity') + qty) for pid, (qty, _) in sold.items()],
+            default=F('quantity'),
+            output_field=PositiveIntegerField()
+        ),
+        revenue=Case(
+            *[When(product_id=pid, then=F('revenue') + rev) for pid, (_, rev) in sold.items()],
+            default=F('revenue'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    )
+
+
+def rebuild_daily_sales(batch_size=1000):
+    """
+    Recomputes the whole rollup from raw Sale rows. Sale does not record the
+    price paid, so revenue is rebuilt from the current product price.
+    Returns the number of rollup rows written.
+    """
+    buckets = (
+        Sale.objects.annotate(day=TruncDate('date'))
+        .values('product_id', 'day')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(
+                F('quantity') * F('product__price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+        .order_by()
+    )
+
+    written = 0
+    with transaction.atomic():
+        ProductDailySales.objects.all().delete()
+        batch = []
+        for row in buckets.iterator(chunk_size=batch_size):
+            batch.append(ProductDailySales(
+                product_id=row['product_id'],
+                day=row['day'],
+                quantity=row['total_quantity'],
+                revenue=row['total_revenue'] or 0
+            ))
+            if len(batch) >= batch_size:
+                ProductDailySales.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            ProductDailySales.objects.bulk_create(batch)
+            written += len(batch)
+    return written
@@ -0,0 +1,251 @@
+"""
+Product search by name and category.
+
+On SQLite the search runs against an FTS5 external-content table
+(`store_product_fts`) that triggers keep in sync with `store_product`.
+Other databases fall back to an in-process inverted index kept in sync
+with post_save / post_delete signals. Both rank with BM25, treat every
+query term as a prefix (type-ahead) and return results ordered by
+(score, id) so they can be cursor paginated.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connection
+
+FTS_TABLE = 'store_product_fts'
+
+# Column weights for BM25: a match in the name counts more than the category.
+NAME_WEIGHT = 10.0
+CATEGORY_WEIGHT = 1.0
+
+INSTALL_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, category, content='store_product', content_rowid='id', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS store_product_fts_ai AFTER INSERT ON store_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS store_product_fts_ad AFTER DELETE ON store_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS store_product_fts_au AFTER UPDATE OF name, category ON store_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+UNINSTALL_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS store_product_fts_ai",
+    "DROP TRIGGER IF EXISTS store_product_fts_ad",
+    "DROP TRIGGER IF EXISTS store_product_fts_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_token_re = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token.lower() for token in _token_re.findall(text or '')]
+
+
+def install_fts(schema_editor):
+    """
+    Creates the FTS table and its triggers and indexes existing products.
+    SQLite drops triggers when Django rebuilds `store_product` during a
+    migration, so migrations that alter the table call this again.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in INSTALL_FTS_SQL:
+        schema_editor.execute(statement)
+
+
+def uninstall_fts(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in UNINSTALL_FTS_SQL:
+        schema_editor.execute(statement)
+
+
+@contextmanager
+def deferred_fts_indexing():
+    """
+    For bulk loads into store_product: drops the per-row insert trigger and
+    rebuilds the FTS index once at the end instead.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER IF EXISTS store_product_fts_ai")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for statement in INSTALL_FTS_SQL:
+                cursor.execute(statement)
+
+
+class SearchHit:
+    def __init__(self, id, score):
+        self.id = id
+        self.score = score
+
+
+def _fts_search(terms, limit, after):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    sql = [
+        f"SELECT id, score FROM ("
+        f" SELECT p.id AS id, bm25({FTS_TABLE}, %s, %s) AS score"
+        f" FROM {FTS_TABLE} JOIN store_product p ON p.id = {FTS_TABLE}.rowid"
+        f" WHERE {FTS_TABLE} MATCH %s AND p.stock > 0"
+        f")"
+    ]
+    params = [NAME_WEIGHT, CATEGORY_WEIGHT, match]
+    if after is not None:
+        sql.append(" WHERE score > %s OR (score = %s AND id > %s)")
+        params += [after[0], after[0], after[1]]
+    sql.append(" ORDER BY score, id LIMIT %s")
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(''.join(sql), params)
+        return [SearchHit(id, score) for id, score in cursor.fetchall()]
+
+
+class InvertedIndex:
+    """
+    In-process BM25 index over product name and category, used when the
+    database has no FTS5. Built lazily from the database on first search and
+    then kept current by signals from this process only, so writes made by
+    other workers or by queryset.update() show up after a restart.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.postings = defaultdict(dict)   # term -> {product id: weighted term frequency}
+        self.documents = {}                 # product id -> its terms
+        self.lengths = {}                   # product id -> weighted document length
+        self.total_length = 0.0
+        self.in_stock = {}                  # product id -> bool
+        self.terms = []                     # sorted terms, for prefix lookups
+
+    def _document(self, name, category):
+        frequencies = defaultdict(float)
+        for token in tokenize(name):
+            frequencies[token] += NAME_WEIGHT
+        for token in tokenize(category):
+            frequencies[token] += CATEGORY_WEIGHT
+        return frequencies
+
+    def _remove(self, product_id):
+        if product_id not in self.documents:
+            return
+        for term in self.documents.pop(product_id):
+            del self.postings[term][product_id]
+            if not self.postings[term]:
+                del self.postings[term]
+                index = bisect.bisect_left(self.terms, term)
+                if index < len(self.terms) and self.terms[index] == term:
+                    self.terms.pop(index)
+        self.total_length -= self.lengths.pop(product_id)
+        self.in_stock.pop(product_id, None)
+
+    def _add(self, product_id, name, category, stock):
+        frequencies = self._document(name, category)
+        for term, frequency in frequencies.items():
+            if term not in self.postings:
+                bisect.insort(self.terms, term)
+            self.postings[term][product_id] = frequency
+        self.documents[product_id] = set(frequencies)
+        self.lengths[product_id] = sum(frequencies.values())
+        self.total_length += self.lengths[product_id]
+        self.in_stock[product_id] = stock > 0
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        from .models import Product
+        with self.lock:
+            if self.loaded:
+                return
+            rows = Product.objects.values_list('id', 'name', 'category', 'stock').order_by()
+            for product_id, name, category, stock in rows.iterator(chunk_size=2000):
+                self._add(product_id, name, category, stock)
+            self.loaded = True
+
+    def update(self, product):
+        with self.lock:
+            if not self.loaded:
+                return
+            self._remove(product.id)
+            self._add(product.id, product.name, product.category, product.stock)
+
+    def delete(self, product_id):
+        with self.lock:
+            if self.loaded:
+                self._remove(product_id)
+
+    def search(self, terms, limit, after):
+        self.ensure_loaded()
+        with self.lock:
+            documents = len(self.lengths)
+            if not documents:
+                return []
+            average_length = self.total_length / documents
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                position = bisect.bisect_left(self.terms, term)
+                while position < len(self.terms) and self.terms[position].startswith(term):
+                    expanded = self.terms[position]
+                    position += 1
+                    docs = self.postings[expanded]
+                    idf = math.log(1 + (documents - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for product_id, frequency in docs.items():
+                        norm = self.k1 * (1 - self.b + self.b * self.lengths[product_id] / average_length)
+                        term_scores[product_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                # Every term has to match, as with FTS5's implicit AND.
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: scores[pid] + s for pid, s in term_scores.items() if pid in scores}
+            # FTS5's bm25() is negative with the best match lowest; mirror that.
+            hits = [
+                SearchHit(product_id, -score)
+                for product_id, score in (scores or {}).items()
+                if self.in_stock.get(product_id)
+            ]
+        if after is not None:
+            hits = [hit for hit in hits if (hit.score, hit.id) > (after[0], after[1])]
+        return heapq.nsmallest(limit, hits, key=lambda hit: (hit.score, hit.id))
+
+
+inverted_index = InvertedIndex()
+
+
+def uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def search_products(query, limit, after=None):
+    """
+    Returns up to `limit` in-stock SearchHits for `query`, best first,
+    starting after the (score, id) position `after`.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if uses_fts():
+        return _fts_search(terms, limit, after)
+    return inverted_index.search(terms, limit, after)
@@ -1,24 +1,49 @@
 
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
 from .models import Product
 from .models import PromoCode
+from .sharded_stock import load_totals
 
-class ProductSerializer(serializers.ModelSerializer):
+
+class ProductListSerializer(serializers.ListSerializer):
+    """Reads the stock of all the sharded products in the list at once."""
+
+    def to_representation(self, data):
+        products = list(data.all() if isinstance(data, BaseManager) else data)
+        load_totals(products)
+        return super().to_representation(products)
+
+
+class ShardedStockMixin:
+    """
+    For product serializers: shows a sharded product's stock as the (cached)
+    sum of its shards rather than the periodically synced Product.stock.
+    """
+
+    def to_representation(self, instance):
+        load_totals([instance])
+        return super().to_representation(instance)
+
+
+class ProductSerializer(ShardedStockMixin, serializers.ModelSerializer):
    
     class Meta:
         model = Product
         fields = '__all__'
-        read_only_fields = ['created_by']
+        read_only_fields = ['created_by', 'stock_shards']
+        list_serializer_class = ProductListSerializer
        
 
        
     
 class SalesReportSerializer(serializers.ModelSerializer):
     total_quantity_sold = serializers.IntegerField()
+    total_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'category', 'price', 'total_quantity_sold']
+        fields = ['id', 'name', 'category', 'price', 'total_quantity_sold', 'total_revenue']
 
 
 
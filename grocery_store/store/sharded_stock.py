@@ -0,0 +1,256 @@
+"""
+Sharded stock for hot products.
+
+Every checkout of an ordinary product decrements its `store_product` row,
+so on a database with row locks the checkouts of a best-seller queue up
+on that one row. A product switched to sharded stock (`manage.py
+shard_stock <id> --shards N`) keeps its stock in N StockShard rows
+instead: a checkout takes its units from one shard picked at random among
+those that have enough, so concurrent checkouts mostly lock different
+rows, and the product row itself is not written.
+
+- The product's stock is the sum of its shards. Code that needs the exact
+  figure (cart holds, checkout) reads it with `load_totals(fresh=True)`;
+  serializers and the low-stock alerts read it through a per-product sum
+  cached for SHARDED_STOCK_CACHE_TIMEOUT seconds.
+- Product.stock is a copy of that sum for queries that filter on stock
+  (browsing only in-stock products). `manage.py rebalance_stock_shards`
+  refreshes it, and evens the shards out when one runs low, so the fast
+  path keeps finding a shard with enough units.
+- Setting a sharded product's stock (product edit, catalog import) spreads
+  the new figure over its shards.
+
+On SQLite, which has a single writer, sharding doesn't let checkouts run
+side by side; it pays off on databases with row locks.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .cache import bump_catalog_version_on_commit
+from .models import Product, StockShard
+
+DEFAULT_CACHE_TIMEOUT = 2
+MAX_SHARDS = 64
+
+
+def cache_timeout():
+    return getattr(settings, 'SHARDED_STOCK_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+def _total_key(product_id):
+    return f'stock:total:{product_id}'
+
+
+class _ShardDrained(Exception):
+    pass
+
+
+def _split(total, shards):
+    """`total` spread as evenly as possible over `shards` counters."""
+    return [total // shards + (1 if i < total % shards else 0) for i in range(shards)]
+
+
+def read_shards(product_ids):
+    """Shard quantities of `product_ids`, as product id -> {shard: quantity}."""
+    shards = {product_id: {} for product_id in product_ids}
+    if product_ids:
+        for product_id, shard, quantity in StockShard.objects.filter(
+            product_id__in=list(product_ids)
+        ).values_list('product_id', 'shard', 'quantity'):
+            shards[product_id][shard] = quantity
+    return shards
+
+
+def load_totals(products, fresh=False):
+    """
+    Sets `stock` on the sharded products among `products` to the sum of
+    their shards, in place. Reads the cached sums unless `fresh`, and then
+    skips products whose total it already set; either way it costs at most
+    one query, and none when no product is sharded. Returns the shard
+    quantities it read (product id -> {shard: quantity}).
+    """
+    sharded = {
+        product.id: product for product in products
+        if product.stock_shards and (fresh or not getattr(product, '_stock_total_loaded', False))
+    }
+    if not sharded:
+        return {}
+
+    totals = {}
+    if not fresh:
+        cached = cache.get_many([_total_key(product_id) for product_id in sharded])
+        totals = {product_id: cached[_total_key(product_id)]
+                  for product_id in sharded if _total_key(product_id) in cached}
+    shards = read_shards([product_id for product_id in sharded if product_id not in totals])
+    if shards:
+        read = {product_id: sum(quantities.values()) for product_id, quantities in shards.items()}
+        cache.set_many({_total_key(product_id): total for product_id, total in read.items()}, cache_timeout())
+        totals.update(read)
+    for product_id, product in sharded.items():
+        product.stock = totals[product_id]
+        product._stock_total_loaded = True
+    return shards
+
+
+def lock_stock(products):
+    """
+    Readies `products` (product id -> Product, read in the current
+    transaction) for a stock check and decrement. Ordinary products are
+    locked and their stock read again on databases with row locks; on
+    SQLite the IMMEDIATE write transaction already keeps other writers out.
+    Sharded products are not locked: their stock is set to the sum of
+    their shards, whose quantities are returned for take().
+    """
+    ordinary = [product_id for product_id, product in products.items() if not product.stock_shards]
+    if ordinary and connections[router.db_for_write(Product)].features.has_select_for_update:
+        for product_id, stock in (
+            Product.objects.select_for_update().filter(id__in=ordinary).values_list('id', 'stock')
+        ):
+            products[product_id].stock = stock
+    return load_totals(products.values(), fresh=True)
+
+
+def _forget_totals(product_ids):
+    keys = [_total_key(product_id) for product_id in product_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def take(quantities, shards):
+    """
+    Takes `quantities` (product id -> units) out of the products' shards.
+    `shards` are their quantities as read by load_totals(fresh=True). Each
+    product's units come from one shard with enough of them, in a single
+    UPDATE for all products; products whose stock is spread too thin, or
+    whose shard was emptied meanwhile, take from several shards under a
+    lock instead. Must run inside the checkout transaction; raises
+    ValueError when a product doesn't have enough stock left.
+    """
+    if not quantities:
+        return
+    picks = {}
+    for product_id, quantity in quantities.items():
+        candidates = [shard for shard, left in shards[product_id].items() if left >= quantity]
+        if candidates:
+            picks[product_id] = random.choice(candidates)
+
+    slow = [product_id for product_id in quantities if product_id not in picks]
+    if picks:
+        try:
+            with transaction.atomic():
+                enough = Q()
+                new_quantity = []
+                for product_id, shard in picks.items():
+                    enough |= Q(product_id=product_id, shard=shard, quantity__gte=quantities[product_id])
+                    new_quantity.append(When(product_id=product_id, then=F('quantity') - quantities[product_id]))
+                updated = StockShard.objects.filter(enough).update(
+                    quantity=Case(*new_quantity, default=F('quantity'))
+                )
+                if updated != len(picks):
+                    raise _ShardDrained()
+        except _ShardDrained:
+            slow = list(quantities)
+    if slow:
+        _take_locked({product_id: quantities[product_id] for product_id in slow})
+    _forget_totals(list(quantities))
+
+
+def _take_locked(quantities):
+    rows = list(
+        StockShard.objects.filter(product_id__in=list(quantities))
+        .select_for_update().order_by('product_id', '-quantity')
+    )
+    left = dict(quantities)
+    changed = []
+    for row in rows:
+        if left[row.product_id] and row.quantity:
+            taken = min(row.quantity, left[row.product_id])
+            row.quantity -= taken
+            left[row.product_id] -= taken
+            changed.append(row)
+    short = [product_id for product_id, quantity in left.items() if quantity]
+    if short:
+        name = Product.objects.filter(id=short[0]).values_list('name', flat=True).first()
+        raise ValueError(f"Product {name} not available in requested quantity.")
+    StockShard.objects.bulk_update(changed, ['quantity'])
+
+
+def shard_product(product_id, shards):
+    """
+    Spreads a product's stock over `shards` counters, or with 0 puts it
+    back in Product.stock. The total is kept. Returns the product.
+    """
+    if shards < 0 or shards > MAX_SHARDS:
+        raise ValueError(f"Use between 0 and {MAX_SHARDS} shards.")
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(id=product_id)
+        if product.stock_shards:
+            product.stock = sum(
+                StockShard.objects.select_for_update().filter(product=product).values_list('quantity', flat=True)
+            )
+            StockShard.objects.filter(product=product).delete()
+        if shards:
+            StockShard.objects.bulk_create([
+                StockShard(product=product, shard=i, quantity=quantity)
+                for i, quantity in enumerate(_split(product.stock, shards))
+            ])
+        product.stock_shards = shards
+        product.save(update_fields=['stock', 'stock_shards', 'updated_at'])
+        _forget_totals([product.id])
+    return product
+
+
+def spread_stock(product_ids):
+    """
+    For the sharded products among `product_ids`, replaces the shards with
+    an even split of Product.stock, after the stock was set outright (a
+    product edit or an import). One query when none is sharded.
+    """
+    sharded = dict(
+        Product.objects.filter(id__in=list(product_ids), stock_shards__gt=0).values_list('id', 'stock')
+    )
+    if not sharded:
+        return
+    rows = list(StockShard.objects.filter(product_id__in=list(sharded)).select_for_update().order_by('shard'))
+    by_product = {}
+    for row in rows:
+        by_product.setdefault(row.product_id, []).append(row)
+    for product_id, shard_rows in by_product.items():
+        for row, quantity in zip(shard_rows, _split(sharded[product_id], len(shard_rows))):
+            row.quantity = quantity
+    StockShard.objects.bulk_update(rows, ['quantity'])
+    _forget_totals(list(sharded))
+
+
+def rebalance(product_ids=None, low_water=0.25):
+    """
+    For each sharded product (or those in `product_ids`): evens its shards
+    out when one holds less than `low_water` of an even share, and copies
+    the total to Product.stock. One short transaction per product, so
+    checkouts are only held up briefly. Returns the number of products
+    whose shards were moved.
+    """
+    products = Product.objects.filter(stock_shards__gt=0)
+    if product_ids is not None:
+        products = products.filter(id__in=list(product_ids))
+    moved = 0
+    for product_id, stock in products.values_list('id', 'stock').iterator():
+        with transaction.atomic():
+            rows = list(StockShard.objects.filter(product_id=product_id).select_for_update().order_by('shard'))
+            if not rows:
+                continue
+            total = sum(row.quantity for row in rows)
+            if min(row.quantity for row in rows) < low_water * total / len(rows):
+                for row, quantity in zip(rows, _split(total, len(rows))):
+                    row.quantity = quantity
+                StockShard.objects.bulk_update(rows, ['quantity'])
+                moved += 1
+            if total != stock:
+                Product.objects.filter(id=product_id).update(stock=total, updated_at=timezone.now())
+                bump_catalog_version_on_commit()
+            _forget_totals([product_id])
+    return moved
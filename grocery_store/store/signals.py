@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product, PromoCode
+from .promo_index import bump_promo_version, promo_index
+from .search import inverted_index, uses_fts
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    if not uses_fts():
+        inverted_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    if not uses_fts():
+        inverted_index.delete(instance.id)
+
+
+@receiver(post_save, sender=PromoCode)
+@receiver(post_delete, sender=PromoCode)
+def invalidate_promo_index(sender, **kwargs):
+    transaction.on_commit(promo_index.invalidate)
+    transaction.on_commit(bump_promo_version)
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
+from users.authentication import aauthenticate
+from .models import LowStockEvent
+
+POLL_INTERVAL = 1
+HEARTBEAT_INTERVAL = 15
+BATCH_SIZE = 100
+
+
+def _format(event):
+    data = {
+        "id": event.id,
+        "product_id": event.product_id,
+        "product": event.product.name,
+        "kind": event.kind,
+        "stock": event.stock,
+        "threshold": event.threshold,
+        "created_at": event.created_at.isoformat(),
+    }
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _low_stock_events(last_id):
+    yield f"retry: {POLL_INTERVAL * 3000}\n\n"
+    idle = 0
+    while True:
+        batch = [
+            event async for event in LowStockEvent.objects.filter(id__gt=last_id)
+            .select_related('product').order_by('id')[:BATCH_SIZE]
+        ]
+        for event in batch:
+            last_id = event.id
+            yield _format(event)
+        if len(batch) == BATCH_SIZE:
+            continue
+        await asyncio.sleep(POLL_INTERVAL)
+        idle = 0 if batch else idle + POLL_INTERVAL
+        if idle >= HEARTBEAT_INTERVAL:
+            idle = 0
+            yield ": keep-alive\n\n"
+
+
+async def low_stock_stream(request):
+    """
+    GET /api/store/low-stock-alert/stream/
+    Server-Sent Events feed of low-stock threshold crossings for managers.
+    Reconnecting clients resume after the `Last-Event-ID` header (or the
+    `last_event_id` query parameter); new clients only get new events.
+    Needs an ASGI server (see grocery_store/asgi.py) to stream.
+    """
+    user = await aauthenticate(request, allow_query_token=True)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided or are invalid."}, status=401)
+    if getattr(user, 'role', None) != 'manager':
+        return JsonResponse({"error": "Only managers can view low-stock alerts."}, status=403)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid Last-Event-ID."}, status=400)
+    if last_id is None:
+        last_id = (await LowStockEvent.objects.aaggregate(last=Max('id')))['last'] or 0
+
+    response = StreamingHttpResponse(_low_stock_events(last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
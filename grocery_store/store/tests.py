@@ -1,3 +1,597 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from grocery_store.compression import brotli
+from grocery_store.db_router import PIN_COOKIE, REPLICA, PrimaryPinningMiddleware, use_replica
+from grocery_store.query_stats import QueryRecorder, view_query_stats
+from grocery_store.testing import QueryBudgetMixin
+from users.models import User
+from users.views import MyTokenObtainPairSerializer
+from .cache import CATALOG_VERSION_KEY, bump_catalog_version, get_shared_version
+from .low_stock import track_low_stock
+from .models import LowStockEvent, Product, PromoCode, StockShard
+from .promo_index import PROMO_VERSION_KEY, bump_promo_version, promo_index
+from .rollups import record_daily_sales
+from .search import search_products
+from .sharded_stock import rebalance, shard_product
+
+
+class StoreQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Statements per request for the store endpoints, as a manager."""
+    client_class = APIClient
+    query_budgets = {
+        ('GET', 'product-list'): 1,
+        ('GET', 'product-detail'): 1,
+        ('POST', 'product-list'): 2,
+        ('POST', 'product-add-product'): 2,
+        ('PUT', 'product-detail'): 5,
+        ('DELETE', 'product-detail'): 11,
+        ('GET', 'salesreport'): 1,
+        ('GET', 'salesreport-async'): 1,
+        ('GET', 'salesreport-timeseries'): 1,
+        ('GET', 'promo'): 1,
+        ('GET', 'promo-async'): 1,
+        ('POST', 'promo'): 2,
+        ('POST', 'apply-promo'): 1,
+        ('GET', 'low-stock-alert'): 1,
+        ('GET', 'low-stock-alert-async'): 1,
+        ('GET', 'catalog-cache-stats'): 0,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Store product {i}", category=f"cat-{i % 3}", price=i + 1, stock=i, created_by=cls.manager)
+            for i in range(30)
+        ])
+        track_low_stock(cls.products, previously_low=set())
+        record_daily_sales({product.id: (2, product.price) for product in cls.products})
+        PromoCode.objects.bulk_create([
+            PromoCode(code=f"CODE{i}", discount_percent=10, expiry_date=timezone.now() + timedelta(days=1))
+            for i in range(10)
+        ])
+
+    def setUp(self):
+        bump_catalog_version()
+        promo_index.invalidate()
+        token = MyTokenObtainPairSerializer.get_token(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_product_endpoints(self):
+        self.assertWithinBudget('GET', 'product-list')
+        self.assertWithinBudget('GET', 'product-detail', url_kwargs={'pk': self.products[0].id})
+        product = {'name': 'New product', 'category': 'cat-1', 'price': '2.50', 'stock': 3}
+        created = self.assertWithinBudget('POST', 'product-list', product, expected_status=201)
+        self.assertWithinBudget('POST', 'product-add-product', product, expected_status=201)
+        self.assertWithinBudget('PUT', 'product-detail', {'stock': 50}, url_kwargs={'pk': created.data['id']})
+        self.assertWithinBudget('DELETE', 'product-detail', url_kwargs={'pk': created.data['id']}, expected_status=204)
+
+    def test_reports(self):
+        for query in ('', 'filter=least_sold', 'filter=category&category=cat-1', 'from=2020-01-01&to=2100-01-01'):
+            response = self.assertWithinBudget('GET', 'salesreport', query=query)
+            self.assertTrue(response.data)
+            self.assertWithinBudget('GET', 'salesreport-async', query=query)
+
+    def test_timeseries(self):
+        today = timezone.localdate()
+        record_daily_sales({self.products[0].id: (5, self.products[0].price)}, day=today - timedelta(days=8))
+        week_ago = (today - timedelta(days=13)).isoformat()
+
+        response = self.assertWithinBudget(
+            'GET', 'salesreport-timeseries', query=f'bucket=day&from={week_ago}&moving_average=7'
+        )
+        series = response.data['series']
+        self.assertEqual(len(series), 14)
+        self.assertEqual(series[-1]['quantity'], 60)
+        self.assertEqual(series[5]['quantity'], 5)
+        self.assertEqual([point['quantity_ma'] for point in series[5:8]], [None, 0.71, 0.71])
+
+        response = self.assertWithinBudget(
+            'GET', 'salesreport-timeseries', query=f'bucket=week&from={week_ago}&category=CAT-0&product={self.products[0].id}'
+        )
+        self.assertEqual(sum(point['quantity'] for point in response.data['series']), 7)
+        self.assertTrue(all(date.fromisoformat(point['period']).weekday() == 0 for point in response.data['series']))
+
+        for query in ('bucket=year', 'from=2026-02-01&to=2026-01-01', 'bucket=hour&from=2000-01-01', 'product=x'):
+            self.assertWithinBudget('GET', 'salesreport-timeseries', query=query, expected_status=400, budget=0)
+
+    def test_report_export_streams(self):
+        report = self.client.get(reverse('salesreport'), {'filter': 'least_sold'}).data
+        response = self.client.get(reverse('salesreport'), {'filter': 'least_sold', 'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [row['id'] for row in report])
+        self.assertEqual(rows[0]['total_revenue'], str(report[0]['total_revenue']))
+
+        response = self.client.get(reverse('salesreport'), {'format': 'csv', 'filter': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_promo_codes(self):
+        self.assertWithinBudget('GET', 'promo')
+        self.assertWithinBudget('GET', 'promo-async')
+        expiry = (timezone.now() + timedelta(days=5)).isoformat()
+        self.assertWithinBudget('POST', 'promo', {'code': 'NEWCODE', 'discount_percent': 5, 'expiry_date': expiry},
+                                expected_status=201)
+        self.assertWithinBudget('POST', 'apply-promo', {'code': 'CODE1'})
+        # Unknown codes are answered by the Bloom filter once the index is loaded.
+        self.assertWithinBudget('POST', 'apply-promo', {'code': 'UNKNOWN'}, expected_status=404, budget=0)
+
+    def test_low_stock_and_cache_stats(self):
+        response = self.assertWithinBudget('GET', 'low-stock-alert')
+        self.assertEqual(len(response.data['low_stock_alerts']), 11)
+        self.assertWithinBudget('GET', 'low-stock-alert-async')
+        self.assertWithinBudget('GET', 'catalog-cache-stats')
+
+
+class QueryStatsMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.client.get('/api/store/promocode/')
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+        self.assertIn('store_promocode', response['X-DB-Slowest-Query'])
+        self.assertGreaterEqual(float(response['X-DB-Time-Ms']), 0)
+
+    def test_no_headers_without_debug(self):
+        response = self.client.get('/api/store/promocode/')
+        self.assertNotIn('X-DB-Query-Count', response)
+
+    def test_stats_per_view(self):
+        self.client.get('/api/store/promocode/')
+        self.client.get('/api/store/promocode/')
+        stats = view_query_stats()['GET promo']
+        self.assertGreaterEqual(stats['requests'], 2)
+        self.assertEqual(stats['max_queries'], 1)
+
+    async def test_concurrent_async_requests_are_counted_apart(self):
+        async def request(queries):
+            with QueryRecorder() as recorder:
+                for _ in range(queries):
+                    await User.objects.acount()
+                    await asyncio.sleep(0)
+            return recorder.count
+
+        with QueryRecorder() as outer:
+            self.assertEqual(await asyncio.gather(request(1), request(3), request(2)), [1, 3, 2])
+        self.assertEqual(outer.count, 6)
+
+
+class CatalogImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category='pantry', price=i + 1, stock=20, created_by=cls.manager)
+            for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        token = MyTokenObtainPairSerializer.get_token(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def import_body(self, body, content_type='text/csv'):
+        return self.client.generic('POST', reverse('product-import'), body.encode(), content_type=content_type)
+
+    def test_export_round_trip(self):
+        response = self.client.get(reverse('product-export'), {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        exported = b''.join(response.streaming_content).decode()
+        self.assertEqual(exported.splitlines()[0], 'id,name,category,price,stock,image_url,low_stock_threshold,created_by')
+
+        edited = exported.replace('pantry', 'bakery')
+        response = self.import_body(edited)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'created': 0, 'updated': 5, 'rejected': 0, 'errors': []})
+        self.assertEqual(Product.objects.filter(category='bakery').count(), 5)
+
+        response = self.client.get(reverse('product-export'), {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [product.id for product in self.products])
+
+    def test_partial_update_and_errors(self):
+        first, second = self.products[:2]
+        body = '\n'.join([
+            '{"id": %d, "price": "9.99", "stock": 3}' % first.id,
+            '{"id": %d, "price": "-1", "stock": 3}' % second.id,
+            '{"id": 999999, "price": "1.00", "stock": 3}',
+            '{"id": %d, "price": "2.50"}' % second.id,
+        ])
+        response = self.import_body(body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['updated'], response.data['rejected']), (1, 3))
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3, 4])
+
+        first.refresh_from_db()
+        self.assertEqual((str(first.price), first.stock, first.name), ('9.99', 3, 'Product 0'))
+        self.assertTrue(LowStockEvent.objects.filter(product=first, active=True).exists())
+
+    def test_repeated_ids_count_by_outcome(self):
+        first = self.products[0]
+        body = '\n'.join([
+            '{"id": %d, "stock": 1}' % first.id,
+            '{"id": 999999, "stock": 1}',
+            '{"id": %d, "stock": 2}' % first.id,
+            '{"id": 999999, "stock": 2}',
+        ])
+        response = self.import_body(body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['updated'], response.data['rejected']), (2, 2))
+        self.assertEqual(sorted(error['line'] for error in response.data['errors']), [2, 4])
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 2)
+
+    def test_creates_rows_without_id_and_rejects_unknown_columns(self):
+        response = self.import_body('name,category,price,stock\nBread,bakery,2.50,40\n')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Product.objects.get(name='Bread').created_by, self.manager)
+
+        response = self.import_body('id,colour\n1,red\n')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    """ETags, Last-Modified and compression of catalog pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category='pantry', price=i + 1, stock=20, created_by=cls.manager)
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        bump_catalog_version()
+        self.client = APIClient()
+        token = MyTokenObtainPairSerializer.get_token(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_unchanged_catalog_is_not_modified(self):
+        url = reverse('product-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('product-detail', kwargs={'pk': product.id}), {'price': '9.99'}, format='json')
+        self.assertGreater(Product.objects.get(id=product.id).updated_at, product.updated_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_workers_bump_invalidates_pages(self):
+        url = reverse('product-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        Product.objects.filter(id=self.products[0].id).update(name='Renamed')
+
+        # Another worker process: its own cache connection, the same shared store.
+        other = caches.create_connection('catalog_version')
+        other.set(CATALOG_VERSION_KEY, other.get(CATALOG_VERSION_KEY) + 1, timeout=None)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'Renamed')
+
+    def test_large_pages_are_gzipped(self):
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 30)
+
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(reverse('product-detail', kwargs={'pk': self.products[0].id}),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))), 30)
+
+
+class PromoIndexTests(TestCase):
+
+    def setUp(self):
+        promo_index.invalidate()
+
+    def test_codes_are_evicted_at_expiry(self):
+        now = timezone.now()
+        PromoCode.objects.create(code='SOON', discount_percent=15, expiry_date=now + timedelta(minutes=1))
+        PromoCode.objects.create(code='OFF', discount_percent=5, active=False, expiry_date=now + timedelta(days=1))
+        self.assertEqual(promo_index.lookup('SOON'), (promo_index.VALID, 15))
+        self.assertEqual(promo_index.lookup('OFF'), (promo_index.INVALID, None))
+        with mock.patch('store.promo_index.timezone.now', return_value=now + timedelta(minutes=2)):
+            self.assertEqual(promo_index.lookup('SOON'), (promo_index.INVALID, None))
+        self.assertNotIn('SOON', promo_index.active)
+
+    def test_unknown_codes_and_codes_from_other_workers(self):
+        PromoCode.objects.create(code='KNOWN', discount_percent=10, expiry_date=timezone.now() + timedelta(days=1))
+        self.assertEqual(promo_index.lookup('NOPE'), (promo_index.UNKNOWN, None))
+        # bulk_create sends no signal, so this process's index isn't
+        # invalidated, like after a write on another worker...
+        PromoCode.objects.bulk_create([
+            PromoCode(code='FRESH', discount_percent=20, expiry_date=timezone.now() + timedelta(days=1))
+        ])
+        with self.assertNumQueries(0):
+            self.assertEqual(promo_index.lookup('FRESH'), (promo_index.UNKNOWN, None))
+        # ...which bumps the shared version when it commits.
+        bump_promo_version()
+        self.assertEqual(promo_index.lookup('FRESH'), (promo_index.VALID, 20))
+        with self.assertNumQueries(0):
+            self.assertEqual(promo_index.lookup('NOPE'), (promo_index.UNKNOWN, None))
+
+    def test_writes_bump_the_shared_version(self):
+        manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        client = APIClient()
+        client.force_authenticate(user=manager)
+        self.assertEqual(promo_index.lookup('NOPE'), (promo_index.UNKNOWN, None))
+        version = get_shared_version(PROMO_VERSION_KEY)
+        expiry = (timezone.now() + timedelta(days=1)).isoformat()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('promo'), {'code': 'NEW', 'discount_percent': 5, 'expiry_date': expiry},
+                                   format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(get_shared_version(PROMO_VERSION_KEY), version)
+        self.assertEqual(promo_index.lookup('NEW'), (promo_index.VALID, 5))
+
+
+class ShardedStockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.customer = User.objects.create(username='shopper', email='shopper@example.com')
+        cls.product = Product.objects.create(name="Best seller", category='deals', price=3, stock=30,
+                                             low_stock_threshold=5, created_by=cls.manager)
+
+    def setUp(self):
+        cache.clear()
+        self.manager_client = APIClient()
+        self.manager_client.force_authenticate(user=self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def shards(self):
+        return sorted(StockShard.objects.filter(product=self.product).values_list('quantity', flat=True))
+
+    def buy(self, quantity):
+        self.client.post(reverse('cart'), {'product_id': self.product.id, 'quantity': quantity}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('checkout'))
+
+    def test_checkout_takes_stock_from_the_shards(self):
+        shard_product(self.product.id, 4)
+        self.assertEqual(self.shards(), [7, 7, 8, 8])
+
+        self.assertEqual(self.buy(6).status_code, 201)
+        self.assertEqual(sum(self.shards()), 24)
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 30)
+        response = self.manager_client.get(reverse('product-detail', kwargs={'pk': self.product.id}))
+        self.assertEqual(response.data['stock'], 24)
+
+        # No shard has 20 left, so they are taken from several.
+        self.assertEqual(self.buy(20).status_code, 201)
+        self.assertEqual(sum(self.shards()), 4)
+        response = self.manager_client.get(reverse('low-stock-alert'))
+        self.assertEqual(response.data['low_stock_alerts'], [{'product': "Best seller", 'quantity': 4}])
+        self.assertEqual(self.buy(5).status_code, 400)
+
+        self.assertEqual(rebalance(), 1)
+        self.assertEqual(self.shards(), [1, 1, 1, 1])
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 4)
+
+    def test_async_browse_shows_the_shard_total(self):
+        shard_product(self.product.id, 2)
+        StockShard.objects.filter(product=self.product, shard=0).update(quantity=1)
+        client = APIClient()
+        token = MyTokenObtainPairSerializer.get_token(self.customer).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = client.get(reverse('browse_products_async'))
+        self.assertEqual(response.json()['results'][0]['stock'], 16)
+
+    def test_setting_stock_spreads_it_over_the_shards(self):
+        shard_product(self.product.id, 3)
+        response = self.manager_client.put(reverse('product-detail', kwargs={'pk': self.product.id}),
+                                           {'stock': 50}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.shards(), [16, 17, 17])
+
+        product = shard_product(self.product.id, 0)
+        self.assertEqual((product.stock, product.stock_shards), (50, 0))
+        self.assertFalse(StockShard.objects.exists())
+
+
+@mock.patch('grocery_store.db_router.replica_available', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only; the tests' replica mirrors the in-memory primary."""
+
+    def request(self, method='get', cookies=None, write=False):
+        seen = {}
+
+        def view(request):
+            use_replica()
+            seen['before'] = router.db_for_read(Product)
+            if write:
+                router.db_for_write(Product)
+            seen['after'] = router.db_for_read(Product)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = PrimaryPinningMiddleware(view)(request)
+        return seen, response
+
+    def test_reads_go_to_the_replica(self, _):
+        seen, response = self.request()
+        self.assertEqual(seen, {'before': REPLICA, 'after': REPLICA})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_read(Product), DEFAULT_DB_ALIAS)
+
+    def test_a_write_pins_the_client_to_the_primary(self, _):
+        seen, response = self.request(write=True)
+        self.assertEqual(seen, {'before': REPLICA, 'after': DEFAULT_DB_ALIAS})
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        seen, _ = self.request(cookies={PIN_COOKIE: '1'})
+        self.assertEqual(seen, {'before': DEFAULT_DB_ALIAS, 'after': DEFAULT_DB_ALIAS})
+
+    def test_unsafe_methods_read_from_the_primary(self, _):
+        seen, response = self.request('post')
+        self.assertEqual(seen['before'], DEFAULT_DB_ALIAS)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.juice, cls.pie, cls.banana, cls.sauce = Product.objects.bulk_create([
+            Product(name="Organic apple juice", category='beverages', price=3, stock=10, created_by=cls.manager),
+            Product(name="Apple pie", category='bakery', price=6, stock=10, created_by=cls.manager),
+            Product(name="Banana", category='fruit', price=1, stock=10, created_by=cls.manager),
+            Product(name="Applesauce", category='pantry', price=2, stock=0, created_by=cls.manager),
+        ])
+
+    def search(self, query):
+        return [hit.id for hit in search_products(query, 10)]
+
+    def test_match_and_prefix(self):
+        self.assertEqual(set(self.search('apple')), {self.juice.id, self.pie.id})
+        # Every term is a prefix; out-of-stock products are left out.
+        self.assertEqual(set(self.search('app')), {self.juice.id, self.pie.id})
+        self.assertEqual(self.search('apple pi'), [self.pie.id])
+        self.assertEqual(self.search('fru'), [self.banana.id])
+        self.assertEqual(self.search('cherry'), [])
+
+        hits = search_products('app', 1)
+        self.assertEqual(len(hits), 1)
+        rest = search_products('app', 10, after=(hits[0].score, hits[0].id))
+        self.assertEqual({hits[0].id} | {hit.id for hit in rest}, {self.juice.id, self.pie.id})
+
+    def test_triggers_follow_updates_and_deletes(self):
+        # queryset.update() and delete() skip signals; only the triggers see them.
+        Product.objects.filter(id=self.banana.id).update(name="Plantain", category='vegetables')
+        self.assertEqual(self.search('banana'), [])
+        self.assertEqual(self.search('plant'), [self.banana.id])
+        self.assertEqual(self.search('veg'), [self.banana.id])
+
+        Product.objects.filter(id=self.pie.id).delete()
+        self.assertEqual(self.search('apple'), [self.juice.id])
+        self.assertEqual(self.search('pie'), [])
+
+        Product.objects.filter(id=self.sauce.id).update(stock=5)
+        self.assertEqual(set(self.search('apple')), {self.juice.id, self.sauce.id})
+
+
+class LowStockEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.product = Product.objects.create(name="Milk", category='dairy', price=1, stock=10,
+                                             low_stock_threshold=5, created_by=cls.manager)
+
+    def setUp(self):
+        self.client = APIClient()
+        token = MyTokenObtainPairSerializer.get_token(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def set_stock(self, stock):
+        response = self.client.put(reverse('product-detail', kwargs={'pk': self.product.id}), {'stock': stock},
+                                   format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_event_opens_and_closes_across_the_threshold(self):
+        self.set_stock(6)
+        self.assertFalse(LowStockEvent.objects.exists())
+
+        self.set_stock(5)
+        event = LowStockEvent.objects.get()
+        self.assertEqual((event.kind, event.stock, event.threshold, event.active), (LowStockEvent.LOW, 5, 5, True))
+        alerts = self.client.get(reverse('low-stock-alert')).data['low_stock_alerts']
+        self.assertEqual(alerts, [{'product': "Milk", 'quantity': 5}])
+
+        # Staying under the threshold records nothing new.
+        self.set_stock(2)
+        self.assertEqual(LowStockEvent.objects.count(), 1)
+
+        self.set_stock(20)
+        low, restocked = LowStockEvent.objects.order_by('id')
+        self.assertFalse(low.active)
+        self.assertEqual((restocked.kind, restocked.stock, restocked.active), (LowStockEvent.RESTOCKED, 20, False))
+        self.assertEqual(self.client.get(reverse('low-stock-alert')).data, {"message": "All stocks are sufficient!"})
+
+
+class AsyncViewTests(TestCase):
+    """The async views answer exactly like their sync counterparts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create(username='manager', email='manager@example.com', role='manager')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category=f"cat-{i % 3}", price=i + 1, stock=i, created_by=cls.manager)
+            for i in range(15)
+        ])
+        track_low_stock(cls.products, previously_low=set())
+        record_daily_sales({product.id: (i + 1, product.price) for i, product in enumerate(cls.products)})
+        PromoCode.objects.bulk_create([
+            PromoCode(code=f"CODE{i}", discount_percent=5 + i, expiry_date=timezone.now() + timedelta(days=i - 1))
+            for i in range(4)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        token = MyTokenObtainPairSerializer.get_token(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertSamePayload(self, sync_name, async_name, query=''):
+        sync = self.client.get(f'{reverse(sync_name)}?{query}')
+        response = self.client.get(f'{reverse(async_name)}?{query}')
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.json(), sync.json())
+        return response.json()
+
+    def test_reports(self):
+        for query in ('', 'filter=least_sold', 'filter=category&category=cat-1', 'from=2020-01-01&to=2100-01-01',
+                      'filter=nonsense'):
+            self.assertTrue(self.assertSamePayload('salesreport', 'salesreport-async', query))
+
+    def test_promo_codes_and_low_stock_alerts(self):
+        self.assertTrue(self.assertSamePayload('promo', 'promo-async'))
+        self.assertTrue(self.assertSamePayload('low-stock-alert', 'low-stock-alert-async')['low_stock_alerts'])
+
+        Product.objects.update(stock=100)
+        track_low_stock(Product.objects.all())
+        self.assertSamePayload('low-stock-alert', 'low-stock-alert-async')
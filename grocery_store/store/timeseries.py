@@ -0,0 +1,182 @@
+"""
+Sales over time, for /api/store/reports/timeseries/.
+
+Day, week and month buckets sum the ProductDailySales rollup, one row per
+product and day, read from its covering (day, product, quantity, revenue)
+index. Hour buckets group raw Sale rows (the rollup has no time of day)
+over the (date, product) index; like the rollup rebuild they price sales
+at the current product price. Buckets without sales are filled with
+zeros so every series is regular, which moving averages need.
+
+Moving averages are computed with NumPy when it is installed and in plain
+Python otherwise.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Product, ProductDailySales, Sale
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+# Range covered when `from` is omitted, in days up to and including `to`.
+DEFAULT_DAYS = {'hour': 2, 'day': 30, 'week': 182, 'month': 365}
+MAX_POINTS = 5000
+CENTS = Decimal('0.01')
+
+
+def _date_param(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid '{name}' date. Use YYYY-MM-DD.")
+    return day
+
+
+def _product_ids(value):
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError("'product' must be a product id or a comma-separated list of ids.")
+    if not ids:
+        raise ValueError("'product' must be a product id or a comma-separated list of ids.")
+    return ids
+
+
+def _periods(bucket, start, end):
+    """Every bucket start from the one containing `start` to the one containing `end`."""
+    if bucket == 'hour':
+        current = timezone.make_aware(datetime.datetime.combine(start, datetime.time()))
+        stop = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time()))
+        step = datetime.timedelta(hours=1)
+    elif bucket == 'day':
+        current, stop, step = start, end + datetime.timedelta(days=1), datetime.timedelta(days=1)
+    elif bucket == 'week':
+        current = start - datetime.timedelta(days=start.weekday())
+        stop, step = end + datetime.timedelta(days=1), datetime.timedelta(days=7)
+    else:
+        current, stop = start.replace(day=1), end
+        periods = []
+        while current <= stop:
+            periods.append(current)
+            current = (current + datetime.timedelta(days=32)).replace(day=1)
+        return periods
+
+    periods = []
+    while current < stop:
+        periods.append(current)
+        current += step
+    return periods
+
+
+def moving_average(values, window):
+    """
+    Trailing mean of the last `window` values at each point, rounded to 2
+    places; None until `window` values have been seen.
+    """
+    if window > len(values):
+        return [None] * len(values)
+    if np is not None:
+        averages = np.round(np.convolve(np.asarray(values, dtype=float), np.ones(window), 'valid') / window, 2)
+        averages = averages.tolist()
+    else:
+        averages = []
+        total = 0.0
+        for i, value in enumerate(values):
+            total += value
+            if i >= window:
+                total -= values[i - window]
+            if i >= window - 1:
+                averages.append(round(total / window, 2))
+    return [None] * (window - 1) + averages
+
+
+def sales_timeseries(params):
+    """
+    Builds the time series for the query parameters. Raises ValueError for
+    invalid parameters.
+    """
+    bucket = params.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        raise ValueError(f"Invalid bucket. Use {', '.join(BUCKETS)}.")
+    end = _date_param(params, 'to', timezone.localdate())
+    start = _date_param(params, 'from', end - datetime.timedelta(days=DEFAULT_DAYS[bucket] - 1))
+    if start > end:
+        raise ValueError("'from' must not be after 'to'.")
+    periods = _periods(bucket, start, end)
+    if len(periods) > MAX_POINTS:
+        raise ValueError(f"That range has {len(periods)} {bucket}s; use a shorter range or a larger bucket.")
+
+    window = params.get('moving_average')
+    if window:
+        if not window.isdigit() or int(window) < 1:
+            raise ValueError("'moving_average' must be a positive number of buckets.")
+        window = int(window)
+
+    filters = Q()
+    if params.get('category'):
+        # A subquery rather than a join keeps the rollup scan index-only.
+        filters &= Q(product_id__in=Product.objects.filter(category__iexact=params['category']).values('id'))
+    if params.get('product'):
+        filters &= Q(product_id__in=_product_ids(params['product']))
+
+    if bucket == 'hour':
+        rows = (
+            Sale.objects.filter(filters, date__gte=periods[0], date__lt=periods[-1] + datetime.timedelta(hours=1))
+            .annotate(period=TruncHour('date'))
+            .values_list('period')
+            .annotate(
+                total_quantity=Sum('quantity'),
+                total_revenue=Sum(F('quantity') * F('product__price'),
+                                  output_field=DecimalField(max_digits=14, decimal_places=2)),
+            )
+        )
+        bucket_of = None
+    else:
+        # Grouped by day in SQL, then into weeks or months here: the
+        # rollup is already per day, so that's at most a few hundred rows,
+        # while truncating every rollup row in the query is much slower
+        # on SQLite, which runs Trunc as a Python function.
+        rows = (
+            ProductDailySales.objects.filter(filters, day__gte=start, day__lte=end)
+            .values_list('day')
+            .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        )
+        bucket_of = {
+            'day': None,
+            'week': lambda day: day - datetime.timedelta(days=day.weekday()),
+            'month': lambda day: day.replace(day=1),
+        }[bucket]
+
+    totals = {}
+    for period, quantity, revenue in rows.order_by():
+        if bucket_of:
+            period = bucket_of(period)
+        total_quantity, total_revenue = totals.get(period, (0, 0))
+        totals[period] = (total_quantity + (quantity or 0), total_revenue + (revenue or 0))
+
+    quantities, revenues = [], []
+    for period in periods:
+        quantity, revenue = totals.get(period, (0, 0))
+        quantities.append(quantity)
+        revenues.append(Decimal(revenue).quantize(CENTS))
+    series = [
+        {'period': period.isoformat(), 'quantity': quantity, 'revenue': str(revenue)}
+        for period, quantity, revenue in zip(periods, quantities, revenues)
+    ]
+    if window:
+        for key, values in (('quantity', quantities), ('revenue', [float(revenue) for revenue in revenues])):
+            for point, average in zip(series, moving_average(values, window)):
+                point[f'{key}_ma'] = average
+
+    return {'bucket': bucket, 'from': start.isoformat(), 'to': end.isoformat(), 'series': series}
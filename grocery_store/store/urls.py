@@ -1,6 +1,8 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import LowStockAlertView, ProductViewSet, SalesReportView , PromoCodeView, ApplyPromoView
+from .streams import low_stock_stream
+from . import async_views
+from .views import LowStockAlertView, ProductViewSet, SalesReportView , SalesTimeSeriesView, PromoCodeView, ApplyPromoView, CatalogCacheStatsView
 
 
 
@@ -8,9 +10,15 @@ router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='product')
 urlpatterns = [
     path('reports/', SalesReportView.as_view(), name='salesreport'),
+    path('reports/timeseries/', SalesTimeSeriesView.as_view(), name='salesreport-timeseries'),
      path('promocode/', PromoCodeView.as_view(), name='promo'),
     path('promocode/apply/', ApplyPromoView.as_view(), name='apply-promo'),
     path('low-stock-alert/', LowStockAlertView.as_view(), name='low-stock-alert'),
+    path('low-stock-alert/stream/', low_stock_stream, name='low-stock-alert-stream'),
+    path('cache-stats/', CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
+    path('async/reports/', async_views.sales_report, name='salesreport-async'),
+    path('async/promocode/', async_views.promo_codes, name='promo-async'),
+    path('async/low-stock-alert/', async_views.low_stock_alerts, name='low-stock-alert-async'),
 ]
 
 urlpatterns += router.urls
@@ -1,6 +1,9 @@
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
-from django.db.models import Sum
+from decimal import Decimal
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
 from .models import Sale
 from django.utils import timezone
 from django.db import models 
@@ -16,9 +19,29 @@ from .serializers import SalesReportSerializer
 from .models import PromoCode
 from .serializers import PromoCodeSerializer
 from rest_framework.permissions import IsAuthenticated
+from . import cache as catalog_cache
+from .promo_index import promo_index
+from .low_stock import track_low_stock
+from .models import LowStockEvent
+from django.http import StreamingHttpResponse
+from . import catalog_io
+from .renderers import CSVRenderer, NDJSONRenderer, stream_rows
+from rest_framework.settings import api_settings
+from .timeseries import sales_timeseries
+from .idempotency import idempotent
+from .conditional import catalog_response
+from grocery_store.db_router import ReplicaReadsMixin
+from .sharded_stock import load_totals, spread_stock
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+class ProductViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     Handles all product CRUD operations.
     Only store managers can add/edit/delete.
@@ -29,13 +52,37 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsStoreManager]
 
+    def list(self, request, *args, **kwargs):
+        return catalog_response(
+            request, ('products', 'list'),
+            lambda: list(self.get_serializer(self.get_queryset(), many=True).data)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_response(
+            request, ('products', 'detail', kwargs.get(self.lookup_field)),
+            lambda: dict(self.get_serializer(self.get_object()).data)
+        )
+
     def perform_create(self, serializer):
         try:
-            serializer.save(created_by=self.request.user)
+            product = serializer.save(created_by=self.request.user)
         except Exception as e:
             raise ValidationError({"error": str(e)})
+        track_low_stock([product], previously_low=set())
+        catalog_cache.bump_catalog_version_on_commit()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        if serializer.instance.stock_shards and 'stock' in serializer.validated_data:
+            spread_stock([serializer.instance.id])
+        track_low_stock([serializer.instance])
+        catalog_cache.bump_catalog_version_on_commit()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        catalog_cache.bump_catalog_version_on_commit()
 
-    
    
     @action(detail=False, methods=['post'], url_path='add')
     def add_product(self, request):
@@ -49,7 +96,9 @@ class ProductViewSet(viewsets.ModelViewSet):
 
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            serializer.save(created_by=request.user)
+            product = serializer.save(created_by=request.user)
+            track_low_stock([product], previously_low=set())
+            catalog_cache.bump_catalog_version_on_commit()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         except PermissionDenied as e:
@@ -94,64 +143,168 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({"error": "Unexpected error while deleting the product."},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def import_products(self, request):
+        """
+        POST /api/store/products/import/
+        Bulk creates or updates products from a CSV or NDJSON file, sent as
+        the request body (Content-Type text/csv or application/x-ndjson) or
+        as the `file` field of a multipart upload (.csv or .ndjson).
+        The file is read as it arrives; see store/catalog_io.py for columns.
+        """
+        try:
+            if getattr(request.user, 'role', None) != 'manager':
+                raise PermissionDenied("Only store managers can import products.")
+
+            upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+            if upload is not None:
+                fmt = upload.name.rsplit('.', 1)[-1].lower()
+                source = upload
+            else:
+                fmt = IMPORT_CONTENT_TYPES.get(request.content_type.split(';')[0].strip())
+                source = request.stream or ()
+            if fmt not in catalog_io.FORMATS:
+                raise ValueError("Send a .csv or .ndjson file, or a text/csv or application/x-ndjson body.")
+
+            lines = (line.decode('utf-8-sig') for line in source)
+            result = catalog_io.import_products(lines, fmt, user=request.user)
+            return Response(result, status=status.HTTP_200_OK)
+
+        except PermissionDenied as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            return Response({"error": "Unexpected error while importing products."},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], url_path='export', url_name='export',
+            renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export_products(self, request):
+        """
+        GET /api/store/products/export/?format=csv|ndjson
+        Streams the whole catalog; the output can be imported back.
+        """
+        if getattr(request.user, 'role', None) != 'manager':
+            return Response({"error": "Only store managers can export products."},
+                            status=status.HTTP_403_FORBIDDEN)
+        fmt = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            catalog_io.export_products(fmt), content_type=request.accepted_renderer.media_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+        return response
+
     
 
 
-class SalesReportView(APIView):
+CENTS = Decimal('0.01')
+
+
+class SalesReportView(ReplicaReadsMixin, APIView):
+    """
+    Sales totals per product, read from the ProductDailySales rollup.
+    Optional `from` / `to` (YYYY-MM-DD) limit the report to a day range.
+    `?format=csv` or `?format=ndjson` streams the full report instead of
+    building it in memory, for exports of any size.
+    """
     permission_classes = [IsStoreManager]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer, NDJSONRenderer]
+    columns = ('id', 'name', 'category', 'price', 'total_quantity_sold', 'total_revenue')
+    stream_chunk_size = 2000
 
     def get(self, request):
         try:
-            filter_type = request.query_params.get('filter')  # most_sold, least_sold, or category
-            category = request.query_params.get('category')
-
-            
-            products = Product.objects.annotate(
-                total_quantity_sold=Sum('sales__quantity')
-            ).order_by('-total_quantity_sold')
-
-            
-            products = products.annotate(
-                total_quantity_sold=Sum('sales__quantity')
-            ).values('id', 'name', 'category', 'price', 'total_quantity_sold')
-
-            
-            if filter_type == 'category':
-                if not category:
-                    return Response(
-                        {"error": "Category parameter is required for category filter."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                products = products.filter(category__iexact=category)
-
-           
-            elif filter_type == 'most_sold':
-                products = products.order_by('-total_quantity_sold')
-            elif filter_type == 'least_sold':
-                products = products.order_by('total_quantity_sold')
-            elif filter_type not in [None, 'most_sold', 'least_sold', 'category']:
-                return Response(
-                    {"error": "Invalid filter type. Use 'most_sold', 'least_sold', or 'category'."},
-                    status=status.HTTP_400_BAD_REQUEST
+            products = self.get_report(request.query_params)
+            fmt = request.accepted_renderer.format
+            if fmt in ('csv', 'ndjson'):
+                # .iterator() reads through a server-side cursor where the
+                # database has one, so memory doesn't grow with the report.
+                rows = products.values_list(*self.columns).iterator(chunk_size=self.stream_chunk_size)
+                # Revenue to cents, like SalesReportSerializer renders it.
+                rows = ((*row[:-1], row[-1].quantize(CENTS)) for row in rows)
+                response = StreamingHttpResponse(
+                    stream_rows(rows, self.columns, fmt, chunk_size=self.stream_chunk_size),
+                    content_type=request.accepted_renderer.media_type,
                 )
-
-            
-            for p in products:
-                if p['total_quantity_sold'] is None:
-                    p['total_quantity_sold'] = 0
+                response['Content-Disposition'] = f'attachment; filename="sales-report.{fmt}"'
+                return response
 
             serializer = SalesReportSerializer(products, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @staticmethod
+    def get_report(params):
+        """
+        Builds the (lazy) report queryset for the query parameters.
+        Raises ValueError for invalid parameters.
+        """
+        filter_type = params.get('filter')  # most_sold, least_sold, or category
+        category = params.get('category')
+
+        day_range = Q()
+        for param, lookup in (('from', 'daily_sales__day__gte'), ('to', 'daily_sales__day__lte')):
+            value = params.get(param)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    raise ValueError(f"Invalid '{param}' date. Use YYYY-MM-DD.")
+                day_range &= Q(**{lookup: day})
+
+        products = Product.objects.annotate(
+            total_quantity_sold=Coalesce(Sum('daily_sales__quantity', filter=day_range), 0),
+            total_revenue=Coalesce(
+                Sum('daily_sales__revenue', filter=day_range),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2)
+            )
+        ).values('id', 'name', 'category', 'price', 'total_quantity_sold', 'total_revenue')
+
+        if filter_type == 'category':
+            if not category:
+                raise ValueError("Category parameter is required for category filter.")
+            return products.filter(category__iexact=category).order_by('-total_quantity_sold')
+        elif filter_type == 'least_sold':
+            return products.order_by('total_quantity_sold')
+        elif filter_type in [None, 'most_sold']:
+            return products.order_by('-total_quantity_sold')
+        raise ValueError("Invalid filter type. Use 'most_sold', 'least_sold', or 'category'.")
+
+class SalesTimeSeriesView(ReplicaReadsMixin, APIView):
+    """
+    GET /api/store/reports/timeseries/
+    Units sold and revenue per `bucket` (hour, day, week or month) between
+    `from` and `to` (YYYY-MM-DD), optionally for one `category` or for
+    `product` ids (comma-separated). `moving_average=N` adds trailing
+    N-bucket averages. See store/timeseries.py.
+    """
+    permission_classes = [IsStoreManager]
+
+    def get(self, request):
+        try:
+            return Response(sales_timeseries(request.query_params), status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+
 class PromoCodeView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @idempotent
     def post(self, request):
          if getattr(request.user, 'role', None) != 'manager':
             return Response(
@@ -172,19 +325,28 @@ class PromoCodeView(APIView):
 
 
 class ApplyPromoView(APIView):
+    """
+    Answers from the in-memory promo index; unknown codes are rejected by
+    its Bloom filter without touching the database.
+    """
    
     def post(self, request):
         code = request.data.get("code")
-        try:
-            promo = PromoCode.objects.get(code=code)
-            if promo.is_valid():
-                return Response({"discount_percent": promo.discount_percent}, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Promo code expired or inactive"}, status=status.HTTP_400_BAD_REQUEST)
-        except PromoCode.DoesNotExist:
+        if not isinstance(code, str) or not code:
             return Response({"error": "Invalid promo code"}, status=status.HTTP_404_NOT_FOUND)
 
-class LowStockAlertView(APIView):
+        state, discount_percent = promo_index.lookup(code)
+        if state == promo_index.VALID:
+            return Response({"discount_percent": discount_percent}, status=status.HTTP_200_OK)
+        elif state == promo_index.INVALID:
+            return Response({"error": "Promo code expired or inactive"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"error": "Invalid promo code"}, status=status.HTTP_404_NOT_FOUND)
+
+class LowStockAlertView(ReplicaReadsMixin, APIView):
+    """
+    Open low-stock alerts, read from the LowStockEvent table that checkout
+    and product edits keep current. Use the /stream/ endpoint for pushes.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -192,9 +354,21 @@ class LowStockAlertView(APIView):
         if getattr(request.user, 'role', None) != 'manager':
             return Response({"error": "Only managers can view low-stock alerts."}, status=status.HTTP_403_FORBIDDEN)
         
-        low_stock_products = Product.objects.filter(stock__lte=models.F('low_stock_threshold'))
-        if not low_stock_products.exists():
+        alerts = list(LowStockEvent.objects.filter(active=True).select_related('product').order_by('id'))
+        load_totals([alert.product for alert in alerts])
+        data = [{"product": alert.product.name, "quantity": alert.product.stock} for alert in alerts]
+        if not data:
             return Response({"message": "All stocks are sufficient!"}, status=status.HTTP_200_OK)
 
-        data = [{"product": p.name, "quantity": p.stock} for p in low_stock_products]
-        return Response({"low_stock_alerts": data}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"low_stock_alerts": data}, status=status.HTTP_200_OK)
+
+
+class CatalogCacheStatsView(APIView):
+    """
+    Hit/miss/invalidation counters of the catalog cache for this worker
+    process, for scraping by monitoring.
+    """
+    permission_classes = [IsStoreManager]
+
+    def get(self, request):
+        return Response(catalog_cache.catalog_cache_stats(), status=status.HTTP_200_OK)
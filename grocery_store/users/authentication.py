@@ -0,0 +1,77 @@
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+# Claims MyTokenObtainPairSerializer adds to every token, mapped to User fields.
+CLAIM_FIELDS = ('username', 'email', 'role')
+
+
+def user_from_claims(validated_token):
+    """
+    Builds the token's User from its claims without touching the database,
+    or returns None if the token doesn't carry all of CLAIM_FIELDS (e.g.
+    tokens minted with AccessToken.for_user). The instance is a real User,
+    so it works for permission checks, FK assignments and filters; every
+    other field is deferred and loaded from the database on first access.
+    """
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise AuthenticationFailed("Token contained no recognizable user identification")
+    if any(validated_token.get(claim) is None for claim in CLAIM_FIELDS):
+        return None
+    # simplejwt stores the id as a string.
+    user_id = User._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id)
+    loaded = {api_settings.USER_ID_FIELD: user_id, **{claim: validated_token[claim] for claim in CLAIM_FIELDS}}
+    # from_db() expects the values in model field order.
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+    return User.from_db('default', fields, [loaded[name] for name in fields])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the verified token for the user's id,
+    username, email and role instead of loading the row on every request.
+    Tokens without those claims fall back to the usual database lookup.
+
+    Token refreshes (users.views.MyTokenRefreshSerializer) stamp the claims
+    from the row again, so a role change or deactivation takes effect by the
+    time the current access token expires (ACCESS_TOKEN_LIFETIME).
+    """
+
+    def get_user(self, validated_token):
+        user = user_from_claims(validated_token)
+        if user is None:
+            return super().get_user(validated_token)
+        return user
+
+
+async def aauthenticate(request, allow_query_token=False):
+    """
+    JWT authentication for plain Django async views, which DRF's
+    authentication classes don't cover. Returns the user or None.
+    Tokens carrying the role claims are handled inline; others need a user
+    lookup, which goes through a thread.
+    With `allow_query_token` the access token may also be passed as
+    `?access_token=` (EventSource can't send headers).
+    """
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    if header:
+        raw_token = authentication.get_raw_token(header)
+    elif allow_query_token:
+        raw_token = request.GET.get('access_token')
+    else:
+        raw_token = None
+    if not raw_token:
+        return None
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        user = user_from_claims(validated_token)
+        if user is None:
+            user = await sync_to_async(authentication.get_user)(validated_token)
+        return user
+    except AuthenticationFailed:
+        return None
@@ -1,3 +1,81 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-# Create your tests here.
+from grocery_store.testing import QueryBudgetMixin
+from .authentication import ClaimsJWTAuthentication
+from .models import User
+from .views import MyTokenObtainPairSerializer
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    client_class = APIClient
+    query_budgets = {
+        # Two email uniqueness checks (the model field's and validate_email's
+        # own message), then INSERT and the UPDATE that sets the password.
+        ('POST', 'register'): 5,
+        ('POST', 'login'): 1,
+        ('POST', 'token_refresh'): 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='existing', email='existing@example.com')
+        cls.user.set_password('Sup3r-secret!')
+        cls.user.save()
+
+    def test_register_login_refresh(self):
+        self.assertWithinBudget('POST', 'register', {
+            'username': 'newcomer', 'email': 'newcomer@example.com',
+            'password': 'Sup3r-secret!', 'password2': 'Sup3r-secret!', 'role': 'customer',
+        }, expected_status=201)
+        tokens = self.assertWithinBudget('POST', 'login', {'username': 'existing', 'password': 'Sup3r-secret!'})
+        self.assertWithinBudget('POST', 'token_refresh', {'refresh': tokens.data['refresh']})
+
+    def test_duplicate_email_is_rejected(self):
+        response = self.assertWithinBudget('POST', 'register', {
+            'username': 'copycat', 'email': 'existing@example.com',
+            'password': 'Sup3r-secret!', 'password2': 'Sup3r-secret!', 'role': 'customer',
+        }, expected_status=400)
+        self.assertIn('email', response.data)
+        self.assertFalse(User.objects.filter(username='copycat').exists())
+
+
+class ClaimsAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='boss', email='boss@example.com', role='manager')
+        cls.user.set_password('Sup3r-secret!')
+        cls.user.save()
+
+    def authenticate(self, token):
+        authentication = ClaimsJWTAuthentication()
+        return authentication.get_user(authentication.get_validated_token(str(token)))
+
+    def test_claims_token_needs_no_query(self):
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual((user.id, user.username, user.email, user.role),
+                         (self.user.id, 'boss', 'boss@example.com', 'manager'))
+
+    def test_token_without_claims_loads_the_user(self):
+        with self.assertNumQueries(1):
+            user = self.authenticate(AccessToken.for_user(self.user))
+        self.assertEqual(user.role, 'manager')
+
+    def test_refresh_restamps_a_changed_role(self):
+        client = APIClient()
+        tokens = client.post(reverse('login'), {'username': 'boss', 'password': 'Sup3r-secret!'}).data
+        User.objects.filter(id=self.user.id).update(role='customer')
+
+        response = client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.authenticate(response.data['access']).role, 'customer')
+        self.assertEqual(RefreshToken(response.data['refresh'])['role'], 'customer')
+
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        response = client.post(reverse('token_refresh'), {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, 401)
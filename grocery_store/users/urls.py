@@ -1,9 +1,8 @@
 from django.urls import path
-from .views import RegisterView, MyTokenObtainPairView
-from rest_framework_simplejwt.views import TokenRefreshView
+from .views import RegisterView, MyTokenObtainPairView, MyTokenRefreshView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', MyTokenObtainPairView.as_view(), name='login'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', MyTokenRefreshView.as_view(), name='token_refresh'),
 ]
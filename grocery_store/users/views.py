@@ -1,8 +1,10 @@
 from rest_framework import generics, permissions
 from .models import User
 from .serializers import RegisterSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
 
 
@@ -16,15 +18,20 @@ class RegisterView(generics.CreateAPIView):
 
 
 
+def add_user_claims(token, user):
+    # Read by users.authentication.ClaimsJWTAuthentication instead of the row.
+    token['role'] = user.role
+    token['username'] = user.username
+    token['email'] = user.email
+    return token
+
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
         # Add custom claims
-        token['role'] = user.role
-        token['username'] = user.username
-        token['email'] = user.email
-        return token
+        return add_user_claims(token, user)
 
 
 
@@ -32,3 +39,39 @@ class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
 
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that stamps the user claims afresh from the row
+    it loads anyway. simplejwt copies the old payload into the new access
+    and (rotated) refresh tokens, so otherwise a demoted manager would keep
+    the manager role for as long as they kept refreshing.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first() if user_id else None
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        add_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The token_blacklist app isn't installed.
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
+
+class MyTokenRefreshView(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
+
+